@@ -0,0 +1,46 @@
+# src/controllers/account_controller.py
+import json
+import os
+from src.models.email_account import EmailAccount
+
+ACCOUNTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'email_accounts.json')
+
+
+def load_accounts(path=ACCOUNTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [EmailAccount.from_dict(account_data) for account_data in json.load(f)]
+
+
+def save_accounts(accounts, path=ACCOUNTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump([account.to_dict() for account in accounts], f)
+
+
+class AccountController:
+    # The saved accounts, shared by the GUI, the daemon and the export CLI.
+    # accounts is one list for the session: views, FlagSync and the compose
+    # window hold on to it, so it is changed in place rather than replaced.
+
+    def __init__(self, path=ACCOUNTS_PATH):
+        self.path = path
+        self.accounts = load_accounts(path)
+
+    def find(self, address):
+        for account in self.accounts:
+            if account.email == address:
+                return account
+        return None
+
+    def add(self, account):
+        self.accounts.append(account)
+        self.save()
+
+    def remove(self, account):
+        self.accounts.remove(account)
+        self.save()
+
+    def save(self):
+        save_accounts(self.accounts, self.path)
@@ -0,0 +1,413 @@
+# src/controllers/email_controller.py
+import json
+import os
+import smtplib
+import ssl
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage as MimeMessage
+from email.utils import formatdate, make_msgid
+from src.controllers.account_controller import AccountController
+from src.utils.ai_summarizer import summarize_email, summarize_thread
+from src.utils.async_backend import use_async_backend, get_async_backend
+from src.utils.async_smtp import AsyncSmtpClient
+from src.utils.dashboard_stats import MailboxStats
+from src.utils.database import MessageStore
+from src.utils.email_parser import parse_message, body_cache
+from src.utils.fetch_scheduler import FetchScheduler, FetchBatch
+from src.utils.flag_sync import FlagSync
+from src.utils.folder_sync import FolderSync
+from src.utils.idle_watcher import IdleWatcher
+from src.utils.imap_pool import imap_pool
+from src.utils.mail_sync import MailSync, AsyncMailSync
+from src.utils.summary_pipeline import SummaryPipeline, FAILED_PREFIX
+from src.utils.thread_index import ThreadIndexer
+from src.utils.triage import Triage
+
+# Key of the mailbox statistics in the store's stats table
+STATS_KEY = "mailbox"
+
+
+def build_message(account, to_addrs, subject, body):
+    message = MimeMessage()
+    message["From"] = account.email
+    message["To"] = ", ".join(to_addrs)
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(body)
+    return message
+
+
+def send_email(account, message, to_addrs):
+    # Thread backend: blocking smtplib, run from a Worker. Certificates are checked, and
+    # other ports than 465 must upgrade: starttls() raises SMTPNotSupportedError when the
+    # server doesn't offer it, before the password could go out in the clear
+    context = ssl.create_default_context()
+    if account.smtp_port == 465:
+        server = smtplib.SMTP_SSL(account.smtp_server, account.smtp_port, context=context)
+    else:
+        server = smtplib.SMTP(account.smtp_server, account.smtp_port)
+    try:
+        if account.smtp_port != 465:
+            server.starttls(context=context)
+            server.ehlo()
+        server.login(account.email, account.password)
+        server.send_message(message, account.email, to_addrs)
+    finally:
+        server.quit()
+
+
+async def send_email_async(account, message, to_addrs):
+    # Async backend: same steps as a coroutine on the shared event loop
+    client = await AsyncSmtpClient(account.smtp_server, account.smtp_port).connect()
+    try:
+        await client.login(account.email, account.password)
+        await client.send_message(message, account.email, to_addrs)
+    finally:
+        await client.quit()
+
+
+class EmailController:
+    # The email logic behind both the GUI and the headless daemon, with no Qt:
+    # syncing folders and accounts, threading and triage of new mail, flag
+    # pushes, IDLE watchers, message bodies, summaries and mailbox statistics,
+    # all over one MessageStore. Callbacks run on worker or event-loop threads;
+    # EmailTab passes Qt signal emitters (queued onto the GUI thread), the
+    # daemon plain functions:
+    #   on_folders(account), on_synced(account, folder, result) and
+    #   on_sync_finished(account) follow FolderSync;
+    #   on_mailbox_changed(account, result, new_messages) follows IdleWatcher;
+    #   on_processed(account, threads_changed, flagged) after new mail has been
+    #   threaded and triaged.
+    # When a daemon already keeps the store warm, attached is set and the
+    # threading, triage and IDLE watchers are left to it.
+
+    def __init__(self, store=None, account_controller=None, on_folders=None, on_synced=None,
+                 on_sync_finished=None, on_mailbox_changed=None, on_processed=None):
+        self.store = store if store is not None else MessageStore()
+        self.account_controller = account_controller if account_controller is not None else AccountController()
+        self.accounts = self.account_controller.accounts
+        self.on_synced = on_synced
+        self.on_sync_finished = on_sync_finished
+        self.on_mailbox_changed = on_mailbox_changed
+        self.on_processed = on_processed
+        self.attached = False
+        self.mail_sync = MailSync(self.store)
+        self.async_sync = AsyncMailSync(self.store)
+        self.scheduler = FetchScheduler()
+        # Every folder of an account syncs in parallel, leaving one of the pool's connections per server
+        # free so opening a message or pushing a flag never waits behind a backfill chunk
+        self.folder_scheduler = FetchScheduler(per_server=max(1, imap_pool.max_per_server - 1))
+        self.folder_sync = FolderSync(self.mail_sync, self.folder_scheduler, on_folders,
+                                      self._folder_synced, self._sync_finished)
+        # Conversations are threaded in the background as messages are stored
+        self.thread_indexer = ThreadIndexer(self.store)
+        # New mail is pre-flagged locally by the user's rules and a classifier trained on their flags
+        self.triage = Triage(self.store)
+        # Flags are kept in the store and pushed to the server in the background
+        self.flag_sync = FlagSync(self.store, self.accounts)
+        # New mail, expunges and flag changes are pushed by the server (or polled)
+        self.idle_watcher = IdleWatcher(self.store, self._mailbox_changed)
+        self.summary_pipeline = SummaryPipeline(self.summarize_content)
+        # Retrieval index for the chatbot, built by build_mail_index()
+        self.mail_index = None
+        # Threading and triage run one account at a time; a request for an account already queued is dropped
+        self.processor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mercury-process")
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._inbox_marks = {}  # account email -> INBOX last_uid already announced
+        self._data_version = None
+
+    def start(self, watch=True):
+        # Anything left queued by the last session goes out now
+        if self.store.pending_flags():
+            self.flag_sync.wake()
+        if watch and not self.attached:
+            for account in self.accounts:
+                self.idle_watcher.start(account)
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+        self.folder_sync.cancel()
+        self.folder_scheduler.shutdown()
+        self.flag_sync.shutdown()
+        self.idle_watcher.stop_all()
+        self.summary_pipeline.shutdown()
+        self.processor.shutdown(wait=True, cancel_futures=True)
+
+    def account_for(self, email):
+        return self.account_controller.find(email.account)
+
+    def add_account(self, account):
+        self.account_controller.add(account)
+        if not self.attached:
+            self.idle_watcher.start(account)
+
+    def remove_account(self, account):
+        self.idle_watcher.stop(account)
+        self.folder_sync.cancel(account)
+        self.thread_indexer.forget(account.email)
+        imap_pool.close_account(account)
+        self.account_controller.remove(account)
+
+    # Syncing
+
+    def sync_account(self, account, viewed='INBOX'):
+        # The viewed folder first, then the folder list, INBOX and the rest; only
+        # UIDs newer than each folder's last sync are downloaded, older mail is
+        # backfilled in chunks. Bodies are fetched when a message is opened
+        self.folder_sync.sync_account(account, viewed)
+
+    def sync_inboxes(self, current=None, on_progress=None, on_finished=None):
+        # INBOX of every account at once, current first; returns the FetchBatch
+        accounts = [account for account in self.accounts if account.imap_server]
+        if use_async_backend():
+            # One coroutine per account on the shared event loop instead of one thread each
+            accounts.sort(key=lambda account: account is not current)
+            batch = FetchBatch(len(accounts), on_progress, on_finished)
+            batch.future = get_async_backend().submit(self.async_sync.sync_accounts(accounts, batch))
+            return batch
+        # The scheduler limits parallel jobs per IMAP server
+        jobs = [(account.email, account.imap_server, 0 if account is current else 1,
+                 lambda account=account: self.mail_sync.sync_folder(account))
+                for account in accounts]
+        return self.scheduler.submit_batch(jobs, on_progress=on_progress, on_finished=on_finished)
+
+    def view(self, account, folder):
+        # Jump ahead of other folders and backfill still queued for this account
+        self.folder_sync.view(account, folder)
+
+    def cancel_sync(self, batch=None):
+        if batch is not None:
+            self.scheduler.cancel(batch)
+        self.folder_sync.cancel()
+
+    def _folder_synced(self, account, folder, result):
+        if result.get("new"):
+            self.process(account)
+        if self.on_synced:
+            self.on_synced(account, folder, result)
+
+    def _sync_finished(self, account):
+        self.flag_sync.wake()
+        if self.on_sync_finished:
+            self.on_sync_finished(account)
+
+    def _mailbox_changed(self, account, result, new):
+        # The watchers follow INBOX
+        if new:
+            self.process(account)
+        if self.on_mailbox_changed:
+            self.on_mailbox_changed(account, result, new)
+
+    # Threading and triage
+
+    def process(self, account):
+        # Threads and triages whatever is new for account in the background; the
+        # first call per account threads everything stored. Returns the Future,
+        # or None when it is left to the daemon or already queued
+        if self.attached:
+            return None
+        with self._lock:
+            if account.email in self._queued:
+                return None
+            self._queued.add(account.email)
+        return self.processor.submit(self._process, account)
+
+    def _process(self, account):
+        with self._lock:
+            self._queued.discard(account.email)
+        changed = self.thread_indexer.update(account.email)
+        flagged = self.triage.run(account.email)
+        if flagged:
+            print(f"Triage flagged {len(flagged)} messages for {account.email}")
+            self.flag_sync.wake()
+        if self.on_processed:
+            self.on_processed(account, changed, flagged)
+        return changed, flagged
+
+    def wait_processed(self):
+        # Blocks until the threading and triage queued so far have run
+        self.processor.submit(int).result()
+
+    def mark(self, emails, flag):
+        # The store is updated at once; the server gets one batched UID STORE shortly after
+        self.flag_sync.mark(emails, flag)
+        if emails:
+            # The user re-flagged something: triage retrains before its next batch
+            self.triage.invalidate()
+
+    # Bodies and summaries
+
+    def load_body(self, email):
+        # Bodies come from the local store when available, otherwise one UID FETCH on a pooled connection
+        body = email.body
+        if body is None:
+            body = self.store.get_body(email.account, email.folder, email.uid)
+            if body is not None:
+                email.body = body
+        if body is None:
+            account = self.account_for(email)
+            raw = email.raw or (account.fetch_body(email.uid, email.folder) if account else None)
+            if raw is None:
+                return ""
+            # Parsed once: the text is kept (and stored), attachments go to spill files
+            parsed = parse_message(raw)
+            body_cache.put((email.account, email.folder, email.uid), parsed)
+            body = parsed.text
+            email.body = body
+            email.raw = None
+            self.store.set_body(email.account, email.folder, email.uid, body)
+            if self.mail_index is not None:
+                self.mail_index.add_message(email)
+        return body
+
+    def load_thread(self, email):
+        # The conversation from every folder (replies sit in Sent), each message once
+        messages = self.store.load_thread(email.account, email.thread_id) if email.thread_id is not None else []
+        unique = {}
+        for message in messages or [email]:
+            unique.setdefault(message.message_id or (message.folder, message.uid), message)
+        return [(message.sender, message.received.strftime("%Y-%m-%d %H:%M") if message.date else "",
+                 self.load_body(message)) for message in unique.values()]
+
+    def summarize_content(self, content):
+        # Conversations come from load_thread as (sender, date, body) tuples, single messages as text
+        if isinstance(content, list):
+            return summarize_thread(content, raise_errors=True)
+        return summarize_email(content, raise_errors=True)
+
+    def summarize(self, emails, on_result, on_finished=None):
+        # Bodies come from the local store (or one UID FETCH) inside the workers;
+        # on_result(title, summary) is called as each completes, in completion order
+        jobs = [(str(email), lambda email=email: self.load_body(email)) for email in emails]
+        return self.summary_pipeline.run(jobs, on_result, on_finished)
+
+    def summarize_conversation(self, email, on_result, on_finished=None):
+        # One request for the whole conversation instead of one per message
+        return self.summary_pipeline.run([(f"{email.subject} (whole thread)", lambda: self.load_thread(email))],
+                                         on_result, on_finished)
+
+    def presummarize(self, account, since, folder='INBOX', batch_size=64, stop=None):
+        # Fetches, stores and summarizes every message of folder newer than since, so
+        # the reading pane and Summarize answer from the store and the summary cache.
+        # Messages summarized before are cache hits and cost no API call. Blocks
+        # until done or stop is set; returns how many messages were covered and failed
+        covered = 0
+        failed = []
+
+        def note_failure(key, summary):
+            # Only failures are collected, to be reported once the folder is done
+            if summary.startswith(FAILED_PREFIX):
+                failed.append(summary)
+
+        for batch in self.store.iter_messages(account.email, folder, since=since, batch_size=batch_size):
+            done = threading.Event()
+            jobs = [(str(i), lambda email=email: self.load_body(email)) for i, email in enumerate(batch)]
+            summary_run = self.summary_pipeline.run(jobs, note_failure, lambda run: done.set())
+            while not done.wait(0.5):
+                if stop is not None and stop.is_set():
+                    summary_run.cancel()
+            if stop is not None and stop.is_set():
+                break
+            covered += len(batch)
+        if failed:
+            print(f"Error summarizing {len(failed)} messages for {account.email}: {failed[-1]}")
+        return covered, len(failed)
+
+    def build_mail_index(self):
+        from src.utils.mail_index import MailIndex
+        index = MailIndex(self.store)
+        # Published before the initial load so bodies decoded meanwhile are added too
+        self.mail_index = index
+        return index.build()
+
+    # Statistics and the daemon
+
+    def update_stats(self):
+        # Statistics over every stored message, for all accounts together and
+        # each one, saved in the store for the dashboard
+        per_account = {}
+        for batch in self.store.iter_messages(batch_size=2000, with_body=False):
+            for email in batch:
+                stats = per_account.get(email.account)
+                if stats is None:
+                    stats = per_account[email.account] = MailboxStats()
+                stats.add(email)
+        totals = MailboxStats()
+        for address, stats in per_account.items():
+            totals.merge(stats)
+            self.store.set_stats(f"{STATS_KEY}:{address}", stats.as_dict())
+        self.store.set_stats(STATS_KEY, totals.as_dict())
+        return totals
+
+    def mailbox_stats(self, account=None, max_age=None):
+        # The saved statistics with their "updated" time; recomputed first when
+        # missing or older than max_age seconds
+        key = f"{STATS_KEY}:{account}" if account else STATS_KEY
+        saved = self.store.get_stats(key)
+        if saved is None or (max_age is not None and time.time() - saved[0] > max_age):
+            self.update_stats()
+            saved = self.store.get_stats(key)
+        if saved is None:
+            return None
+        updated, data = saved
+        return dict(data, updated=updated)
+
+    def status_path(self):
+        # The daemon's heartbeat sits next to the store rather than in it, so beating
+        # doesn't count as a change for store_changed()
+        return None if self.store.path == ':memory:' else f"{self.store.path}.daemon"
+
+    def heartbeat(self, interval):
+        # Written beside the file and renamed over it, so a reader never sees it half written
+        path = self.status_path()
+        if path:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({"pid": os.getpid(), "heartbeat": interval}, f)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def clear_heartbeat(self):
+        path = self.status_path()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def daemon_status(self):
+        # The running daemon's last heartbeat, or None when no daemon keeps this store warm
+        path = self.status_path()
+        try:
+            updated = os.path.getmtime(path)
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (TypeError, OSError, ValueError):
+            return None
+        if time.time() - updated > 3 * data.get("heartbeat", 30):
+            return None
+        return dict(data, updated=updated)
+
+    def store_changed(self):
+        # True when another process (the daemon) committed to the store since the last call
+        version = self.store.data_version()
+        with self._lock:
+            changed = self._data_version not in (None, version)
+            self._data_version = version
+        return changed
+
+    def arrived(self, account, folder='INBOX'):
+        # Messages stored in folder since the last call for this account; the first call only sets the mark
+        state = self.store.get_folder_state(account.email, folder)
+        last_uid = state["last_uid"] if state else 0
+        with self._lock:
+            mark = self._inbox_marks.get(account.email)
+            self._inbox_marks[account.email] = last_uid
+        if mark is None or last_uid <= mark:
+            return []
+        return self.store.load_since(account.email, folder, mark)
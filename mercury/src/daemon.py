@@ -0,0 +1,192 @@
+# src/daemon.py
+"""Keep the mail store warm without a display: sync, thread, triage, summarize and count.
+
+    python -m src.daemon                          # every 5 minutes, plus IMAP IDLE in between
+    python -m src.daemon --interval 600 --summarize-days 3
+    python -m src.daemon --once                   # a single pass, e.g. from cron
+
+Every folder of every saved account is synced on a schedule, and INBOX changes
+are pushed by IMAP IDLE in between. New mail is threaded and triaged. Recent
+INBOX messages get their bodies stored and their summaries cached, and the
+dashboard statistics are recomputed. A GUI opened on the same store attaches to
+the running daemon and finds all of that done. No Qt is imported, so it runs on
+a server without a display server; stop it with SIGTERM or Ctrl-C.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.controllers.account_controller import AccountController
+from src.controllers.email_controller import EmailController
+from src.utils.async_backend import stop_async_backend
+from src.utils.database import MessageStore
+from src.utils.email_parser import body_cache
+from src.utils.imap_pool import imap_pool
+
+
+class MailDaemon:
+    # One pass syncs every account's folders and waits for them, then warms up
+    # the accounts that changed: threading and triage (already queued by the
+    # controller as folders synced), bodies and summaries of the last
+    # summarize_days of INBOX, and the mailbox statistics. IDLE notifications
+    # between passes wake it for a warm-up of just that account.
+
+    def __init__(self, store, account_controller=None, interval=300, summarize_days=7, watch=True, heartbeat=30):
+        self.interval = interval
+        self.summarize_days = summarize_days
+        self.watch = watch
+        self.heartbeat = heartbeat
+        self.stopping = threading.Event()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.syncing = set()
+        self.synced = threading.Event()
+        self.changed = set()  # accounts with changes since their last warm-up
+        self.controller = EmailController(store, account_controller, on_synced=self.on_synced,
+                                          on_sync_finished=self.on_sync_finished,
+                                          on_mailbox_changed=self.on_mailbox_changed)
+
+    def stop(self, *args):
+        self.stopping.set()
+        self.wake.set()
+
+    def on_synced(self, account, folder, result):
+        if any(result.values()):
+            with self.lock:
+                self.changed.add(account.email)
+
+    def on_sync_finished(self, account):
+        with self.lock:
+            self.syncing.discard(account.email)
+            if not self.syncing:
+                self.synced.set()
+
+    def on_mailbox_changed(self, account, result, new):
+        if new:
+            print(f"{len(new)} new messages for {account.email}")
+        with self.lock:
+            self.changed.add(account.email)
+        self.wake.set()
+
+    def run(self, once=False):
+        threading.Thread(target=self._beat, name="mercury-heartbeat", daemon=True).start()
+        self.controller.start(watch=self.watch and not once)
+        everything = True
+        while not self.stopping.is_set():
+            self.sync()
+            self.warm_up(everything)
+            everything = False
+            if once:
+                break
+            deadline = time.monotonic() + self.interval
+            while not self.stopping.is_set() and self.wake.wait(max(0, deadline - time.monotonic())):
+                self.wake.clear()
+                self.warm_up()
+
+    def _beat(self):
+        # Tells a GUI opened on this store that the work is being done here
+        while True:
+            try:
+                self.controller.heartbeat(self.heartbeat)
+            except OSError as e:
+                print(f"Error writing heartbeat: {e}")
+            if self.stopping.wait(self.heartbeat):
+                return
+
+    def sync(self):
+        accounts = [account for account in self.controller.accounts if account.imap_server]
+        with self.lock:
+            self.syncing = {account.email for account in accounts}
+            self.synced.clear()
+            if not self.syncing:
+                self.synced.set()
+        started = time.monotonic()
+        for account in accounts:
+            self.controller.sync_account(account)
+        while not self.synced.wait(1):
+            if self.stopping.is_set():
+                return
+        print(f"Synced {len(accounts)} accounts in {time.monotonic() - started:.1f}s")
+
+    def warm_up(self, everything=False):
+        if self.stopping.is_set():
+            return
+        with self.lock:
+            changed = self.changed
+            self.changed = set()
+        # Commits from another process are the GUI's: new flags to learn from, counts to redo
+        external = self.controller.store_changed()
+        if external:
+            self.controller.triage.invalidate()
+        accounts = [account for account in self.controller.accounts if everything or account.email in changed]
+        if not accounts and not external:
+            return
+        started = time.monotonic()
+        for account in accounts:
+            self.controller.process(account)
+        self.controller.wait_processed()
+        if self.summarize_days:
+            since = time.time() - self.summarize_days * 86400
+            for account in accounts:
+                if self.stopping.is_set():
+                    return
+                covered, failed = self.controller.presummarize(account, since, stop=self.stopping)
+                print(f"Summaries of the last {self.summarize_days} days for {account.email}: "
+                      f"{covered} messages, {failed} failed")
+        stats = self.controller.update_stats()
+        print(f"Warmed up {len(accounts)} accounts in {time.monotonic() - started:.1f}s; "
+              f"{stats.messages} messages stored")
+
+    def shutdown(self):
+        self.controller.shutdown()
+        self.controller.clear_heartbeat()
+        imap_pool.close_all()
+        body_cache.clear()
+        stop_async_backend()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--interval", type=int, default=300, help="seconds between full syncs (default 300)")
+    parser.add_argument("--once", action="store_true", help="one sync and warm-up, then exit")
+    parser.add_argument("--no-idle", action="store_true", help="don't keep IMAP IDLE connections between syncs")
+    parser.add_argument("--summarize-days", type=int, default=7,
+                        help="cache summaries of INBOX mail this recent (default 7, 0 to skip)")
+    parser.add_argument("--db", help="message store path (default: the app's)")
+    parser.add_argument("--accounts", help="saved accounts file (default: the app's)")
+    args = parser.parse_args()
+    # Log lines reach journald/docker as they happen, not when a buffer fills
+    sys.stdout.reconfigure(line_buffering=True)
+
+    store = MessageStore(args.db) if args.db else MessageStore()
+    accounts = AccountController(args.accounts) if args.accounts else None
+    daemon = MailDaemon(store, accounts, args.interval, args.summarize_days, watch=not args.no_idle)
+    running = daemon.controller.daemon_status()
+    if running and running.get("pid") != os.getpid():
+        print(f"Error: a daemon (pid {running.get('pid')}) is already keeping this store warm")
+        return 1
+    if daemon.summarize_days and not (os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_BASE_URL")):
+        print("OPENAI_API_KEY is not set; summaries are skipped")
+        daemon.summarize_days = 0
+    if not daemon.controller.accounts:
+        print("No accounts saved yet; add one in the app first")
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    print(f"Mercury daemon started for {len(daemon.controller.accounts)} accounts (pid {os.getpid()})")
+    try:
+        daemon.run(args.once)
+    finally:
+        daemon.shutdown()
+        store.close()
+    print("Mercury daemon stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# src/export.py
+"""Export stored mail, summaries and statistics to JSONL, CSV or Markdown without starting the GUI.
+
+    python -m src.export --last-days 30 --flag urgent --summaries cached --out urgent.md
+    python -m src.export --account me@example.com --since 2024-01-01 --until 2024-03-31 --out q1.jsonl
+
+Messages are streamed from the local store in batches, so memory stays flat
+however many match. JSONL and CSV exports get their statistics in a
+<out>.stats.json file alongside; Markdown reports end with them.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.controllers.account_controller import load_accounts
+from src.utils.database import MessageStore
+from src.utils.dashboard_stats import FLAGS
+from src.utils.export import SUMMARY_MODES, WRITERS, Exporter
+from src.utils.imap_pool import imap_pool
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+
+
+def output_format(args):
+    if args.format:
+        return args.format
+    extension = os.path.splitext(args.out)[1].lstrip(".").lower()
+    return {"markdown": "md", "json": "jsonl", "ndjson": "jsonl"}.get(extension, extension) \
+        if extension else "jsonl"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--out", default="-", help="output file, '-' for stdout (default)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="default: from the --out extension, else jsonl")
+    parser.add_argument("--account", help="only this account (email address)")
+    parser.add_argument("--folder", help="only this folder, e.g. INBOX")
+    parser.add_argument("--since", type=parse_day, help="first day to include, YYYY-MM-DD")
+    parser.add_argument("--until", type=parse_day, help="last day to include, YYYY-MM-DD")
+    parser.add_argument("--last-days", type=int, help="only the last N days (overrides --since)")
+    parser.add_argument("--flag", action="append", choices=FLAGS, help="only messages with this flag; repeatable")
+    parser.add_argument("--summaries", choices=SUMMARY_MODES, default="none",
+                        help="cached: from the summary cache only; generate: call the API for the rest")
+    parser.add_argument("--include-body", action="store_true", help="include the message text")
+    parser.add_argument("--fetch-bodies", action="store_true",
+                        help="download bodies that were never opened (needs the saved accounts)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel body fetches and summaries")
+    parser.add_argument("--db", help="message store path (default: the app's)")
+    parser.add_argument("--accounts", help="saved accounts file for --fetch-bodies (default: the app's)")
+    args = parser.parse_args()
+
+    fmt = output_format(args)
+    if fmt not in WRITERS:
+        parser.error(f"unknown format {fmt!r}; use --format {{{','.join(sorted(WRITERS))}}}")
+    since = args.since.timestamp() if args.since else None
+    if args.last_days is not None:
+        since = time.time() - args.last_days * 86400
+    # --until names a whole day: everything before the following midnight
+    until = (args.until + timedelta(days=1)).timestamp() if args.until else None
+
+    store = MessageStore(args.db) if args.db else MessageStore()
+    accounts = []
+    if args.fetch_bodies:
+        saved = load_accounts(args.accounts) if args.accounts else load_accounts()
+        accounts = [account for account in saved if not args.account or account.email == args.account]
+    exporter = Exporter(store, accounts, summaries=args.summaries, include_body=args.include_body,
+                        batch_size=args.batch_size, max_concurrency=args.concurrency)
+
+    to_stdout = args.out == "-"
+    stream = sys.stdout if to_stdout else open(args.out, 'w', encoding='utf-8', newline='')
+    stats_path = None if to_stdout else args.out + ".stats.json"
+    start = time.perf_counter()
+    try:
+        writer = WRITERS[fmt](stream, stats_path)
+
+        def progress(count):
+            # Each batch is flushed so a long export can be followed (or interrupted) part way
+            stream.flush()
+            if not to_stdout:
+                print(f"\r{count} messages", end="", file=sys.stderr, flush=True)
+
+        stats = exporter.export(writer, progress, account=args.account, folder=args.folder, since=since,
+                                until=until, flags=args.flag)
+    except KeyboardInterrupt:
+        print("\nInterrupted; the output holds the messages written so far", file=sys.stderr)
+        return 130
+    finally:
+        if not to_stdout:
+            stream.close()
+        if accounts:
+            imap_pool.close_all()
+        store.close()
+    failed = f", {stats.summary_failures} failed" if stats.summary_failures else ""
+    print(f"\rExported {stats.messages} messages ({stats.summarized} summarized{failed}) "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
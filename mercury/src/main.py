@@ -1,5 +1,10 @@
 import sys
+from dotenv import load_dotenv
 from PySide6.QtWidgets import QApplication
+
+# .env may set MERCURY_NETWORK_BACKEND as well as the OpenAI key, so load it before anything reads them
+load_dotenv()
+
 from src.views.main_window import MainWindow
 
 def main():
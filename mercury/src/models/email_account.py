@@ -1,7 +1,140 @@
 # src/models/email_account.py
+import base64
 import imaplib
 import email
-from email.header import decode_header
+import re
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime
+from src.models.email_message import EmailMessage, flag_from_keywords
+from src.utils.imap_pool import imap_pool
+from src.utils.async_imap import AsyncImapClient
+from src.utils.thread_index import parse_references
+
+# Header fields needed to populate the email list; bodies are fetched on demand
+LIST_HEADER_FIELDS = "SUBJECT FROM DATE MESSAGE-ID REFERENCES IN-REPLY-TO"
+LIST_FETCH_ITEMS = f"(UID FLAGS RFC822.SIZE BODY.PEEK[HEADER.FIELDS ({LIST_HEADER_FIELDS})])"
+
+_UID_RE = re.compile(rb"\bUID (\d+)")
+_SIZE_RE = re.compile(rb"\bRFC822\.SIZE (\d+)")
+_FLAGS_RE = re.compile(rb"\bFLAGS \(([^)]*)\)")
+
+
+def decode_header_value(value):
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def parse_fetch_response(msg_data):
+    # imaplib returns literals as (meta, literal) tuples; anything the server
+    # sends after the literal (e.g. ' FLAGS (...))') arrives as the next bytes item
+    parsed = []
+    after_literal = False
+    for item in msg_data:
+        if isinstance(item, tuple):
+            parsed.append([item[0], item[1]])
+            after_literal = True
+        elif isinstance(item, bytes) and after_literal:
+            parsed[-1][0] += item
+            after_literal = False
+        elif isinstance(item, bytes) and item:
+            parsed.append([item, b""])
+    return parsed
+
+
+_LIST_RE = re.compile(rb'^\(([^)]*)\) (NIL|"(?:[^"\\]|\\.)*") (.*)$', re.I)
+
+
+def parse_list_response(data):
+    # LIST replies as (name, delimiter, flags); a name sent as a literal arrives as a (line, literal) tuple
+    folders = []
+    for item in data:
+        if isinstance(item, tuple):
+            line, name = item[0], item[1]
+        elif item:
+            line, name = item, None
+        else:
+            continue
+        match = _LIST_RE.match(line)
+        if not match:
+            continue
+        flags, delimiter, rest = match.groups()
+        if name is None:
+            name = _unquote(rest) if rest.startswith(b'"') else rest
+        delimiter = None if delimiter.upper() == b"NIL" else _unquote(delimiter)
+        folders.append((name.decode(errors="replace"), delimiter.decode() if delimiter else None,
+                        tuple(flags.decode().split())))
+    return folders
+
+
+def _unquote(value):
+    return re.sub(rb'\\(.)', rb'\1', value[1:-1])
+
+
+def decode_folder_name(name):
+    # IMAP's modified UTF-7 (RFC 3501 5.1.3): "&" starts base64 of UTF-16BE, "," replaces "/", "&-" is "&"
+    parts = re.split(r"&([^-]*)-", name)
+    decoded = [parts[0]]
+    for index in range(1, len(parts), 2):
+        chunk = parts[index]
+        if chunk:
+            data = (chunk.replace(",", "/") + "===")[:len(chunk) + (-len(chunk) % 4)]
+            try:
+                decoded.append(base64.b64decode(data).decode("utf-16-be"))
+            except ValueError:
+                decoded.append(f"&{chunk}-")
+        else:
+            decoded.append("&")
+        decoded.append(parts[index + 1])
+    return "".join(decoded)
+
+
+def parse_uid_flags(meta):
+    uid = _UID_RE.search(meta)
+    flags = _FLAGS_RE.search(meta)
+    return (int(uid.group(1)) if uid else None), (flags.group(1).decode().split() if flags else [])
+
+
+def build_sequence_sets(start, end, batch_size):
+    return [f"{lo}:{min(lo + batch_size - 1, end)}" for lo in range(start, end + 1, batch_size)]
+
+
+def build_uid_set(uids, max_ranges=500):
+    # Sorted UIDs as compact "1:5,8,10:12" sets, split so no command line grows unbounded
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    parts = [f"{lo}:{hi}" if lo != hi else str(lo) for lo, hi in ranges]
+    return [",".join(parts[i:i + max_ranges]) for i in range(0, len(parts), max_ranges)]
+
+
+def build_email(meta, literal, headers_only=True, account="", folder="INBOX"):
+    email_msg = email.message_from_bytes(literal or b"")
+    uid, flags = parse_uid_flags(meta)
+    size = _SIZE_RE.search(meta)
+    try:
+        date = parsedate_to_datetime(email_msg["Date"]).timestamp() if email_msg["Date"] else None
+    except (TypeError, ValueError):
+        date = None
+    return EmailMessage(
+        account, folder, uid,
+        subject=decode_header_value(email_msg["Subject"]),
+        sender=decode_header_value(email_msg["From"]),
+        date=date,
+        message_id=(email_msg["Message-ID"] or "").strip(),
+        size=int(size.group(1)) if size else len(literal or b""),
+        flags=flags,
+        flag=flag_from_keywords(flags),
+        raw=None if headers_only else literal,
+        refs=" ".join(parse_references(email_msg["References"], email_msg["In-Reply-To"])) or None,
+    )
+
 
 class EmailAccount:
     def __init__(self, email, password, imap_server, smtp_server, imap_port=993, smtp_port=587):
@@ -12,30 +145,26 @@ class EmailAccount:
         self.imap_port = imap_port
         self.smtp_port = smtp_port
 
-    def fetch_emails(self, limit=10):
-        emails = []
+    def open_connection(self):
+        mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+        mail.login(self.email, self.password)
+        return mail
+
+    async def open_async_connection(self):
+        client = await AsyncImapClient(self.imap_server, self.imap_port).connect()
+        await client.login(self.email, self.password)
+        return client
+
+    def fetch_body(self, uid, folder='INBOX'):
         try:
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email, self.password)
-            mail.select('inbox')
-            
-            _, search_data = mail.search(None, 'ALL')
-            for num in search_data[0].split()[-limit:]:
-                _, msg_data = mail.fetch(num, '(RFC822)')
-                for response_part in msg_data:
-                    if isinstance(response_part, tuple):
-                        email_body = response_part[1]
-                        email_msg = email.message_from_bytes(email_body)
-                        subject, encoding = decode_header(email_msg["Subject"])[0]
-                        if isinstance(subject, bytes):
-                            subject = subject.decode(encoding or "utf-8")
-                        sender = email_msg["From"]
-                        emails.append({"subject": subject, "sender": sender, "raw": email_msg})
-            mail.close()
-            mail.logout()
+            _, msg_data = imap_pool.run(self, lambda conn: conn.imap.uid('FETCH', str(uid), '(BODY.PEEK[])'), folder)
+            # Raw bytes; src.utils.email_parser parses them once for the reading pane
+            for _, literal in parse_fetch_response(msg_data):
+                if literal:
+                    return literal
         except Exception as e:
-            print(f"Error fetching emails: {e}")
-        return emails
+            print(f"Error fetching email body: {e}")
+        return None
 
     def to_dict(self):
         return {
@@ -50,6 +179,6 @@ class EmailAccount:
     @classmethod
     def from_dict(cls, data):
         return cls(**data)
-    
+
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
@@ -0,0 +1,122 @@
+# src/models/email_message.py
+import sys
+from datetime import datetime, timezone
+
+from src.utils.raw_store import raw_store
+
+
+def intern_text(value):
+    return sys.intern(value) if value else value
+
+
+# Local flags are stored on the server as IMAP keywords so they survive a
+# re-fetch and show up on other clients; "unmarked" is the absence of all three
+FLAG_KEYWORDS = {"urgent": "$MercuryUrgent", "important": "$MercuryImportant", "on_track": "$MercuryOnTrack"}
+KEYWORD_FLAGS = {keyword.lower(): flag for flag, keyword in FLAG_KEYWORDS.items()}
+
+
+def flag_from_keywords(flags):
+    # Keywords are case-insensitive; if several are set the first in FLAG_KEYWORDS order wins
+    found = {KEYWORD_FLAGS[name.lower()] for name in flags if name.lower() in KEYWORD_FLAGS}
+    for flag in FLAG_KEYWORDS:
+        if flag in found:
+            return flag
+    return "unmarked"
+
+
+def labelled_by_flags(flags):
+    # 1 when the server flags say what the user thinks of the message: one of our
+    # keywords, or read and left without one
+    return int(any(name.lower() in KEYWORD_FLAGS or name.lower() == "\\seen" for name in flags))
+
+
+class EmailMessage:
+    # One row of the message list. __slots__ and interned repeated strings
+    # (account, folder, sender, flags) keep it to a few hundred bytes; the raw
+    # bytes of a fully fetched message and its decoded body live in raw_store,
+    # not in memory, and their space is given back when the message goes away.
+    # With spill=False the body given here stays a plain string instead: for
+    # messages read in bulk and dropped soon after (exports, threads, indexing)
+    # the round trip through raw_store costs more than it saves.
+    __slots__ = ("account", "folder", "uid", "subject", "sender", "date", "message_id",
+                 "size", "flags", "flag", "refs", "thread_id", "_body", "_body_ref", "_raw_ref")
+
+    def __init__(self, account, folder, uid, subject="", sender="", date=None, message_id="",
+                 size=0, flags=(), flag="unmarked", body=None, raw=None, refs=None, thread_id=None, spill=True):
+        self.account = intern_text(account)
+        self.folder = intern_text(folder)
+        self.uid = uid
+        self.subject = subject
+        self.sender = intern_text(sender)
+        self.date = date  # seconds since the epoch, None when the header is missing
+        self.message_id = message_id
+        self.size = size
+        self.flags = tuple(intern_text(flag) for flag in flags)  # IMAP system flags and keywords
+        self.flag = intern_text(flag)  # urgent / important / on_track / unmarked
+        self.refs = refs  # space-separated References/In-Reply-To ids; only kept until stored
+        self.thread_id = thread_id  # assigned by ThreadIndexer once the message is stored
+        self._body = None
+        self._body_ref = None
+        self._raw_ref = None
+        if spill:
+            self.body = body
+        else:
+            self._body = body
+        self.raw = raw
+
+    def __del__(self):
+        for ref in (getattr(self, "_body_ref", None), getattr(self, "_raw_ref", None)):
+            if ref:
+                raw_store.release(ref)
+
+    @property
+    def has_body(self):
+        # Whether the body has been fetched, without reading it back
+        return self._body is not None or self._body_ref is not None
+
+    @property
+    def body(self):
+        # Decoded text, None until the body has been fetched; read back from the spill file
+        if self._body is not None:
+            return self._body
+        if self._body_ref is None:
+            return None
+        return raw_store.get(self._body_ref).decode("utf-8", "surrogatepass")
+
+    @body.setter
+    def body(self, text):
+        if self._body_ref:
+            raw_store.release(self._body_ref)
+        self._body = None
+        self._body_ref = raw_store.put(text.encode("utf-8", "surrogatepass")) if text is not None else None
+
+    @property
+    def raw(self):
+        # Raw RFC 822 bytes, read back from the spill file; parse with src.utils.email_parser
+        return raw_store.get(self._raw_ref) if self._raw_ref else None
+
+    @raw.setter
+    def raw(self, data):
+        if self._raw_ref:
+            raw_store.release(self._raw_ref)
+        self._raw_ref = raw_store.put(data) if data else None
+
+    @property
+    def received(self):
+        if self.date is None:
+            return None
+        return datetime.fromtimestamp(self.date, timezone.utc)
+
+    def to_row(self):
+        return (self.account, self.folder, self.uid, self.message_id, self.subject, self.sender,
+                self.date, self.size, " ".join(self.flags), self.flag, self.refs, self.thread_id, self.body)
+
+    @classmethod
+    def from_row(cls, row, spill=True):
+        account, folder, uid, message_id, subject, sender, date, size, flags, flag, refs, thread_id, body = row
+        return cls(account, folder, uid, subject, sender, date, message_id, size,
+                   flags.split() if flags else (), flag or "unmarked", body, refs=refs, thread_id=thread_id,
+                   spill=spill)
+
+    def __str__(self):
+        return f"{self.subject} - From: {self.sender}"
@@ -1,36 +1,124 @@
 # src/utils/ai_summarizer.py
-from openai import OpenAI
-from dotenv import load_dotenv
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.summary_cache import SummaryCache, cache_key
+from src.utils.text_preprocess import clean_email_text, count_tokens, chunk_text, thread_text
+from src.utils.openai_client import get_openai_client
 
+_summary_cache = None
+_cache_lock = threading.Lock()
 
-# Load environment variables
-load_dotenv()
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_PROMPT = "You are a helpful assistant who summarizes email key content in brisk bullet points for ease of readability, and disregards pleasantries."
+SUMMARY_PARAMS = {
+    "temperature": 1,
+    "max_tokens": 800,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+}
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Cleaned bodies above MAX_INPUT_TOKENS are split into CHUNK_TOKENS pieces,
+# summarized in parallel (map) and the partial summaries summarized again (reduce)
+MAX_INPUT_TOKENS = 6000
+CHUNK_TOKENS = 3000
+CHUNK_PROMPT = "You summarize one part of a longer email in brisk bullet points. Keep names, dates, figures and action items; drop pleasantries."
+THREAD_PROMPT = "You summarize an email conversation in brisk bullet points: what was asked, what was decided and the open action items with their owners. Disregard pleasantries."
+REDUCE_PROMPT = "You merge partial bullet-point summaries of one long email into a single brisk bullet-point summary, removing duplicates and disregarding pleasantries."
 
-def summarize_email(email_content):
+# Separate from the summary pipeline's workers, which block on these chunk calls
+chunk_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mercury-chunk")
+
+
+def get_summary_cache():
+    # Shared with the email tab so it can show hit/miss counters. Opened on first
+    # use, not at import. MERCURY_SUMMARY_CACHE=memory keeps summaries for this
+    # session only and =off disables caching; the default keeps them on disk
+    global _summary_cache
+    with _cache_lock:
+        if _summary_cache is None:
+            mode = os.getenv("MERCURY_SUMMARY_CACHE", "disk").lower()
+            if mode == "off":
+                return None
+            _summary_cache = SummaryCache(':memory:') if mode == "memory" else SummaryCache()
+        return _summary_cache
+
+
+def complete(system_prompt, user_content):
+    response = get_openai_client().chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": user_content
+            }
+        ],
+        **SUMMARY_PARAMS
+    )
+    tokens = response.usage.total_tokens if response.usage else 0
+    return response.choices[0].message.content.strip(), tokens
+
+
+def map_reduce(text):
+    chunks = chunk_text(text, CHUNK_TOKENS)
+    results = list(chunk_executor.map(
+        lambda part: complete(CHUNK_PROMPT, f"Summarize this part of an email:\n\n{part}"), chunks))
+    tokens = sum(used for _, used in results)
+    combined = "\n\n".join(summary for summary, _ in results)
+    # Very long threads can need more than one reduce round
+    if count_tokens(combined) > MAX_INPUT_TOKENS:
+        summary, used = map_reduce(combined)
+        return summary, tokens + used
+    summary, used = complete(REDUCE_PROMPT, f"Merge these partial summaries:\n\n{combined}")
+    return summary, tokens + used
+
+
+def summarize_email(email_content, cache=None, raise_errors=False):
+    # cache: a SummaryCache, or None for the shared one
+    return summarize_text(clean_email_text(email_content), SUMMARY_PROMPT, "Summarize the following email",
+                          cache, raise_errors)
+
+
+def cached_summary(email_content, cache=None):
+    # Cache lookup only, never an API call; None when the message hasn't been summarized yet
+    text = clean_email_text(email_content)
+    cache = cache or get_summary_cache()
+    if not text or cache is None:
+        return None
+    return cache.get(cache_key(text, SUMMARY_MODEL, SUMMARY_PROMPT, SUMMARY_PARAMS))
+
+
+def summarize_thread(messages, cache=None, raise_errors=False):
+    # messages: (sender, date, body) oldest first; one request for the whole conversation
+    return summarize_text(thread_text(messages), THREAD_PROMPT, "Summarize the following email conversation",
+                          cache, raise_errors)
+
+
+def summarize_text(text, system_prompt, instruction, cache=None, raise_errors=False):
+    if not text:
+        return "No content to summarize."
+    key = cache_key(text, SUMMARY_MODEL, system_prompt, SUMMARY_PARAMS)
+    cache = cache or get_summary_cache()
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", 
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant who summarizes email key content in brisk bullet points for ease of readability, and disregards pleasantries."
-                },
-                {
-                    "role": "user",
-                    "content": f"Summarize the following email:\n\n{email_content}"
-                }
-            ],
-            temperature=1,
-            max_tokens=4000,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0
-        )
-        return response.choices[0].message.content.strip()
+        started = time.perf_counter()
+        if count_tokens(text) > MAX_INPUT_TOKENS:
+            summary, tokens = map_reduce(text)
+        else:
+            summary, tokens = complete(system_prompt, f"{instruction}:\n\n{text}")
+        if cache is not None:
+            cache.put(key, summary, time.perf_counter() - started, tokens)
+        return summary
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error in AI summarization: {e}")
-        return "Unable to summarize email content."
\ No newline at end of file
+        return "Unable to summarize email content."
@@ -0,0 +1,58 @@
+# src/utils/async_backend.py
+import asyncio
+import os
+import threading
+
+# "thread" runs blocking imaplib/smtplib calls on QThreadPool workers,
+# "async" runs coroutines on the shared event loop below
+NETWORK_BACKEND = os.getenv("MERCURY_NETWORK_BACKEND", "thread").lower()
+
+
+def use_async_backend():
+    return NETWORK_BACKEND == "async"
+
+
+class AsyncBackend:
+    # One asyncio loop on a companion thread of the Qt event loop. Qt code hands
+    # coroutines over with submit(); completion callbacks run on the loop thread,
+    # so views pass results back through Qt signals, which queue them onto the
+    # GUI thread.
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="mercury-asyncio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro, callback=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_async_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = AsyncBackend()
+        return _backend
+
+
+def stop_async_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.stop()
+            _backend = None
@@ -0,0 +1,277 @@
+# src/utils/async_imap.py
+import asyncio
+import itertools
+import re
+import ssl
+from contextlib import asynccontextmanager
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+_TAGGED_RE = re.compile(rb"^(\S+) (OK|NO|BAD) ?(.*)", re.S)
+_UNTAGGED_NUM_RE = re.compile(rb"^\* (\d+) ([A-Z-]+)(?: (.*))?", re.S)
+_UNTAGGED_RE = re.compile(rb"^\* ([A-Z-]+)(?: (.*))?", re.S)
+_RESPONSE_CODE_RE = re.compile(rb"\[([A-Z-]+)(?: ([^\]]*))?\]")
+
+
+class AsyncImapError(Exception):
+    pass
+
+
+class AsyncImapClient:
+    # Commands are written as soon as they are issued and matched to their
+    # tagged completion by a single reader task, so several commands can be in
+    # flight on one connection. Untagged data is attributed to the oldest
+    # outstanding command, which is how servers answer pipelined requests.
+    # Unsolicited responses land there too, each under its own name: an
+    # EXISTS or EXPUNGE the server reports mid-FETCH sits next to the FETCH
+    # data, not in it (and never mid sequence-number FETCH, RFC 3501 7.4.1),
+    # so callers reading one name are unaffected. An unsolicited FETCH flag
+    # update does end up among the FETCH data; parse_emails() skips it.
+    # Results use imaplib's shapes so parse_fetch_response() works unchanged.
+
+    def __init__(self, host, port=993, use_ssl=True, timeout=60):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.capabilities = ()
+        self._tags = (f"M{n:05d}" for n in itertools.count(1))
+        self._pending = {}
+        self._reader = self._writer = self._read_task = None
+        # Set while IDLE is in progress
+        self._continuation = None
+        self._activity = None
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout)
+        greeting = await self._reader.readline()
+        if not greeting.startswith(b"* OK") and not greeting.startswith(b"* PREAUTH"):
+            raise AsyncImapError(f"Unexpected greeting: {greeting!r}")
+        self._read_task = asyncio.ensure_future(self._read_loop())
+        await self.capability()
+        return self
+
+    async def capability(self):
+        # Servers may advertise more (e.g. IDLE) once logged in, so this can be asked again
+        _, data = await self.command("CAPABILITY")
+        self.capabilities = tuple((data.get("CAPABILITY", [b""])[-1]).decode().upper().split())
+        return self.capabilities
+
+    async def _read_response(self):
+        line = await self._reader.readline()
+        if not line:
+            return None
+        parts = []
+        while True:
+            match = _LITERAL_RE.search(line)
+            if not match:
+                parts.append(line.rstrip(b"\r\n"))
+                return parts
+            literal = await self._reader.readexactly(int(match.group(1)))
+            parts.append((line.rstrip(b"\r\n"), literal))
+            line = await self._reader.readline()
+
+    async def _read_loop(self):
+        error = AsyncImapError("Connection closed")
+        try:
+            while True:
+                parts = await self._read_response()
+                if parts is None:
+                    break
+                self._dispatch(parts)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            error = AsyncImapError(str(e))
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    def _dispatch(self, parts):
+        head = parts[0][0] if isinstance(parts[0], tuple) else parts[0]
+        if head.startswith(b"+"):
+            if self._continuation is not None and not self._continuation.done():
+                self._continuation.set_result(head)
+            return
+        if head.startswith(b"* "):
+            if not self._pending:
+                return
+            untagged = next(iter(self._pending.values()))[1]
+            self._store_untagged(head, parts, untagged)
+            if self._activity is not None:
+                self._activity.set()
+            return
+        match = _TAGGED_RE.match(head)
+        if match is None:
+            return
+        tag = match.group(1).decode()
+        future, untagged = self._pending.pop(tag, (None, None))
+        if future is not None and not future.done():
+            future.set_result((match.group(2).decode(), untagged, match.group(3)))
+
+    @staticmethod
+    def _store_untagged(head, parts, untagged):
+        code = _RESPONSE_CODE_RE.search(head)
+        if code and (head.startswith(b"* OK") or head.startswith(b"* NO")):
+            untagged.setdefault(code.group(1).decode(), []).append(code.group(2) or b"")
+            return
+        match = _UNTAGGED_NUM_RE.match(head)
+        if match:
+            name = match.group(2).decode()
+            prefix = match.group(1) + (b" " if match.group(3) is not None else b"")
+            if isinstance(parts[0], tuple):
+                # Same layout as imaplib: (meta, literal) tuples followed by the trailing bytes
+                first = (prefix + parts[0][0].split(b" ", 3)[3], parts[0][1])
+                untagged.setdefault(name, []).extend([first] + parts[1:])
+            else:
+                untagged.setdefault(name, []).append(prefix + (match.group(3) or b""))
+            return
+        match = _UNTAGGED_RE.match(head)
+        if match:
+            untagged.setdefault(match.group(1).decode(), []).append(match.group(2) or b"")
+
+    async def command(self, name, *args):
+        if self._writer is None:
+            raise AsyncImapError("Not connected")
+        tag = next(self._tags)
+        future = asyncio.get_running_loop().create_future()
+        untagged = {}
+        self._pending[tag] = (future, untagged)
+        line = " ".join((tag, name) + tuple(str(arg) for arg in args))
+        self._writer.write(line.encode() + b"\r\n")
+        await self._writer.drain()
+        typ, untagged, text = await asyncio.wait_for(future, self.timeout)
+        if typ != "OK":
+            raise AsyncImapError(f"{name} failed: {text.decode(errors='replace')}")
+        return typ, untagged
+
+    async def login(self, user, password):
+        return await self.command("LOGIN", quote(user), quote(password))
+
+    async def select(self, folder):
+        return await self.command("SELECT", quote(folder))
+
+    async def fetch(self, message_set, items):
+        _, untagged = await self.command("FETCH", message_set, items)
+        return "OK", untagged.get("FETCH", [])
+
+    async def uid(self, command, *args):
+        _, untagged = await self.command("UID", command, *args)
+        key = "SEARCH" if command.upper() == "SEARCH" else "FETCH"
+        data = untagged.get(key, [])
+        return "OK", data if data or key == "FETCH" else [b""]
+
+    async def idle(self, timeout=25 * 60, settle=0.25):
+        # RFC 2177. Waits until the server reports a change or timeout runs out
+        # (servers drop IDLE after 30 minutes), gives a burst of notifications
+        # `settle` seconds to arrive, then sends DONE. Returns the untagged
+        # responses collected meanwhile, shaped like command()'s.
+        if self._writer is None:
+            raise AsyncImapError("Not connected")
+        loop = asyncio.get_running_loop()
+        tag = next(self._tags)
+        future = loop.create_future()
+        untagged = {}
+        self._pending[tag] = (future, untagged)
+        self._continuation = loop.create_future()
+        self._activity = asyncio.Event()
+        try:
+            self._writer.write(f"{tag} IDLE\r\n".encode())
+            await self._writer.drain()
+            # A tagged NO/BAD instead of "+ idling" means the server refused
+            await asyncio.wait_for(asyncio.wait({self._continuation, future}, return_when=asyncio.FIRST_COMPLETED),
+                                   self.timeout)
+            if not future.done():
+                activity = asyncio.ensure_future(self._activity.wait())
+                try:
+                    await asyncio.wait({activity, future}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if activity.done() and not future.done():
+                        await asyncio.sleep(settle)
+                finally:
+                    activity.cancel()
+                if not future.done():
+                    self._writer.write(b"DONE\r\n")
+                    await self._writer.drain()
+            typ, untagged, text = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._continuation = self._activity = None
+        if typ != "OK":
+            raise AsyncImapError(f"IDLE failed: {text.decode(errors='replace')}")
+        return typ, untagged
+
+    async def noop(self):
+        return await self.command("NOOP")
+
+    async def logout(self):
+        try:
+            await self.command("LOGOUT")
+        except AsyncImapError:
+            pass
+        self.close()
+
+    def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def quote(value):
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class AsyncImapConnection:
+    # Async counterpart of imap_pool.PooledConnection
+    def __init__(self, client):
+        self.imap = client
+        self.folder = None
+        self.exists = 0
+        self.uidvalidity = None
+        self.uidnext = None
+        self.highest_modseq = None
+
+    async def select(self, folder):
+        _, untagged = await self.imap.select(folder)
+        self.folder = folder
+        self.exists = int((untagged.get("EXISTS") or [b"0"])[-1].split()[0])
+        self.uidvalidity = _response_code(untagged, "UIDVALIDITY")
+        self.uidnext = _response_code(untagged, "UIDNEXT")
+        self.highest_modseq = _response_code(untagged, "HIGHESTMODSEQ")
+
+
+def _response_code(untagged, name):
+    values = untagged.get(name)
+    return int(values[-1].split()[0]) if values else None
+
+
+class AsyncImapPool:
+    # Keeps logged-in connections per account idle between operations and
+    # limits concurrent connections per server
+    def __init__(self, max_per_server=4):
+        self.max_per_server = max_per_server
+        self._idle = {}
+        self._server_slots = {}
+
+    @asynccontextmanager
+    async def connection(self, account, folder='INBOX'):
+        key = (account.imap_server, account.imap_port)
+        slots = self._server_slots.setdefault(key, asyncio.Semaphore(self.max_per_server))
+        async with slots:
+            idle = self._idle.setdefault((account.email,) + key, [])
+            conn = idle.pop() if idle else None
+            if conn is None:
+                conn = AsyncImapConnection(await account.open_async_connection())
+            try:
+                await conn.select(folder)
+                yield conn
+            except BaseException:
+                # Failed or cancelled mid-command: replies may still be in flight, don't reuse
+                conn.imap.close()
+                raise
+            idle.append(conn)
+
+    async def close_all(self):
+        idle = [conn for conns in self._idle.values() for conn in conns]
+        self._idle = {}
+        await asyncio.gather(*(conn.imap.logout() for conn in idle), return_exceptions=True)
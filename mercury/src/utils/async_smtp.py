@@ -0,0 +1,116 @@
+# src/utils/async_smtp.py
+import asyncio
+import base64
+import ssl
+
+
+class AsyncSmtpError(Exception):
+    pass
+
+
+class AsyncSmtpClient:
+    # Port 465 uses implicit TLS; other ports must upgrade with STARTTLS. A
+    # server that doesn't offer it is refused rather than sent the password in
+    # the clear (an attacker can strip STARTTLS from the EHLO reply). With
+    # PIPELINING, MAIL/RCPT/DATA go out in one write.
+
+    def __init__(self, host, port=587, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.extensions = {}
+        self._reader = self._writer = None
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.port == 465 else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context,
+                                    server_hostname=self.host if context else None), self.timeout)
+        await self._expect(220)
+        await self.ehlo()
+        if context is None:
+            if "STARTTLS" not in self.extensions:
+                self._writer.close()
+                raise AsyncSmtpError(f"{self.host} doesn't offer STARTTLS; not logging in unencrypted")
+            await self.starttls()
+        return self
+
+    async def _reply(self):
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            if not line:
+                raise AsyncSmtpError("Connection closed")
+            lines.append(line[4:].rstrip(b"\r\n").decode(errors="replace"))
+            if line[3:4] != b"-":
+                return int(line[:3]), lines
+
+    async def _expect(self, *codes):
+        code, lines = await self._reply()
+        if code not in codes:
+            raise AsyncSmtpError(f"{code} {' '.join(lines)}")
+        return code, lines
+
+    async def _command(self, line, *codes):
+        self._writer.write(line.encode() + b"\r\n")
+        await self._writer.drain()
+        return await self._expect(*codes)
+
+    async def ehlo(self):
+        _, lines = await self._command("EHLO mercury.localdomain", 250)
+        self.extensions = {}
+        for line in lines[1:]:
+            name, _, params = line.partition(" ")
+            self.extensions[name.upper()] = params
+
+    async def starttls(self):
+        await self._command("STARTTLS", 220)
+        context = ssl.create_default_context()
+        if hasattr(self._writer, "start_tls"):
+            await self._writer.start_tls(context, server_hostname=self.host)
+        else:
+            # Python < 3.11: upgrade the transport and wrap it in a new writer
+            loop = asyncio.get_running_loop()
+            transport = self._writer.transport
+            protocol = transport.get_protocol()
+            tls_transport = await loop.start_tls(transport, protocol, context, server_hostname=self.host)
+            self._writer = asyncio.StreamWriter(tls_transport, protocol, self._reader, loop)
+        await self.ehlo()
+
+    async def login(self, user, password):
+        methods = self.extensions.get("AUTH", "").upper().split()
+        if "PLAIN" in methods or not methods:
+            token = base64.b64encode(f"\0{user}\0{password}".encode()).decode()
+            await self._command(f"AUTH PLAIN {token}", 235)
+        else:
+            await self._command("AUTH LOGIN", 334)
+            await self._command(base64.b64encode(user.encode()).decode(), 334)
+            await self._command(base64.b64encode(password.encode()).decode(), 235)
+
+    async def send_message(self, message, from_addr, to_addrs):
+        commands = [f"MAIL FROM:<{from_addr}>"] + [f"RCPT TO:<{addr}>" for addr in to_addrs] + ["DATA"]
+        expected = [(250,)] + [(250, 251)] * len(to_addrs) + [(354,)]
+        if "PIPELINING" in self.extensions:
+            self._writer.write("".join(f"{command}\r\n" for command in commands).encode())
+            await self._writer.drain()
+            for codes in expected:
+                await self._expect(*codes)
+        else:
+            for command, codes in zip(commands, expected):
+                await self._command(command, *codes)
+
+        data = message.as_bytes().replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        # Dot-stuffing (RFC 5321 4.5.2)
+        data = b"\r\n".join(b"." + line if line.startswith(b".") else line for line in data.split(b"\r\n"))
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self._writer.write(data + b".\r\n")
+        await self._writer.drain()
+        await self._expect(250)
+
+    async def quit(self):
+        try:
+            await self._command("QUIT", 221)
+        except (AsyncSmtpError, OSError, asyncio.TimeoutError):
+            pass
+        self._writer.close()
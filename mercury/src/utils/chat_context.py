@@ -0,0 +1,136 @@
+# src/utils/chat_context.py
+import json
+import os
+import threading
+
+from src.utils.text_preprocess import count_tokens
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'chat_history.jsonl')
+
+# Role markers and separators the API adds around each message
+MESSAGE_OVERHEAD = 4
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+class ChatContext:
+    # Keeps the whole conversation for display and on disk, but sends the model
+    # only a rolling summary of older turns plus the most recent ones, within
+    # token_budget. Once more than fold_after messages (or more than the budget)
+    # are unsummarized, everything but the last keep_turns is folded into the
+    # summary by fold(), which is meant to run off the GUI thread.
+    #
+    # The history file is append-only JSON lines: one line per message, plus a
+    # {"summary", "summarized"} line after each fold, so saving a turn costs
+    # the same however long the conversation is.
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, token_budget=3000, keep_turns=6, fold_after=12):
+        self.path = path
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.fold_after = fold_after
+        self.messages = []
+        self.summary = ""
+        self.summarized = 0  # messages[:summarized] are covered by the summary
+        self.generation = 0  # bumped by clear() so an in-flight fold is discarded
+        self.folding = False
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if "summary" in record:
+                        self.summary = record["summary"]
+                        self.summarized = record["summarized"]
+                    else:
+                        self.messages.append(record)
+            self.summarized = min(self.summarized, len(self.messages))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading chat history: {e}")
+
+    def _append(self, record):
+        if self.path is None:
+            return
+        try:
+            with self.file_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error saving chat history: {e}")
+
+    def add(self, role, content):
+        message = {"role": role, "content": content}
+        with self.lock:
+            self.messages.append(message)
+        self._append(message)
+
+    def clear(self):
+        with self.lock:
+            self.messages = []
+            self.summary = ""
+            self.summarized = 0
+            self.generation += 1
+        if self.path is not None and os.path.exists(self.path):
+            with self.file_lock:
+                os.remove(self.path)
+
+    def build_messages(self, system_prompt):
+        with self.lock:
+            recent = self.messages[self.summarized:]
+            summary = self.summary
+        if summary:
+            system_prompt = f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+        system = {"role": "system", "content": system_prompt}
+        # Newest first until the budget runs out; the latest message always goes
+        budget = self.token_budget - message_tokens(system)
+        kept = []
+        for message in reversed(recent):
+            tokens = message_tokens(message)
+            if kept and tokens > budget:
+                break
+            kept.append(message)
+            budget -= tokens
+        return [system, *reversed(kept)]
+
+    def needs_fold(self):
+        with self.lock:
+            if self.folding:
+                return False
+            recent = self.messages[self.summarized:]
+        if len(recent) <= self.keep_turns:
+            return False
+        return len(recent) > self.fold_after or sum(map(message_tokens, recent)) > self.token_budget
+
+    def fold(self, summarize):
+        # summarize(previous_summary, messages) -> new summary; called without the lock held
+        with self.lock:
+            upto = len(self.messages) - self.keep_turns
+            if self.folding or upto <= self.summarized:
+                return False
+            turns = self.messages[self.summarized:upto]
+            previous = self.summary
+            generation = self.generation
+            self.folding = True
+        try:
+            summary = summarize(previous, turns)
+        finally:
+            with self.lock:
+                self.folding = False
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.summary = summary
+            self.summarized = upto
+            self._append({"summary": summary, "summarized": upto})
+        return True
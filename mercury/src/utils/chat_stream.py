@@ -0,0 +1,67 @@
+# src/utils/chat_stream.py
+import time
+
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant."
+CHAT_PARAMS = {
+    "temperature": 1,
+    "max_tokens": 4000,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+}
+CHAT_SUMMARY_PROMPT = ("You keep a compact running summary of a conversation between a user and an assistant. "
+                       "Merge the new turns into the existing summary, keeping facts, decisions, names and open "
+                       "questions. Reply with the summary only.")
+
+
+def stream_chat(client, messages, on_delta, cancelled=None, flush_interval=0.03):
+    # Streams a chat completion, calling on_delta(text) with the tokens received
+    # since the last call. Deltas are coalesced to at most one call per
+    # flush_interval so the GUI repaints a few dozen times a second, not per token.
+    # Stops early (closing the HTTP response) once cancelled is set.
+    stream = client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        stream=True,
+        **CHAT_PARAMS
+    )
+    parts = []
+    pending = []
+    last_flush = time.perf_counter()
+    try:
+        for chunk in stream:
+            if cancelled is not None and cancelled.is_set():
+                break
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            pending.append(delta)
+            now = time.perf_counter()
+            # The first token goes out immediately; that's the latency users notice
+            if len(parts) == 1 or now - last_flush >= flush_interval:
+                on_delta("".join(pending))
+                pending = []
+                last_flush = now
+    finally:
+        stream.close()
+    if pending:
+        on_delta("".join(pending))
+    return "".join(parts)
+
+
+def summarize_turns(client, summary, turns):
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in turns)
+    response = client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": CHAT_SUMMARY_PROMPT},
+            {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        temperature=0.3,
+        max_tokens=500
+    )
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,166 @@
+# src/utils/dashboard_stats.py
+import re
+from collections import Counter
+
+FLAGS = ("urgent", "important", "on_track", "unmarked")
+
+_TERM_RE = re.compile(r"[^\W\d_][\w'-]{2,}")
+
+SUBJECT_STOPWORDS = frozenset("""
+re fw fwd aw the and for you your with from this that are was have has our not but all can will about
+into out new now get got its it's just please thanks thank per via
+""".split())
+
+
+def subject_terms(subject):
+    return tuple(term for term in _TERM_RE.findall((subject or "").lower()) if term not in SUBJECT_STOPWORDS)
+
+
+class DashboardStats:
+    # Running totals for the dashboard: flag counts, sender frequencies and
+    # subject term frequencies over the messages currently listed. Each
+    # message's contribution is remembered by key so it can be taken back out;
+    # adding, removing or re-flagging one message touches only its own entries.
+    # The *_changed sets/flags record what a view needs to repaint.
+
+    def __init__(self):
+        self.flag_counts = Counter({flag: 0 for flag in FLAGS})
+        self.sender_counts = Counter()
+        self.term_counts = Counter()
+        self.entries = {}  # key -> [flag, sender, terms]
+        self.terms_version = 0
+        self.reset_changes()
+
+    @staticmethod
+    def key(email):
+        return (email.account, email.folder, email.uid)
+
+    def reset_changes(self):
+        self.flags_changed = False
+        self.senders_added = set()
+        self.senders_removed = set()
+        self.terms_changed = False
+
+    def add(self, email):
+        key = self.key(email)
+        if key in self.entries:
+            self.remove(key)
+        terms = subject_terms(email.subject)
+        self.entries[key] = [email.flag, email.sender, terms]
+        self.flag_counts[email.flag] += 1
+        self.flags_changed = True
+        self.sender_counts[email.sender] += 1
+        if self.sender_counts[email.sender] == 1:
+            self.senders_added.add(email.sender)
+            self.senders_removed.discard(email.sender)
+        if terms:
+            self.term_counts.update(terms)
+            self._terms_touched()
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        flag, sender, terms = entry
+        self.flag_counts[flag] -= 1
+        self.flags_changed = True
+        self.sender_counts[sender] -= 1
+        if self.sender_counts[sender] <= 0:
+            del self.sender_counts[sender]
+            self.senders_removed.add(sender)
+            self.senders_added.discard(sender)
+        if terms:
+            self.term_counts.subtract(terms)
+            for term in terms:
+                if self.term_counts[term] <= 0:
+                    del self.term_counts[term]
+            self._terms_touched()
+
+    def set_flag(self, email):
+        entry = self.entries.get(self.key(email))
+        if entry is None:
+            self.add(email)
+            return
+        self._reflag(entry, email.flag)
+
+    def apply(self, added, removed, reflagged):
+        # A change to the message list (see ListChanges): messages added, keys removed and
+        # (key, flag) of messages re-flagged since; only those entries are touched
+        for key in removed:
+            self.remove(key)
+        for email in added:
+            self.add(email)
+        for key, flag in reflagged:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self._reflag(entry, flag)
+
+    def clear(self):
+        self.__init__()
+        self.flags_changed = True
+        self.terms_changed = True
+
+    def _reflag(self, entry, flag):
+        if entry[0] != flag:
+            self.flag_counts[entry[0]] -= 1
+            self.flag_counts[flag] += 1
+            entry[0] = flag
+            self.flags_changed = True
+
+    def _terms_touched(self):
+        self.terms_changed = True
+        self.terms_version += 1
+
+
+class MailboxStats:
+    # Totals over a whole mailbox (or an export), streamed past once. Unlike
+    # DashboardStats nothing is kept per message (there is nothing to take back
+    # out), so memory grows with distinct senders and subject terms, not with
+    # the number of messages. The daemon saves as_dict() snapshots in the store.
+
+    def __init__(self):
+        self.messages = 0
+        self.summarized = 0
+        self.summary_failures = 0
+        self.first = None
+        self.last = None
+        self.flag_counts = Counter({flag: 0 for flag in FLAGS})
+        self.sender_counts = Counter()
+        self.term_counts = Counter()
+
+    def add(self, email, summary=None, summary_failed=False):
+        self.messages += 1
+        self.summarized += summary is not None
+        self.summary_failures += summary_failed
+        if email.date is not None:
+            self.first = email.date if self.first is None else min(self.first, email.date)
+            self.last = email.date if self.last is None else max(self.last, email.date)
+        self.flag_counts[email.flag] += 1
+        self.sender_counts[email.sender] += 1
+        self.term_counts.update(subject_terms(email.subject))
+
+    def merge(self, other):
+        self.messages += other.messages
+        self.summarized += other.summarized
+        self.summary_failures += other.summary_failures
+        for date in (other.first, other.last):
+            if date is not None:
+                self.first = date if self.first is None else min(self.first, date)
+                self.last = date if self.last is None else max(self.last, date)
+        self.flag_counts.update(other.flag_counts)
+        self.sender_counts.update(other.sender_counts)
+        self.term_counts.update(other.term_counts)
+
+    def as_dict(self, top=20):
+        # first/last are timestamps (or None)
+        return {
+            "messages": self.messages,
+            "summarized": self.summarized,
+            "summary_failures": self.summary_failures,
+            "first": self.first,
+            "last": self.last,
+            "flags": dict(self.flag_counts),
+            "unique_senders": len(self.sender_counts),
+            "top_senders": self.sender_counts.most_common(top),
+            "top_subject_terms": self.term_counts.most_common(top),
+        }
@@ -0,0 +1,501 @@
+# src/utils/database.py
+import json
+import os
+import re
+import time
+import sqlite3
+import threading
+from src.models.email_message import EmailMessage, flag_from_keywords, labelled_by_flags
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'mail_store.db')
+
+# Bump when the schema changes; the store is a cache of the server so older
+# versions are simply dropped and re-synced. pending_flags is the exception:
+# it holds flag changes not yet on the server, so it is kept (migrate its rows
+# if its columns ever change)
+SCHEMA_VERSION = 6
+
+MESSAGE_COLUMNS = "account, folder, uid, message_id, subject, sender, date, size, flags, flag, refs, thread_id, body"
+# Same shape for list views, but bodies and references stay on disk; threading reads refs itself
+LIST_COLUMNS = MESSAGE_COLUMNS.replace("refs", "NULL").replace("body", "NULL")
+# The same for queries joining messages as m
+JOINED_LIST_COLUMNS = ", ".join(column if column == "NULL" else f"m.{column}" for column in LIST_COLUMNS.split(", "))
+# ORDER BY for the message list's columns (date, sender, subject, flag); a folder by date walks idx_messages_date
+LIST_ORDER = ("date", "lower(sender)", "lower(subject)", "flag")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folder_state (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    highest_modseq INTEGER,
+    -- Set once every message older than the first sync's window has been backfilled
+    complete INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS folders (
+    account TEXT NOT NULL,
+    name TEXT NOT NULL,
+    delimiter TEXT,
+    flags TEXT,
+    PRIMARY KEY (account, name)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT,
+    subject TEXT,
+    sender TEXT,
+    date REAL,
+    size INTEGER,
+    flags TEXT,
+    flag TEXT NOT NULL DEFAULT 'unmarked',
+    -- Space-separated References/In-Reply-To Message-IDs, oldest first
+    refs TEXT,
+    -- Conversation the message belongs to, maintained by ThreadIndexer
+    thread_id INTEGER,
+    -- NULL until local triage has looked at the message; 1 if triage set its flag and queued it
+    -- for the server, 2 if it set it locally only, otherwise 0
+    triaged INTEGER,
+    -- 1 once the flag is one the user or the server gave: set by hand, a Mercury keyword on the
+    -- server, or a message read (\\Seen) and left unmarked. Triage trains only on these
+    labelled INTEGER NOT NULL DEFAULT 0,
+    body TEXT,
+    UNIQUE (account, folder, uid)
+);
+-- Local flag changes not yet stored on the server; one row per message, so
+-- re-flagging before the push only replaces the target
+CREATE TABLE IF NOT EXISTS pending_flags (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    flag TEXT NOT NULL,
+    PRIMARY KEY (account, folder, uid)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages (account, folder, date);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (account, sender);
+CREATE INDEX IF NOT EXISTS idx_messages_flag ON messages (account, flag);
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages (account, thread_id);
+CREATE INDEX IF NOT EXISTS idx_messages_untriaged ON messages (account) WHERE triaged IS NULL;
+-- Precomputed results (mailbox statistics) as JSON, so a GUI attaching to a
+-- store kept warm by the daemon doesn't have to redo them
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    data TEXT NOT NULL
+);
+-- Keyset order of iter_messages, so each export batch starts where the last one stopped
+CREATE INDEX IF NOT EXISTS idx_messages_export ON messages (COALESCE(date, 0), id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, body, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (new.id, new.subject, new.sender, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES ('delete', old.id, old.subject, old.sender, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF subject, sender, body ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES ('delete', old.id, old.subject, old.sender, old.body);
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (new.id, new.subject, new.sender, new.body);
+END;
+"""
+
+_SEARCH_TERM_RE = re.compile(r'(?:(subject|sender|body):)?(\w+)', re.I)
+
+
+def build_fts_query(text):
+    # Every word becomes a quoted prefix term so user input can't break FTS5 syntax;
+    # "sender:alice" style prefixes restrict a term to one column
+    terms = []
+    for column, word in _SEARCH_TERM_RE.findall(text):
+        term = f'"{word}"*'
+        terms.append(f"{column.lower()} : {term}" if column else term)
+    return " ".join(terms)
+
+
+class MessageStore:
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=1000):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        # Shared between the GUI thread and fetch workers, serialized by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        with self.conn:
+            if version < SCHEMA_VERSION:
+                self.conn.executescript(
+                    "DROP TABLE IF EXISTS messages_fts; DROP TABLE IF EXISTS messages; "
+                    "DROP TABLE IF EXISTS folder_state; "
+                    "DROP TABLE IF EXISTS folders; DROP TABLE IF EXISTS stats;")
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get_folder_state(self, account, folder):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT uidvalidity, last_uid, highest_modseq, complete FROM folder_state "
+                "WHERE account = ? AND folder = ?", (account, folder)).fetchone()
+        if row is None:
+            return None
+        return {"uidvalidity": row[0], "last_uid": row[1], "highest_modseq": row[2], "complete": bool(row[3])}
+
+    def set_folder_state(self, account, folder, uidvalidity, last_uid, highest_modseq=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO folder_state (account, folder, uidvalidity, last_uid, highest_modseq) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (account, folder) DO UPDATE SET "
+                "uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid, "
+                "highest_modseq = excluded.highest_modseq",
+                (account, folder, uidvalidity, last_uid, highest_modseq))
+
+    def set_folder_complete(self, account, folder):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE folder_state SET complete = 1 WHERE account = ? AND folder = ?", (account, folder))
+
+    def set_folders(self, account, folders):
+        # folders: (name, delimiter, flags) from LIST; folders gone from the server lose their messages
+        names = {name for name, _, _ in folders}
+        with self.lock, self.conn:
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT name FROM folders WHERE account = ?", (account,)) if row[0] not in names]
+            for name in stale:
+                for table in ("messages", "folder_state", "pending_flags"):
+                    self.conn.execute(f"DELETE FROM {table} WHERE account = ? AND folder = ?", (account, name))
+            self.conn.execute("DELETE FROM folders WHERE account = ?", (account,))
+            self.conn.executemany(
+                "INSERT INTO folders (account, name, delimiter, flags) VALUES (?, ?, ?, ?)",
+                [(account, name, delimiter, " ".join(flags)) for name, delimiter, flags in folders])
+
+    def load_folders(self, account):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, delimiter, flags FROM folders WHERE account = ? ORDER BY name", (account,)).fetchall()
+        return [(name, delimiter, tuple((flags or "").split())) for name, delimiter, flags in rows]
+
+    def purge_folder(self, account, folder):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM messages WHERE account = ? AND folder = ?", (account, folder))
+            self.conn.execute("DELETE FROM folder_state WHERE account = ? AND folder = ?", (account, folder))
+            self.conn.execute("DELETE FROM pending_flags WHERE account = ? AND folder = ?", (account, folder))
+
+    def add_messages(self, messages):
+        # Upsert keeps the local flag and any fetched body; one transaction per call
+        rows = [message.to_row() + (labelled_by_flags(message.flags),) for message in messages]
+        with self.lock, self.conn:
+            for start in range(0, len(rows), self.batch_size):
+                # A new row takes a flag still waiting to be pushed (kept across a schema rebuild) over the server's
+                self.conn.executemany(
+                    f"INSERT INTO messages ({MESSAGE_COLUMNS}, labelled) VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, "
+                    "?9, COALESCE((SELECT flag FROM pending_flags p WHERE p.account = ?1 AND p.folder = ?2 "
+                    "AND p.uid = ?3), ?10), ?11, ?12, ?13, ?14 OR EXISTS (SELECT 1 FROM pending_flags p "
+                    "WHERE p.account = ?1 AND p.folder = ?2 AND p.uid = ?3)) "
+                    "ON CONFLICT (account, folder, uid) DO UPDATE SET message_id = excluded.message_id, "
+                    "subject = excluded.subject, sender = excluded.sender, date = excluded.date, "
+                    "size = excluded.size, flags = excluded.flags, refs = excluded.refs, "
+                    "labelled = MAX(labelled, excluded.labelled)",
+                    rows[start:start + self.batch_size])
+
+    def update_flags(self, account, folder, flags_by_uid):
+        # Server flags win for the local flag too, unless a local change is still waiting to be
+        # pushed. A triage guess kept local stays until the server carries a flag of its own
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE messages SET flags = ?1, labelled = MAX(labelled, ?3), "
+                "flag = CASE WHEN EXISTS (SELECT 1 FROM pending_flags p WHERE p.account = messages.account "
+                "AND p.folder = messages.folder AND p.uid = messages.uid) THEN flag "
+                "WHEN triaged = 2 AND ?2 = 'unmarked' THEN flag ELSE ?2 END, "
+                "triaged = CASE WHEN triaged = 2 AND ?2 != 'unmarked' THEN 0 ELSE triaged END "
+                "WHERE account = ?4 AND folder = ?5 AND uid = ?6",
+                [(" ".join(flags), flag_from_keywords(flags), labelled_by_flags(flags), account, folder, uid)
+                 for uid, flags in flags_by_uid.items()])
+
+    def message_flags(self, account, folder):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT uid, flags FROM messages WHERE account = ? AND folder = ?", (account, folder)).fetchall()
+        return {row[0]: row[1] or "" for row in rows}
+
+    def set_flag(self, messages, flag):
+        # Local flag and push queue change in one transaction
+        rows = [(flag, message.account, message.folder, message.uid) for message in messages]
+        with self.lock, self.conn:
+            # A flag set by hand is history the triage classifier can learn from
+            self.conn.executemany(
+                "UPDATE messages SET flag = ?, triaged = 0, labelled = 1 WHERE account = ? AND folder = ? AND uid = ?",
+                rows)
+            self.conn.executemany(
+                "INSERT INTO pending_flags (flag, account, folder, uid) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (account, folder, uid) DO UPDATE SET flag = excluded.flag", rows)
+
+    def pending_flags(self):
+        # (account, folder, uid, flag, server flags) for every change still to push. Changes kept
+        # across a schema rebuild wait until their message is synced again and its keywords are known
+        with self.lock:
+            return self.conn.execute(
+                "SELECT p.account, p.folder, p.uid, p.flag, m.flags FROM pending_flags p "
+                "JOIN messages m ON m.account = p.account AND m.folder = p.folder AND m.uid = p.uid "
+                "ORDER BY p.account, p.folder, p.uid").fetchall()
+
+    def flags_pushed(self, account, folder, pushed):
+        # pushed: (uid, flag, server flags) stored on the server. A row re-flagged
+        # while the push was in flight keeps its newer target and goes out next time
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE messages SET flags = ? WHERE account = ? AND folder = ? AND uid = ?",
+                [(" ".join(flags), account, folder, uid) for uid, _, flags in pushed])
+            self.conn.executemany(
+                "DELETE FROM pending_flags WHERE account = ? AND folder = ? AND uid = ? AND flag = ?",
+                [(account, folder, uid, flag) for uid, flag, _ in pushed])
+
+    def untriaged(self, account, limit):
+        # (id, folder, uid, sender, subject, body, flag) of messages triage hasn't looked at yet
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, folder, uid, sender, subject, body, flag FROM messages "
+                "WHERE account = ? AND triaged IS NULL ORDER BY id LIMIT ?", (account, limit)).fetchall()
+
+    def set_triaged(self, account, ids, flagged, push=False):
+        # Every id in ids has been looked at; flagged: (folder, uid, flag) for the ones triage flagged.
+        # Guesses stay local unless push is set, then they are queued for the server like manual flags
+        rows = [(flag, account, folder, uid) for folder, uid, flag in flagged]
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE messages SET triaged = 0 WHERE id = ?", [(i,) for i in ids])
+            self.conn.executemany(
+                f"UPDATE messages SET flag = ?, triaged = {1 if push else 2} "
+                "WHERE account = ? AND folder = ? AND uid = ?", rows)
+            if push:
+                self.conn.executemany(
+                    "INSERT INTO pending_flags (flag, account, folder, uid) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (account, folder, uid) DO UPDATE SET flag = excluded.flag", rows)
+
+    def triage_history(self, limit):
+        # (sender, subject, body, flag) of the newest messages whose flag the user or the server set
+        with self.lock:
+            return self.conn.execute(
+                "SELECT sender, subject, substr(body, 1, 2000), flag FROM messages "
+                "WHERE labelled = 1 AND IFNULL(triaged, 0) = 0 ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def labelled_count(self):
+        # How many rows triage_history draws from; cheaper than reading them to see if anything changed
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE labelled = 1 AND IFNULL(triaged, 0) = 0").fetchone()[0]
+
+    def set_body(self, account, folder, uid, body):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE messages SET body = ? WHERE account = ? AND folder = ? AND uid = ?",
+                (body, account, folder, uid))
+
+    def get_body(self, account, folder, uid):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body FROM messages WHERE account = ? AND folder = ? AND uid = ?",
+                (account, folder, uid)).fetchone()
+        return row[0] if row else None
+
+    def iter_with_bodies(self):
+        # Pages by id so the lock is released between batches; the index build reads each body once,
+        # so it isn't spilled to raw_store
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT id, {MESSAGE_COLUMNS} FROM messages WHERE id > ? AND body IS NOT NULL "
+                    "ORDER BY id LIMIT ?", (last_id, self.batch_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield EmailMessage.from_row(row[1:], spill=False)
+
+    def iter_messages(self, account=None, folder=None, since=None, until=None, flags=None, batch_size=None,
+                      with_body=True):
+        # Batches of matching messages (with bodies unless with_body is False), oldest first. Paged
+        # on (date, id) so memory stays flat however many match and the lock is released between batches.
+        # Bodies stay plain strings for the life of the batch
+        where = []
+        params = ()
+        for column, value in (("account", account), ("folder", folder)):
+            if value:
+                where.append(f"{column} = ?")
+                params += (value,)
+        if since is not None:
+            where.append("date >= ?")
+            params += (since,)
+        if until is not None:
+            where.append("date < ?")
+            params += (until,)
+        if flags:
+            where.append(f"flag IN ({', '.join('?' for _ in flags)})")
+            params += tuple(flags)
+        query = (f"SELECT COALESCE(date, 0), id, {MESSAGE_COLUMNS if with_body else LIST_COLUMNS} FROM messages "
+                 f"WHERE {' AND '.join(where + ['COALESCE(date, 0) >= ? AND (COALESCE(date, 0), id) > (?, ?)'])} "
+                 "ORDER BY COALESCE(date, 0), id LIMIT ?")
+        # The separate >= lets SQLite seek into idx_messages_export instead of scanning from the start
+        position = (-1, 0)
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    query, params + position[:1] + position + (batch_size or self.batch_size,)).fetchall()
+            if not rows:
+                return
+            position = rows[-1][:2]
+            yield [EmailMessage.from_row(row[2:], spill=False) for row in rows]
+
+    def delete_messages(self, account, folder, uids):
+        rows = [(account, folder, uid) for uid in uids]
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM messages WHERE account = ? AND folder = ? AND uid = ?", rows)
+            self.conn.executemany("DELETE FROM pending_flags WHERE account = ? AND folder = ? AND uid = ?", rows)
+
+    def count_messages(self, account, folder):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE account = ? AND folder = ?", (account, folder)).fetchone()[0]
+
+    def lowest_uid(self, account, folder):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT MIN(uid) FROM messages WHERE account = ? AND folder = ?", (account, folder)).fetchone()[0]
+
+    def message_uids(self, account, folder):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT uid FROM messages WHERE account = ? AND folder = ?", (account, folder)).fetchall()
+        return {row[0] for row in rows}
+
+    def load_messages(self, account, folder, limit=None):
+        query = f"SELECT {LIST_COLUMNS} FROM messages WHERE account = ? AND folder = ? ORDER BY uid DESC"
+        params = (account, folder)
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [EmailMessage.from_row(row) for row in reversed(rows)]
+
+    def load_since(self, account, folder, last_uid):
+        # Messages stored after last_uid, e.g. the ones a push notification brought in
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {LIST_COLUMNS} FROM messages WHERE account = ? AND folder = ? AND uid > ? ORDER BY uid",
+                (account, folder, last_uid)).fetchall()
+        return [EmailMessage.from_row(row) for row in rows]
+
+    def list_messages(self, accounts=(), folder=None, text=None, column=0, descending=True, limit=500):
+        # (id, account, thread_id, flag) of a message list in display order, sorted here rather than in
+        # Python: a folder across accounts or, given text, the newest `limit` search matches
+        # (in accounts if any). column is an index into LIST_ORDER; id breaks ties
+        if text is None:
+            if not accounts:
+                return []
+            placeholders = ", ".join("?" for _ in accounts)
+            where = f"account IN ({placeholders}) AND folder = ?"
+            params = tuple(accounts) + (folder,)
+        else:
+            match = build_fts_query(text)
+            if not match:
+                return []
+            where = ("id IN (SELECT m.id FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                     "WHERE messages_fts MATCH ?")
+            params = (match,)
+            if accounts:
+                where += f" AND m.account IN ({', '.join('?' for _ in accounts)})"
+                params += tuple(accounts)
+            where += " ORDER BY messages_fts.rowid DESC LIMIT ?)"
+            params += (limit,)
+        direction = "DESC" if descending else "ASC"
+        query = (f"SELECT id, account, thread_id, flag FROM messages WHERE {where} "
+                 f"ORDER BY {LIST_ORDER[column]} {direction}, id {direction}")
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def load_by_id(self, ids):
+        # {id: EmailMessage} for rows of a list_messages listing, e.g. the page a view is about to show
+        ids = list(ids)
+        rows = []
+        with self.lock:
+            for start in range(0, len(ids), self.batch_size):
+                chunk = ids[start:start + self.batch_size]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows += self.conn.execute(
+                    f"SELECT id, {LIST_COLUMNS} FROM messages WHERE id IN ({placeholders})", chunk).fetchall()
+        return {row[0]: EmailMessage.from_row(row[1:]) for row in rows}
+
+    def thread_rows(self, account, everything=True):
+        # (id, message_id, refs, subject, thread_id) in id order; only unthreaded rows unless everything
+        query = "SELECT id, message_id, refs, subject, thread_id FROM messages WHERE account = ?"
+        if not everything:
+            query += " AND thread_id IS NULL"
+        with self.lock:
+            return self.conn.execute(query + " ORDER BY id", (account,)).fetchall()
+
+    def set_thread_ids(self, rows):
+        # rows: (thread_id, id)
+        with self.lock, self.conn:
+            for start in range(0, len(rows), self.batch_size):
+                self.conn.executemany("UPDATE messages SET thread_id = ? WHERE id = ?",
+                                      rows[start:start + self.batch_size])
+
+    def load_thread(self, account, thread_id):
+        # Every stored copy of a conversation across folders, oldest first, with bodies (in memory) when fetched
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE account = ? AND thread_id = ? ORDER BY date",
+                (account, thread_id)).fetchall()
+        return [EmailMessage.from_row(row, spill=False) for row in rows]
+
+    def search(self, text, account=None, limit=500):
+        match = build_fts_query(text)
+        if not match:
+            return []
+        query = (f"SELECT {JOINED_LIST_COLUMNS} FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                 "WHERE messages_fts MATCH ?")
+        params = (match,)
+        if account:
+            query += " AND m.account = ?"
+            params += (account,)
+        # Newest first: rowid order lets FTS5 stop at LIMIT instead of scoring every match
+        query += " ORDER BY messages_fts.rowid DESC LIMIT ?"
+        params += (limit,)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [EmailMessage.from_row(row) for row in rows]
+
+    def set_stats(self, key, data):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO stats (key, updated, data) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "updated = excluded.updated, data = excluded.data", (key, time.time(), json.dumps(data)))
+
+    def get_stats(self, key):
+        # (updated, data) or None
+        with self.lock:
+            row = self.conn.execute("SELECT updated, data FROM stats WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def data_version(self):
+        # Changes whenever another connection (e.g. the daemon's) commits to the store
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,193 @@
+# src/utils/email_parser.py
+import codecs
+import email
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+# Tried in order after the declared charset; latin-1 maps every byte so it never fails
+FALLBACK_CHARSETS = ("utf-8", "cp1252", "latin-1")
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "mercury-attachments")
+
+_BLOCK_TAGS = {"p", "div", "br", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6", "li", "ul", "ol",
+               "blockquote", "pre", "hr", "section", "article", "header", "footer"}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+_SPACES_RE = re.compile(r"[ \t\r\f\v\xa0]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n+")
+
+
+def decode_bytes(payload, charset=None):
+    charsets = ((charset,) if charset else ()) + FALLBACK_CHARSETS
+    for name in charsets:
+        try:
+            codecs.lookup(name)
+            return payload.decode(name)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return payload.decode("latin-1", errors="replace")
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self.skipping += 1
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in _BLOCK_TAGS and tag != "li":
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    text = _SPACES_RE.sub(" ", "".join(extractor.parts))
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+class Attachment:
+    # Decoded payload lives in a spill file; only metadata stays in memory
+    __slots__ = ("filename", "content_type", "size", "path")
+
+    def __init__(self, filename, content_type, size, path):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.path = path
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __str__(self):
+        return f"{self.filename} ({self.content_type}, {self.size / 1024:.1f} KB)"
+
+
+class ParsedBody:
+    # One message parsed once. Text parts stay as transfer-decoded bytes until
+    # text is first read; then they are decoded (HTML converted to text only
+    # when there is no plain part) and the bytes are dropped.
+    __slots__ = ("_plain", "_html", "_text", "attachments")
+
+    def __init__(self, plain, html, attachments):
+        self._plain = plain  # [(bytes, charset)]
+        self._html = html
+        self._text = None
+        self.attachments = attachments
+
+    @property
+    def text(self):
+        if self._text is None:
+            if self._plain:
+                self._text = "\n".join(decode_bytes(payload, charset) for payload, charset in self._plain)
+            elif self._html:
+                self._text = "\n\n".join(html_to_text(decode_bytes(payload, charset))
+                                         for payload, charset in self._html)
+            else:
+                self._text = ""
+            self._plain = self._html = None
+        return self._text
+
+    def discard(self):
+        for attachment in self.attachments:
+            attachment.discard()
+
+
+def _spill(payload, spill_dir):
+    os.makedirs(spill_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=spill_dir, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(payload)
+    return path
+
+
+def parse_message(source, spill_dir=DEFAULT_SPILL_DIR):
+    # source is raw RFC 822 bytes or an email.message.Message; neither is kept
+    message = email.message_from_bytes(source) if isinstance(source, (bytes, bytearray)) else source
+    plain, html, attachments = [], [], []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        content_type = part.get_content_type()
+        filename = part.get_filename()
+        inline_text = content_type in ("text/plain", "text/html") and not filename \
+            and part.get_content_disposition() != "attachment"
+        try:
+            payload = part.get_payload(decode=True) or b""
+        except Exception as e:
+            print(f"Error decoding part: {e}")
+            continue
+        if inline_text:
+            (plain if content_type == "text/plain" else html).append((payload, part.get_content_charset()))
+        else:
+            try:
+                path = _spill(payload, spill_dir)
+            except OSError as e:
+                print(f"Error spilling attachment: {e}")
+                continue
+            attachments.append(Attachment(filename or "unnamed", content_type, len(payload), path))
+    return ParsedBody(plain, html, attachments)
+
+
+class BodyCache:
+    # LRU of ParsedBody keyed by (account, folder, uid); evicted entries delete their spill files
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            parsed = self.entries.get(key)
+            if parsed is not None:
+                self.entries.move_to_end(key)
+            return parsed
+
+    def put(self, key, parsed):
+        evicted = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None and old is not parsed:
+                evicted.append(old)
+            self.entries[key] = parsed
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[1])
+        for entry in evicted:
+            entry.discard()
+
+    def clear(self):
+        with self.lock:
+            evicted = list(self.entries.values())
+            self.entries.clear()
+        for entry in evicted:
+            entry.discard()
+
+
+# Shared by the reading pane and the summarizer
+body_cache = BodyCache()
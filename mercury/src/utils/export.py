@@ -0,0 +1,189 @@
+# src/utils/export.py
+import csv
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.utils.ai_summarizer import cached_summary, summarize_email
+from src.utils.dashboard_stats import MailboxStats
+from src.utils.email_parser import parse_message
+from src.utils.summary_pipeline import FAILED_PREFIX, SummaryPipeline
+
+FIELDS = ("date", "account", "folder", "uid", "flag", "sender", "subject", "message_id", "thread_id",
+          "summary", "summary_error", "body")
+SUMMARY_MODES = ("none", "cached", "generate")
+
+
+def format_date(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="minutes") if timestamp is not None else ""
+
+
+def stats_dict(stats, top=20):
+    data = stats.as_dict(top)
+    data["first"] = format_date(data["first"])
+    data["last"] = format_date(data["last"])
+    return data
+
+
+def record(email, summary, body, summary_error=None):
+    return {"date": format_date(email.date), "account": email.account, "folder": email.folder,
+            "uid": email.uid, "flag": email.flag, "sender": email.sender, "subject": email.subject,
+            "message_id": email.message_id, "thread_id": email.thread_id, "summary": summary,
+            "summary_error": summary_error, "body": body}
+
+
+def split_failures(results):
+    # SummaryPipeline reports a failed message as FAILED_PREFIX plus the error;
+    # that is no summary, so it goes to (summaries, errors) as an error instead
+    summaries, errors = [], []
+    for result in results:
+        failed = result is not None and result.startswith(FAILED_PREFIX)
+        summaries.append(None if failed else result)
+        errors.append(result[len(FAILED_PREFIX):].strip() if failed else None)
+    return summaries, errors
+
+
+class JsonlWriter:
+    # One JSON object per message; the stats go to a .stats.json file next to it
+    def __init__(self, stream, stats_path=None):
+        self.stream = stream
+        self.stats_path = stats_path
+
+    def write(self, row):
+        self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def finish(self, stats, filters):
+        if self.stats_path:
+            with open(self.stats_path, 'w', encoding='utf-8') as f:
+                json.dump({"filters": filters, **stats_dict(stats)}, f, ensure_ascii=False, indent=2)
+
+
+class CsvWriter(JsonlWriter):
+    def __init__(self, stream, stats_path=None):
+        super().__init__(stream, stats_path)
+        self.writer = csv.DictWriter(stream, FIELDS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class MarkdownWriter:
+    # A readable report: one section per message, the statistics at the end
+    # (they are only known once every message has streamed past)
+    def __init__(self, stream, stats_path=None):
+        self.stream = stream
+        self.header_written = False
+
+    def write(self, row):
+        if not self.header_written:
+            self.stream.write("# Mercury report\n\n")
+            self.header_written = True
+        subject = row["subject"] or "(no subject)"
+        self.stream.write(f"## {row['date']} · {subject}\n\n")
+        flag = f" · {row['flag']}" if row["flag"] != "unmarked" else ""
+        self.stream.write(f"*{row['sender']}* · {row['account']} / {row['folder']}{flag}\n\n")
+        if row["summary"]:
+            self.stream.write(f"{row['summary']}\n\n")
+        elif row["summary_error"]:
+            self.stream.write(f"*Summary failed: {row['summary_error']}*\n\n")
+        if row["body"]:
+            quoted = "\n".join(f"> {line}" if line else ">" for line in row["body"].splitlines())
+            self.stream.write(f"{quoted}\n\n")
+
+    def finish(self, stats, filters):
+        if not self.header_written:
+            self.stream.write("# Mercury report\n\nNo messages matched.\n\n")
+        data = stats_dict(stats, top=10)
+        self.stream.write("## Statistics\n\n")
+        described = ", ".join(f"{name} {value}" for name, value in filters.items() if value) or "everything"
+        self.stream.write(f"Filters: {described}\n\n")
+        failed = f", {data['summary_failures']} failed" if data["summary_failures"] else ""
+        self.stream.write(f"{data['messages']} messages from {data['unique_senders']} senders, "
+                          f"{data['first'] or '-'} to {data['last'] or '-'}; "
+                          f"{data['summarized']} summarized{failed}.\n\n")
+        self.stream.write("| Flag | Messages |\n|---|---|\n")
+        for flag, count in data["flags"].items():
+            self.stream.write(f"| {flag} | {count} |\n")
+        self.stream.write("\n**Top senders**\n\n")
+        for sender, count in data["top_senders"]:
+            self.stream.write(f"- {sender} ({count})\n")
+        self.stream.write("\n**Top subject terms**\n\n")
+        self.stream.write(", ".join(f"{term} ({count})" for term, count in data["top_subject_terms"]) + "\n")
+
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "md": MarkdownWriter}
+
+
+class Exporter:
+    # Streams messages matching a filter from the store to a writer, one batch
+    # at a time: bodies (from the store, or fetched from the server when
+    # accounts are given) and summaries are loaded for the batch in parallel,
+    # written in date order, and dropped before the next batch is read, so
+    # memory stays flat. Summaries are "none", "cached" (the summary cache
+    # only, no API calls) or "generate" (cache first, then the API through
+    # SummaryPipeline, with its concurrency limit and rate-limit backoff).
+
+    def __init__(self, store, accounts=None, summaries="none", include_body=False, batch_size=64,
+                 max_concurrency=4):
+        self.store = store
+        self.accounts = {account.email: account for account in accounts or ()}
+        self.summaries = summaries
+        self.include_body = include_body
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def load_body(self, email):
+        body = email.body
+        if body is None and email.account in self.accounts:
+            raw = self.accounts[email.account].fetch_body(email.uid, email.folder)
+            if raw is not None:
+                # Only the text is exported; attachment spill files go straight away
+                parsed = parse_message(raw)
+                body = parsed.text
+                parsed.discard()
+                self.store.set_body(email.account, email.folder, email.uid, body)
+        return body or ""
+
+    def _summaries(self, batch, bodies, pipeline):
+        # (summaries, errors), one of each per message
+        if self.summaries == "cached":
+            return split_failures(cached_summary(body) if body else None for body in bodies)
+        done = threading.Event()
+        results = {}
+        jobs = [(str(i), lambda body=body: body) for i, body in enumerate(bodies) if body]
+        pipeline.run(jobs, results.__setitem__, lambda run: done.set())
+        done.wait()
+        return split_failures(results.get(str(i)) for i in range(len(batch)))
+
+    def export(self, writer, on_progress=None, **filters):
+        # filters: account, folder, since, until, flags (see MessageStore.iter_messages)
+        stats = MailboxStats()
+        needs_body = self.include_body or self.summaries != "none"
+        pipeline = None
+        if self.summaries == "generate":
+            pipeline = SummaryPipeline(lambda content: summarize_email(content, raise_errors=True),
+                                       max_concurrency=self.max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="mercury-export")
+        try:
+            for batch in self.store.iter_messages(batch_size=self.batch_size, **filters):
+                bodies = list(executor.map(self.load_body, batch)) if needs_body else [None] * len(batch)
+                if self.summaries == "none":
+                    summaries = errors = [None] * len(batch)
+                else:
+                    summaries, errors = self._summaries(batch, bodies, pipeline)
+                for email, summary, error, body in zip(batch, summaries, errors, bodies):
+                    writer.write(record(email, summary, body if self.include_body else None, error))
+                    stats.add(email, summary, error is not None)
+                if on_progress:
+                    on_progress(stats.messages)
+        finally:
+            executor.shutdown()
+            if pipeline is not None:
+                pipeline.shutdown()
+        described = dict(filters)
+        for name in ("since", "until"):
+            if described.get(name) is not None:
+                described[name] = format_date(described[name])
+        writer.finish(stats, described)
+        return stats
@@ -0,0 +1,122 @@
+# src/utils/fetch_scheduler.py
+import itertools
+import threading
+import traceback
+
+
+class FetchBatch:
+    def __init__(self, total, on_progress=None, on_finished=None):
+        self.total = total
+        self.done = 0
+        self.results = {}
+        self.errors = {}
+        self.cancelled = False
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.future = None  # set when the batch runs as a coroutine on the async backend
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class FetchScheduler:
+    # A fixed set of worker threads pulling jobs in priority order (lower runs
+    # first). A job is only started when its server is below per_server running
+    # jobs, so one slow provider can't occupy every worker.
+
+    def __init__(self, max_workers=8, per_server=2):
+        self.max_workers = max_workers
+        self.per_server = per_server
+        self._pending = []
+        self._running_per_server = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._shutdown = False
+
+    def submit_batch(self, jobs, on_progress=None, on_finished=None):
+        # jobs: iterable of (key, server, priority, fn)
+        jobs = list(jobs)
+        batch = FetchBatch(len(jobs), on_progress, on_finished)
+        if not jobs:
+            if on_finished:
+                on_finished(batch)
+            return batch
+        with self._condition:
+            for key, server, priority, fn in jobs:
+                self._pending.append((priority, next(self._counter), key, server, fn, batch))
+            self._pending.sort(key=lambda job: job[:2])
+            self._start_workers()
+            self._condition.notify_all()
+        return batch
+
+    def cancel(self, batch):
+        batch.cancel()
+        with self._condition:
+            dropped = [job for job in self._pending if job[5] is batch]
+            self._pending = [job for job in self._pending if job[5] is not batch]
+        for job in dropped:
+            self._complete(job, None, None)
+
+    def promote(self, key):
+        # Move a still-pending job (e.g. the account the user just switched to) to the front
+        with self._condition:
+            self._pending = [(-1,) + job[1:] if job[2] == key else job for job in self._pending]
+            self._pending.sort(key=lambda job: job[:2])
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+    def _start_workers(self):
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < min(self.max_workers, len(self._pending)):
+            worker = threading.Thread(target=self._work, name="mercury-fetch", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _take_job(self):
+        for index, job in enumerate(self._pending):
+            if self._running_per_server.get(job[3], 0) < self.per_server:
+                del self._pending[index]
+                self._running_per_server[job[3]] = self._running_per_server.get(job[3], 0) + 1
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._take_job()
+                while job is None:
+                    if self._shutdown or not self._pending:
+                        return
+                    self._condition.wait()
+                    job = self._take_job()
+            result = error = None
+            if not job[5].cancelled:
+                try:
+                    result = job[4]()
+                except Exception as e:
+                    traceback.print_exc()
+                    error = e
+            with self._condition:
+                self._running_per_server[job[3]] -= 1
+                self._condition.notify_all()
+            self._complete(job, result, error)
+
+    def _complete(self, job, result, error):
+        key, batch = job[2], job[5]
+        with self._condition:
+            batch.done += 1
+            if error is not None:
+                batch.errors[key] = error
+            elif not batch.cancelled:
+                batch.results[key] = result
+            finished = batch.done == batch.total
+        if batch.on_progress:
+            batch.on_progress(batch, key)
+        if finished and batch.on_finished:
+            batch.on_finished(batch)
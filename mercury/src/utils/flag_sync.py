@@ -0,0 +1,120 @@
+# src/utils/flag_sync.py
+import imaplib
+import threading
+from itertools import groupby
+from src.models.email_account import build_uid_set
+from src.models.email_message import FLAG_KEYWORDS, KEYWORD_FLAGS
+from src.utils.imap_pool import imap_pool, CONNECTION_ERRORS
+
+
+class FlagSync:
+    # Pushes local flags to the server as IMAP keywords. A change goes into the
+    # store's pending_flags queue first, so it survives a restart or time
+    # offline; a background thread waits for marking to settle, then sends one
+    # UID STORE per keyword change over the UID set of each folder, however
+    # many messages were selected. Failed pushes stay queued and are retried.
+
+    def __init__(self, store, accounts, pool=imap_pool, delay=0.5, retry_delay=60):
+        self.store = store
+        self.accounts = accounts  # EmailAccounts, matched on address at push time
+        self.pool = pool
+        self.delay = delay
+        self.retry_delay = retry_delay
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def mark(self, messages, flag):
+        if messages:
+            self.store.set_flag(messages, flag)
+            self.wake()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="mercury-flags", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def shutdown(self):
+        # Anything unsent stays in pending_flags for the next session
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        retry = None
+        while True:
+            self._wake.wait(retry)
+            # Coalesce: keep waiting while marks are still arriving
+            while self._wake.is_set() and not self._stop.is_set():
+                self._wake.clear()
+                self._stop.wait(self.delay)
+            if self._stop.is_set():
+                return
+            retry = self.retry_delay if self.push() else None
+
+    def _account(self, address):
+        for account in self.accounts:
+            if account.email == address:
+                return account
+        return None
+
+    def push(self):
+        # Returns how many changes are still waiting because the server couldn't be reached
+        waiting = 0
+        for (address, folder), rows in groupby(self.store.pending_flags(), key=lambda row: row[:2]):
+            rows = [row[2:] for row in rows]
+            account = self._account(address)
+            if account is None:
+                continue
+            try:
+                pushed = self.pool.run(account, lambda conn: self._store(conn, rows), folder=folder)
+            except Exception as e:
+                print(f"Error pushing flags for {address}: {e}")
+                waiting += len(rows)
+                continue
+            self.store.flags_pushed(address, folder, pushed)
+        return waiting
+
+    def _store(self, conn, rows):
+        # rows: (uid, target flag, server flags). Only keywords some message
+        # actually carries are removed, so flagging unmarked mail is a single STORE
+        pushed = []
+        for flag, group in groupby(sorted(rows, key=lambda row: row[1]), key=lambda row: row[1]):
+            group = list(group)
+            uids = [uid for uid, _, _ in group]
+            keyword = FLAG_KEYWORDS.get(flag)
+            current = [set((flags or "").split()) for _, _, flags in group]
+            stale = sorted({name for flags in current for name in flags
+                            if name.lower() in KEYWORD_FLAGS and name != keyword})
+            if keyword and not conn.can_store_keyword(keyword):
+                print(f"{conn.folder} does not accept keyword {keyword}; flag kept locally")
+                keyword = None
+            # A rejected STORE (e.g. a read-only folder) won't succeed on retry either,
+            # so the change is dropped from the queue and the flag stays local
+            if stale and not self._uid_store(conn, uids, "-FLAGS.SILENT", stale):
+                stale = []
+            if keyword and not self._uid_store(conn, uids, "+FLAGS.SILENT", [keyword]):
+                keyword = None
+            for uid, flags in zip(uids, current):
+                flags.difference_update(stale)
+                if keyword:
+                    flags.add(keyword)
+                pushed.append((uid, flag, sorted(flags)))
+        return pushed
+
+    @staticmethod
+    def _uid_store(conn, uids, mode, keywords):
+        for uid_set in build_uid_set(uids):
+            try:
+                typ, data = conn.imap.uid('STORE', uid_set, mode, f"({' '.join(keywords)})")
+            except CONNECTION_ERRORS:
+                raise
+            except imaplib.IMAP4.error as e:
+                typ, data = 'BAD', e
+            if typ != 'OK':
+                print(f"Error storing {' '.join(keywords)} in {conn.folder}: {data}")
+                return False
+        return True
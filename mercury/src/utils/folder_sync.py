@@ -0,0 +1,111 @@
+# src/utils/folder_sync.py
+import threading
+
+# Scheduler priorities, lowest first
+VIEWED, INBOX, FOLDER, BACKFILL = range(4)
+
+
+def is_selectable(flags):
+    return not any(flag.lower() in ("\\noselect", "\\nonexistent") for flag in flags)
+
+
+class FolderSync:
+    # Syncs every folder of an account on a FetchScheduler. The folder being
+    # viewed goes first, next to the LIST that discovers the others; then INBOX,
+    # then all remaining folders in parallel across pooled connections. Folders
+    # larger than the first sync's window are backfilled one chunk per job at
+    # the lowest priority, so view() can move a folder ahead of queued backfill.
+    # on_folders(account) and on_synced(account, folder, result) run on
+    # scheduler threads; on_finished(account) once nothing is left queued.
+
+    def __init__(self, mail_sync, scheduler, on_folders=None, on_synced=None, on_finished=None,
+                 backfill_chunk=2000):
+        self.mail_sync = mail_sync
+        self.scheduler = scheduler
+        self.on_folders = on_folders
+        self.on_synced = on_synced
+        self.on_finished = on_finished
+        self.backfill_chunk = backfill_chunk
+        self._lock = threading.Lock()
+        self._outstanding = {}  # account email -> batches queued or running
+        self._batches = {}
+        self._cancelled = set()
+
+    def sync_account(self, account, viewed='INBOX'):
+        with self._lock:
+            busy = bool(self._outstanding.get(account.email))
+            self._cancelled.discard(account.email)
+        if busy:
+            self.view(account, viewed)
+            return
+        self._submit(account, [(None, VIEWED, lambda: self._list(account, viewed)),
+                               (viewed, VIEWED, lambda: self._sync(account, viewed))])
+
+    def view(self, account, folder):
+        self.scheduler.promote((account.email, folder))
+
+    def is_syncing(self, account):
+        with self._lock:
+            return bool(self._outstanding.get(account.email))
+
+    def cancel(self, account=None):
+        with self._lock:
+            emails = [account.email] if account else list(self._batches)
+            self._cancelled.update(emails)
+            batches = [batch for email in emails for batch in self._batches.get(email, ())]
+        for batch in batches:
+            self.scheduler.cancel(batch)
+
+    def _submit(self, account, jobs):
+        # jobs: (folder, priority, fn); the folder is None for the LIST
+        with self._lock:
+            if account.email in self._cancelled:
+                return
+            self._outstanding[account.email] = self._outstanding.get(account.email, 0) + 1
+        batch = self.scheduler.submit_batch(
+            [((account.email, folder), account.imap_server, priority, fn) for folder, priority, fn in jobs],
+            on_finished=lambda batch: self._batch_finished(account, batch))
+        with self._lock:
+            if batch.done < batch.total:
+                self._batches.setdefault(account.email, set()).add(batch)
+
+    def _batch_finished(self, account, batch):
+        for key, error in batch.errors.items():
+            print(f"Error syncing {key[0]} {key[1] or 'folder list'}: {error}")
+        with self._lock:
+            self._batches.get(account.email, set()).discard(batch)
+            self._outstanding[account.email] -= 1
+            finished = not self._outstanding[account.email]
+            if finished:
+                del self._outstanding[account.email]
+                self._batches.pop(account.email, None)
+        if finished and self.on_finished:
+            self.on_finished(account)
+
+    def _list(self, account, viewed):
+        folders = self.mail_sync.list_folders(account)
+        if self.on_folders:
+            self.on_folders(account)
+        self._submit(account, [(name, INBOX if name.upper() == 'INBOX' else FOLDER,
+                                lambda name=name: self._sync(account, name))
+                               for name, _, flags in folders if is_selectable(flags) and name != viewed])
+
+    def _sync(self, account, folder):
+        result = self.mail_sync.sync_folder(account, folder)
+        if self.on_synced:
+            self.on_synced(account, folder, result)
+        self._queue_backfill(account, folder)
+        return result
+
+    def _backfill(self, account, folder):
+        result = self.mail_sync.backfill_folder(account, folder, self.backfill_chunk)
+        if result["new"] and self.on_synced:
+            self.on_synced(account, folder, result)
+        self._queue_backfill(account, folder)
+        return result
+
+    def _queue_backfill(self, account, folder):
+        # Queued before the current job returns, so the account never looks idle in between
+        state = self.mail_sync.store.get_folder_state(account.email, folder)
+        if state is not None and not state["complete"]:
+            self._submit(account, [(folder, BACKFILL, lambda: self._backfill(account, folder))])
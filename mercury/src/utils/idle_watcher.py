@@ -0,0 +1,93 @@
+# src/utils/idle_watcher.py
+import asyncio
+from src.models.email_account import parse_fetch_response, parse_uid_flags
+from src.utils.async_imap import AsyncImapConnection
+from src.utils.async_backend import get_async_backend
+from src.utils.mail_sync import AsyncMailSync
+
+
+class IdleWatcher:
+    # One long-lived connection per account, kept outside the pools and parked
+    # in IDLE on the shared event loop. When the server reports EXISTS or
+    # EXPUNGE the folder is re-selected and synced incrementally (UIDs above
+    # the stored mark, CHANGEDSINCE flags, expunge check); FETCH notifications
+    # carrying a UID are applied straight to the store. Servers without IDLE
+    # are polled with the same incremental sync. on_change(account, result,
+    # new_messages) runs on the loop thread whenever something changed.
+
+    def __init__(self, store, on_change, poll_interval=120, idle_timeout=25 * 60,
+                 retry_delay=5, max_retry_delay=300):
+        self.store = store
+        self.on_change = on_change
+        self.sync = AsyncMailSync(store)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._watches = {}
+
+    def start(self, account, folder='INBOX'):
+        if account.imap_server and account.email not in self._watches:
+            self._watches[account.email] = get_async_backend().submit(self._watch(account, folder))
+
+    def stop(self, account):
+        future = self._watches.pop(account.email, None)
+        if future is not None:
+            future.cancel()
+
+    def stop_all(self):
+        for future in self._watches.values():
+            future.cancel()
+        self._watches = {}
+
+    async def _watch(self, account, folder):
+        delay = self.retry_delay
+        while True:
+            conn = None
+            try:
+                conn = AsyncImapConnection(await account.open_async_connection())
+                capabilities = await conn.imap.capability()
+                # Catch up on whatever arrived while we weren't connected
+                await self._check(conn, account, folder)
+                delay = self.retry_delay
+                while True:
+                    if "IDLE" in capabilities:
+                        _, untagged = await conn.imap.idle(self.idle_timeout)
+                    else:
+                        await asyncio.sleep(self.poll_interval)
+                        untagged = None
+                    await self._check(conn, account, folder, untagged)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error watching {account.email}: {e}")
+            finally:
+                if conn is not None:
+                    conn.imap.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    async def _check(self, conn, account, folder, untagged=None):
+        # untagged is None after a poll or reconnect: nothing is known, sync everything incrementally
+        state = self.store.get_folder_state(account.email, folder)
+        last_uid = state["last_uid"] if state else 0
+        changed = {}
+        scan_flags = untagged is None
+        for meta, _ in parse_fetch_response((untagged or {}).get("FETCH", [])):
+            uid, flags = parse_uid_flags(meta)
+            if uid is None:
+                scan_flags = True  # sequence number only; let the sync work it out
+            elif uid <= last_uid:
+                changed[uid] = flags
+        if changed:
+            self.store.update_flags(account.email, folder, changed)
+
+        result = {"new": 0, "changed": len(changed), "removed": 0}
+        if untagged is None or scan_flags or "EXISTS" in untagged or "EXPUNGE" in untagged:
+            await conn.select(folder)
+            synced = await self.sync.sync_connection(conn, account.email, folder, scan_flags)
+            result = {key: result[key] + synced[key] for key in result}
+        if any(result.values()):
+            # No notification for the first sync of a folder, only for mail that arrived since
+            new = self.store.load_since(account.email, folder, last_uid) if state and result["new"] else []
+            self.on_change(account, result, new)
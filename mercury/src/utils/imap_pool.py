@@ -0,0 +1,219 @@
+# src/utils/imap_pool.py
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from src.utils.async_imap import quote
+
+# Errors after which a connection can no longer be trusted and must be replaced
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+class PooledConnection:
+    def __init__(self, imap):
+        self.imap = imap
+        self.folder = None
+        self.exists = 0
+        self.uidvalidity = None
+        self.uidnext = None
+        self.highest_modseq = None
+        self.permanent_flags = None
+        # True when checked out again on the folder it already had selected: NOOP kept
+        # exists current, but UIDNEXT and HIGHESTMODSEQ are from the earlier SELECT
+        self.reused = False
+        self.last_used = time.monotonic()
+
+    def select(self, folder):
+        # imaplib sends the name as is; folders like "Sent Mail" need quoting
+        self.folder = None
+        typ, data = self.imap.select(quote(folder))
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"Unable to select {folder}: {data}")
+        self.folder = folder
+        self.reused = False
+        self.exists = int(data[0] or 0)
+        self.uidvalidity = self._response_code('UIDVALIDITY')
+        self.uidnext = self._response_code('UIDNEXT')
+        # Only sent by servers with CONDSTORE (RFC 7162)
+        self.highest_modseq = self._response_code('HIGHESTMODSEQ')
+        # None when the server didn't say; otherwise \* in the list means new keywords can be stored
+        data = self.imap.response('PERMANENTFLAGS')[1]
+        if data and data[-1] is not None:
+            self.permanent_flags = data[-1].decode().strip("()").split()
+        else:
+            self.permanent_flags = None
+
+    def _response_code(self, name):
+        data = self.imap.response(name)[1]
+        if data and data[-1] is not None:
+            return int(data[-1].split()[0])
+        return None
+
+    def can_store_keyword(self, keyword):
+        if self.permanent_flags is None:
+            return True
+        return "\\*" in self.permanent_flags or keyword.lower() in (f.lower() for f in self.permanent_flags)
+
+    def refresh(self):
+        # NOOP doubles as a liveness check and picks up EXISTS/EXPUNGE updates
+        self.imap.noop()
+        expunged = self.imap.response('EXPUNGE')[1]
+        if expunged and expunged[0] is not None:
+            self.exists -= len(expunged)
+        exists = self.imap.response('EXISTS')[1]
+        if exists and exists[-1] is not None:
+            self.exists = int(exists[-1])
+
+    def close(self):
+        try:
+            self.imap.logout()
+        except Exception:
+            pass
+
+
+class ImapConnectionPool:
+    def __init__(self, max_per_server=4, keepalive_interval=60, idle_timeout=25 * 60):
+        self.max_per_server = max_per_server
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._server_slots = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+
+    @staticmethod
+    def account_key(account):
+        return (account.email, account.imap_server, account.imap_port)
+
+    def _slots(self, key):
+        # key: (imap_server, imap_port); the connection cap is per server, shared by its accounts
+        with self._lock:
+            if key not in self._server_slots:
+                self._server_slots[key] = threading.BoundedSemaphore(self.max_per_server)
+            return self._server_slots[key]
+
+    def _checkout(self, account, folder):
+        key = self.account_key(account)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                break
+            try:
+                if pooled.folder == folder:
+                    pooled.refresh()
+                    pooled.reused = True
+                else:
+                    pooled.select(folder)
+                return pooled
+            except CONNECTION_ERRORS:
+                pooled.close()
+            except imaplib.IMAP4.error:
+                # e.g. the folder no longer exists; the connection itself is fine
+                self._checkin(account, pooled)
+                raise
+
+        pooled = PooledConnection(account.open_connection())
+        try:
+            pooled.select(folder)
+        except Exception:
+            pooled.close()
+            raise
+        self._ensure_keepalive()
+        return pooled
+
+    def _checkin(self, account, pooled):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(self.account_key(account), []).append(pooled)
+
+    @contextmanager
+    def connection(self, account, folder='INBOX'):
+        slots = self._slots((account.imap_server, account.imap_port))
+        slots.acquire()
+        pooled = None
+        try:
+            pooled = self._checkout(account, folder)
+            yield pooled
+        except CONNECTION_ERRORS:
+            if pooled is not None:
+                pooled.close()
+                pooled = None
+            raise
+        finally:
+            if pooled is not None:
+                self._checkin(account, pooled)
+            slots.release()
+
+    def run(self, account, fn, folder='INBOX', retries=1):
+        # Connections can die between keepalives; retry once on a fresh one
+        for attempt in range(retries + 1):
+            try:
+                with self.connection(account, folder) as pooled:
+                    return fn(pooled)
+            except CONNECTION_ERRORS:
+                if attempt == retries:
+                    raise
+
+    def _ensure_keepalive(self):
+        with self._lock:
+            if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+                self._stop.clear()
+                self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+                self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            with self._lock:
+                idle = [(key, pooled) for key, conns in self._idle.items() for pooled in conns]
+            for key, pooled in idle:
+                if self._stop.is_set():
+                    return
+                self._keep_alive(key, pooled)
+
+    def _keep_alive(self, key, pooled):
+        # A connection being refreshed is in use: it holds a server slot like a
+        # checkout does, so checkouts meanwhile can't open one past the cap. A
+        # server whose slots are all busy is skipped until the next round.
+        slots = self._slots(key[1:])
+        if not slots.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                conns = self._idle.get(key, [])
+                if pooled not in conns:
+                    return  # checked out since the snapshot
+                conns.remove(pooled)
+            if time.monotonic() - pooled.last_used > self.idle_timeout:
+                pooled.close()
+                return
+            try:
+                pooled.refresh()
+            except CONNECTION_ERRORS + (imaplib.IMAP4.error,):
+                # NOOP answered NO/BAD or the connection broke; either way it's not worth keeping
+                pooled.close()
+                return
+            with self._lock:
+                self._idle.setdefault(key, []).append(pooled)
+        finally:
+            slots.release()
+
+    def close_account(self, account):
+        with self._lock:
+            idle = self._idle.pop(self.account_key(account), [])
+        for pooled in idle:
+            pooled.close()
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            idle = [pooled for conns in self._idle.values() for pooled in conns]
+            self._idle = {}
+        for pooled in idle:
+            pooled.close()
+
+
+# Shared by the email tab, the dashboard and background workers
+imap_pool = ImapConnectionPool()
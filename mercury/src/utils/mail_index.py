@@ -0,0 +1,213 @@
+# src/utils/mail_index.py
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from src.utils.text_preprocess import clean_email_text
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'_-]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its me my no not of on or our so that the
+their them there these they this to was we were what when where which who will with you your about did does
+do say said says any all can could would should
+""".split())
+
+
+def tokenize(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_chunks(text, chunk_words):
+    words = text.split()
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)] or [""]
+
+
+class MailIndex:
+    # BM25 over chunks of cached message bodies, for the chatbot's retrieval.
+    #
+    # Terms get integer ids; each id has postings [chunk ids, term frequencies]
+    # as NumPy arrays plus a list of segments added since the last query. A
+    # batch of messages is turned into one (term, chunk, tf) array, sorted by
+    # term and sliced into those segments, so adding never rewrites existing
+    # postings and a query only concatenates segments for the terms it uses.
+    # Scoring is vectorized over the query terms' postings. Chunk text is not
+    # kept in memory: hits are re-chunked from the body in the message store.
+
+    def __init__(self, store, chunk_words=150, k1=1.2, b=0.75):
+        self.store = store
+        self.chunk_words = chunk_words
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.term_ids = {}
+        self.postings = []  # per term id: [chunk ids, tfs, pending segments]
+        self.messages = []  # (account, folder, uid, subject, sender, date) per message slot
+        self.message_ids = {}  # (account, folder, uid) -> message slot
+        self.message_chunks = {}  # message slot -> chunk ids
+        self.chunk_count = 0
+        self.chunk_message = np.zeros(1024, dtype=np.int32)
+        self.chunk_number = np.zeros(1024, dtype=np.int32)
+        self.chunk_length = np.zeros(1024, dtype=np.float32)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.total_length = 0.0
+        self.alive_count = 0
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def build(self, batch_size=500):
+        # Initial load from bodies already in the store; runs on a worker thread
+        batch = []
+        for email in self.store.iter_with_bodies():
+            batch.append(email)
+            if len(batch) == batch_size:
+                self.add_messages(batch)
+                batch = []
+        self.add_messages(batch)
+        return len(self)
+
+    def _grow(self, needed):
+        size = len(self.alive)
+        if needed <= size:
+            return
+        while size < needed:
+            size *= 2
+        for name in ("chunk_message", "chunk_number", "chunk_length", "alive"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add_message(self, email):
+        self.add_messages([email])
+
+    def add_messages(self, emails):
+        # Tokenizing happens outside the lock so searches aren't held up
+        tokenized = []
+        for email in emails:
+            body = email.body
+            if body:
+                text = f"{email.subject or ''}\n{clean_email_text(body)}"
+                tokenized.append((email, [Counter(tokenize(chunk)) for chunk in split_chunks(text, self.chunk_words)]))
+        if not tokenized:
+            return
+        with self.lock:
+            term_ids = self.term_ids
+            terms, chunk_ids, tfs = [], [], []
+            for email, chunks in tokenized:
+                key = (email.account, email.folder, email.uid)
+                self._remove(key)
+                slot = len(self.messages)
+                self.messages.append((email.account, email.folder, email.uid, email.subject, email.sender, email.date))
+                self.message_ids[key] = slot
+                first = self.chunk_count
+                self._grow(first + len(chunks))
+                for number, counts in enumerate(chunks):
+                    chunk_id = first + number
+                    length = sum(counts.values())
+                    self.chunk_message[chunk_id] = slot
+                    self.chunk_number[chunk_id] = number
+                    self.chunk_length[chunk_id] = length
+                    self.total_length += length
+                    ids = list(map(term_ids.get, counts))
+                    if None in ids:
+                        ids = [term_ids.setdefault(term, len(term_ids)) for term in counts]
+                    terms.extend(ids)
+                    chunk_ids.extend([chunk_id] * len(counts))
+                    tfs.extend(counts.values())
+                self.alive[first:first + len(chunks)] = True
+                self.chunk_count += len(chunks)
+                self.alive_count += len(chunks)
+                self.message_chunks[slot] = range(first, first + len(chunks))
+            while len(self.postings) < len(term_ids):
+                self.postings.append([np.zeros(0, np.int32), np.zeros(0, np.float32), []])
+            if not terms:
+                return
+            terms = np.array(terms, dtype=np.int32)
+            order = np.argsort(terms, kind="stable")
+            terms = terms[order]
+            chunk_ids = np.array(chunk_ids, dtype=np.int32)[order]
+            tfs = np.array(tfs, dtype=np.float32)[order]
+            bounds = np.flatnonzero(np.diff(terms)) + 1
+            starts = np.concatenate(([0], bounds))
+            stops = np.concatenate((bounds, [len(terms)]))
+            for term, start, stop in zip(terms[starts].tolist(), starts.tolist(), stops.tolist()):
+                self.postings[term][2].append((chunk_ids[start:stop], tfs[start:stop]))
+
+    def remove_message(self, account, folder, uid):
+        with self.lock:
+            self._remove((account, folder, uid))
+
+    def _remove(self, key):
+        # Chunks are only masked out; their postings stay until the next rebuild
+        slot = self.message_ids.pop(key, None)
+        if slot is None:
+            return
+        chunks = self.message_chunks.pop(slot)
+        self.alive[chunks.start:chunks.stop] = False
+        self.total_length -= float(self.chunk_length[chunks.start:chunks.stop].sum())
+        self.alive_count -= len(chunks)
+
+    def _term_postings(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        entry = self.postings[term_id]
+        if entry[2]:
+            entry[0] = np.concatenate([entry[0]] + [ids for ids, _ in entry[2]])
+            entry[1] = np.concatenate([entry[1]] + [tf for _, tf in entry[2]])
+            entry[2] = []
+        return entry[0], entry[1]
+
+    def search(self, query, k=5):
+        terms = set(tokenize(query))
+        with self.lock:
+            if not terms or not self.alive_count:
+                return []
+            n = self.chunk_count
+            average = max(self.total_length / self.alive_count, 1.0)
+            norm = self.k1 * (1 - self.b + self.b * self.chunk_length[:n] / average)
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                postings = self._term_postings(term)
+                if postings is None:
+                    continue
+                ids, tf = postings
+                idf = math.log(1 + (self.alive_count - len(ids) + 0.5) / (len(ids) + 0.5))
+                # Each chunk appears at most once per term, so plain fancy-index add is safe
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+            scores *= self.alive[:n]
+            count = min(k, int(np.count_nonzero(scores)))
+            if count == 0:
+                return []
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            hits = [(float(scores[i]), self.messages[self.chunk_message[i]], int(self.chunk_number[i])) for i in top]
+
+        results = []
+        for score, (account, folder, uid, subject, sender, date), number in hits:
+            body = self.store.get_body(account, folder, uid)
+            if body is None:
+                continue
+            chunks = split_chunks(f"{subject or ''}\n{clean_email_text(body)}", self.chunk_words)
+            results.append({
+                "score": score, "account": account, "folder": folder, "uid": uid,
+                "subject": subject, "sender": sender, "date": date,
+                "text": chunks[number] if number < len(chunks) else chunks[-1],
+            })
+        return results
+
+
+def format_context(results):
+    # Prompt block listing the retrieved chunks with enough metadata to cite them
+    parts = []
+    for i, result in enumerate(results, 1):
+        date = datetime.fromtimestamp(result["date"]).strftime("%Y-%m-%d") if result["date"] else "unknown date"
+        parts.append(f"[{i}] From: {result['sender']} | Subject: {result['subject']} | {date}\n{result['text']}")
+    return ("Excerpts from the user's mailbox that may be relevant. Use them to answer and cite them as [n]; "
+            "say so if they don't contain the answer.\n\n" + "\n\n".join(parts))
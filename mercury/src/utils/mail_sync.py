@@ -0,0 +1,249 @@
+# src/utils/mail_sync.py
+import asyncio
+from src.models.email_account import (LIST_FETCH_ITEMS, build_email, build_sequence_sets, build_uid_set,
+                                      parse_fetch_response, parse_list_response, parse_uid_flags)
+from src.utils.imap_pool import imap_pool
+from src.utils.async_imap import AsyncImapPool
+
+
+# Each folder remembers its UIDVALIDITY, the highest UID already stored and, on
+# CONDSTORE servers, the HIGHESTMODSEQ seen at the last sync. A sync then only
+# fetches UIDs above that mark plus flag changes since that modseq; other
+# servers get a FLAGS-only FETCH of the stored range, diffed against the store.
+class MailSync:
+    def __init__(self, store, pool=imap_pool, batch_size=500, initial_limit=500):
+        self.store = store
+        self.pool = pool
+        self.batch_size = batch_size
+        self.initial_limit = initial_limit
+
+    def sync_folder(self, account, folder='INBOX'):
+        return self.pool.run(account, lambda conn: self._sync(conn, account.email, folder), folder=folder)
+
+    def list_folders(self, account):
+        _, data = self.pool.run(account, lambda conn: conn.imap.list())
+        folders = parse_list_response(data)
+        self.store.set_folders(account.email, folders)
+        return folders
+
+    def backfill_folder(self, account, folder='INBOX', chunk=2000):
+        return self.pool.run(account, lambda conn: self._backfill(conn, account.email, folder, chunk), folder=folder)
+
+    def _backfill(self, conn, account, folder, chunk):
+        # The first sync only takes the newest initial_limit messages; older ones
+        # are fetched here, newest first, chunk at a time: the highest `chunk` of
+        # the UIDs below the lowest one stored. Asking by UID rather than counting
+        # sequence numbers means an expunge between syncs can't shift the window.
+        state = self.store.get_folder_state(account, folder)
+        if state is None or state["complete"] or state["uidvalidity"] != conn.uidvalidity:
+            return {"new": 0, "complete": bool(state and state["complete"])}
+        lowest = self.store.lowest_uid(account, folder)
+        below = lowest if lowest is not None else state["last_uid"] + 1
+        uids, low, span = [], 1, chunk
+        while below > 1:
+            # Only a window of UIDs is searched, widened where deleted mail left them sparse,
+            # so each chunk doesn't list every older UID again
+            low = max(1, below - span)
+            _, data = conn.imap.uid('SEARCH', f"UID {low}:{below - 1}")
+            uids = sorted(uid for uid in map(int, (data[0] or b"").split()) if low <= uid < below)
+            if len(uids) >= chunk or low == 1:
+                break
+            span *= 4
+        wanted = uids[-chunk:]
+        emails = []
+        for start in range(0, len(wanted), self.batch_size):
+            for uid_set in build_uid_set(wanted[start:start + self.batch_size]):
+                _, msg_data = conn.imap.uid('FETCH', uid_set, LIST_FETCH_ITEMS)
+                emails.extend(e for e in parse_emails(msg_data, account, folder) if e.uid)
+        if emails:
+            self.store.add_messages(emails)
+        complete = low == 1 and len(uids) <= chunk
+        if complete:
+            self.store.set_folder_complete(account, folder)
+        return {"new": len(emails), "complete": complete}
+
+    def _sync(self, conn, account, folder):
+        # A fresh checkout was just selected; a reused one is re-selected so
+        # UIDNEXT/HIGHESTMODSEQ are current
+        if conn.reused:
+            conn.select(folder)
+        state, last_uid = self._load_state(conn, account, folder)
+
+        if state is None:
+            new = self._fetch_latest(conn, account, folder)
+        elif conn.uidnext is None or conn.uidnext > last_uid + 1:
+            new = self._fetch_since(conn, account, folder, last_uid)
+        else:
+            new = []
+        changed = {}
+        if self._flags_changed(conn, state, last_uid):
+            changed = self._fetch_changed_flags(conn, last_uid, state["highest_modseq"])
+        elif self._needs_flag_scan(conn, state, last_uid):
+            changed = self._scan_flags(conn, account, folder, last_uid)
+        removed = set()
+        if state and self._may_have_expunged(conn, account, folder, new):
+            removed = self._expunged_uids(conn, account, folder, self.store.message_uids(account, folder))
+        return self._save(conn, account, folder, last_uid, new, changed, removed)
+
+    def _load_state(self, conn, account, folder):
+        state = self.store.get_folder_state(account, folder)
+        if state and state["uidvalidity"] != conn.uidvalidity:
+            # UIDs were reassigned by the server, everything stored is stale
+            self.store.purge_folder(account, folder)
+            state = None
+        return state, (state["last_uid"] if state else 0)
+
+    @staticmethod
+    def _flags_changed(conn, state, last_uid):
+        return bool(state and state["highest_modseq"] and conn.highest_modseq
+                    and conn.highest_modseq > state["highest_modseq"] and last_uid)
+
+    @staticmethod
+    def _needs_flag_scan(conn, state, last_uid):
+        # Without CONDSTORE there is no cheap way to ask what changed
+        return bool(state and last_uid and not (state["highest_modseq"] and conn.highest_modseq))
+
+    def _may_have_expunged(self, conn, account, folder, new):
+        # Without QRESYNC the only cheap signal is the message count: if we hold
+        # more messages than the server reports, some were expunged
+        return self.store.count_messages(account, folder) + len(new) > conn.exists
+
+    def _save(self, conn, account, folder, last_uid, new, changed, removed):
+        new = [e for e in new if e.uid and e.uid > last_uid]
+        if new:
+            self.store.add_messages(new)
+            last_uid = max(e.uid for e in new)
+        if changed:
+            self.store.update_flags(account, folder, changed)
+        if removed:
+            self.store.delete_messages(account, folder, removed)
+        self.store.set_folder_state(account, folder, conn.uidvalidity, last_uid, conn.highest_modseq)
+        return {"new": len(new), "changed": len(changed), "removed": len(removed)}
+
+    def _fetch_latest(self, conn, account, folder):
+        emails = []
+        for sequence_set in self._latest_sequence_sets(conn):
+            _, msg_data = conn.imap.fetch(sequence_set, LIST_FETCH_ITEMS)
+            emails.extend(parse_emails(msg_data, account, folder))
+        return emails
+
+    def _latest_sequence_sets(self, conn):
+        if not conn.exists:
+            return []
+        start = max(1, conn.exists - self.initial_limit + 1) if self.initial_limit else 1
+        return build_sequence_sets(start, conn.exists, self.batch_size)
+
+    def _fetch_since(self, conn, account, folder, last_uid):
+        # "N:*" always matches the newest message, even when its UID is below N
+        _, msg_data = conn.imap.uid('FETCH', f"{last_uid + 1}:*", LIST_FETCH_ITEMS)
+        return parse_emails(msg_data, account, folder)
+
+    def _fetch_changed_flags(self, conn, last_uid, modseq):
+        _, msg_data = conn.imap.uid('FETCH', f"1:{last_uid}", f"(UID FLAGS) (CHANGEDSINCE {modseq})")
+        return parse_changed_flags(msg_data)
+
+    def _scan_flags(self, conn, account, folder, last_uid):
+        local = self.store.message_flags(account, folder)
+        if not local:
+            return {}
+        _, msg_data = conn.imap.uid('FETCH', f"{min(local)}:{last_uid}", "(UID FLAGS)")
+        return diff_flags(local, parse_changed_flags(msg_data))
+
+    def _expunged_uids(self, conn, account, folder, local_uids):
+        if not local_uids:
+            return set()
+        _, data = conn.imap.uid('SEARCH', f"UID {min(local_uids)}:*")
+        return local_uids - {int(uid) for uid in (data[0] or b"").split()}
+
+
+class AsyncMailSync(MailSync):
+    # Same algorithm driven by coroutines on an AsyncImapPool: each account or
+    # folder costs a task instead of a thread, and the batched FETCHes of a
+    # first sync are pipelined on one connection. Store writes stay
+    # synchronous; they are short local SQLite transactions. The pool is only
+    # created by the first sync_folder(), so callers bringing their own
+    # connection to sync_connection() (IdleWatcher) don't get one.
+
+    def __init__(self, store, pool=None, **kwargs):
+        super().__init__(store, pool, **kwargs)
+
+    async def sync_folder(self, account, folder='INBOX'):
+        if self.pool is None:
+            self.pool = AsyncImapPool()
+        async with self.pool.connection(account, folder) as conn:
+            return await self.sync_connection(conn, account.email, folder)
+
+    async def sync_connection(self, conn, account, folder, scan_flags=True):
+        # conn has folder selected. scan_flags=False skips the non-CONDSTORE flag
+        # scan when the caller already knows the flags
+        state, last_uid = self._load_state(conn, account, folder)
+
+        new = []
+        if state is None:
+            replies = await asyncio.gather(*(conn.imap.fetch(sequence_set, LIST_FETCH_ITEMS)
+                                             for sequence_set in self._latest_sequence_sets(conn)))
+            new = [e for _, msg_data in replies for e in parse_emails(msg_data, account, folder)]
+        elif conn.uidnext is None or conn.uidnext > last_uid + 1:
+            _, msg_data = await conn.imap.uid('FETCH', f"{last_uid + 1}:*", LIST_FETCH_ITEMS)
+            new = parse_emails(msg_data, account, folder)
+        changed = {}
+        if self._flags_changed(conn, state, last_uid):
+            _, msg_data = await conn.imap.uid(
+                'FETCH', f"1:{last_uid}", f"(UID FLAGS) (CHANGEDSINCE {state['highest_modseq']})")
+            changed = parse_changed_flags(msg_data)
+        elif scan_flags and self._needs_flag_scan(conn, state, last_uid):
+            local = self.store.message_flags(account, folder)
+            if local:
+                _, msg_data = await conn.imap.uid('FETCH', f"{min(local)}:{last_uid}", "(UID FLAGS)")
+                changed = diff_flags(local, parse_changed_flags(msg_data))
+        removed = set()
+        if state and self._may_have_expunged(conn, account, folder, new):
+            local_uids = self.store.message_uids(account, folder)
+            if local_uids:
+                _, data = await conn.imap.uid('SEARCH', f"UID {min(local_uids)}:*")
+                removed = local_uids - {int(uid) for uid in (data[0] or b"").split()}
+        return self._save(conn, account, folder, last_uid, new, changed, removed)
+
+    async def sync_accounts(self, accounts, batch, folder='INBOX'):
+        # Accounts are started in list order, so put the visible one first;
+        # the pool's per-server semaphores bound the real concurrency
+        async def sync_one(account):
+            try:
+                result = await self.sync_folder(account, folder)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                batch.errors[account.email] = e
+            else:
+                batch.results[account.email] = result
+            batch.done += 1
+            if batch.on_progress:
+                batch.on_progress(batch, account.email)
+
+        try:
+            await asyncio.gather(*(sync_one(account) for account in accounts))
+        finally:
+            if batch.on_finished:
+                batch.on_finished(batch)
+
+
+def parse_emails(msg_data, account, folder):
+    # Replies without the header literal are unsolicited flag updates the server
+    # slipped in (RFC 3501 7.4.2), not messages
+    return [build_email(meta, literal, True, account, folder) for meta, literal in parse_fetch_response(msg_data)
+            if literal]
+
+
+def parse_changed_flags(msg_data):
+    changed = {}
+    for meta, _ in parse_fetch_response(msg_data):
+        uid, flags = parse_uid_flags(meta)
+        if uid:
+            changed[uid] = flags
+    return changed
+
+
+def diff_flags(local, server):
+    # Flag order isn't significant, and UIDs the store doesn't hold are skipped
+    return {uid: flags for uid, flags in server.items()
+            if uid in local and set(flags) != set(local[uid].split())}
@@ -0,0 +1,113 @@
+# src/utils/message_list.py
+from array import array
+from bisect import bisect_right
+
+
+class MessageList:
+    # A message list in display order as message ids rather than objects: a
+    # 100k-message folder is one array of 8-byte ids. When threaded, each
+    # conversation's messages are contiguous in ids and starts holds the
+    # position where each conversation (top-level row) begins. emails holds
+    # EmailMessage objects by id for the rows read so far.
+
+    def __init__(self, ids=(), starts=None):
+        self.ids = array("q", ids)
+        self.starts = starts
+        self.emails = {}
+        self.changes = None  # from ListChanges.update when the load was followed
+
+    @property
+    def threaded(self):
+        return self.starts is not None
+
+    def __len__(self):
+        # Top-level rows
+        return len(self.starts) if self.threaded else len(self.ids)
+
+    def span(self, row):
+        # (start, stop) positions in ids of a top-level row and its children
+        if not self.threaded:
+            return row, row + 1
+        stop = self.starts[row + 1] if row + 1 < len(self.starts) else len(self.ids)
+        return self.starts[row], stop
+
+    def row_ids(self, first, last):
+        # Ids of top-level rows first..last-1 and their children
+        if first >= last:
+            return self.ids[:0]
+        return self.ids[self.span(first)[0]:self.span(last - 1)[1]]
+
+    def locate(self, message_id, rows):
+        # (row, position in the row's conversation) of a message within the first rows, or None
+        try:
+            position = self.ids.index(message_id)
+        except ValueError:
+            return None
+        row = bisect_right(self.starts, position) - 1 if self.threaded else position
+        if row >= rows:
+            return None
+        return row, position - self.span(row)[0]
+
+
+def group_rows(rows, threaded):
+    # MessageList from list_messages rows (id, account, thread_id, flag). Threaded, a
+    # conversation takes the place of its first message in sort order and keeps
+    # its members in the same order. Thread ids are per account.
+    if not threaded:
+        return MessageList(row[0] for row in rows)
+    groups = {}
+    order = []
+    for message_id, account, thread_id, _ in rows:
+        key = (account, thread_id) if thread_id is not None else message_id
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+            order.append(group)
+        group.append(message_id)
+    listing = MessageList(starts=array("q"))
+    for group in order:
+        listing.starts.append(len(listing.ids))
+        listing.ids.extend(group)
+    return listing
+
+
+class ListChanges:
+    # Follows successive loads of the message list for running totals such as
+    # the dashboard's, so they are updated with what changed instead of
+    # re-counting the list. Only the list worker calls update(); listed holds
+    # id -> [(account, folder, uid), flag] for the messages of the last load.
+
+    def __init__(self):
+        self.listed = {}
+
+    def update(self, store, rows):
+        # (added EmailMessages, removed keys, (key, flag) re-flagged) between the last load and
+        # rows; only added messages are read from the store. The first update adds the whole list
+        listed = self.listed
+        new_ids = []
+        reflagged = []
+        for message_id, _, _, flag in rows:
+            entry = listed.get(message_id)
+            if entry is None:
+                new_ids.append(message_id)
+            elif entry[1] != flag:
+                entry[1] = flag
+                reflagged.append((entry[0], flag))
+        removed = [listed.pop(message_id)[0] for message_id in listed.keys() - {row[0] for row in rows}]
+        added = store.load_by_id(new_ids)
+        for message_id, email in added.items():
+            listed[message_id] = [(email.account, email.folder, email.uid), email.flag]
+        return list(added.values()), removed, reflagged
+
+
+def load_message_list(store, column=0, descending=True, threaded=False, first_page=500, changes=None, **source):
+    # Runs on a worker: sorts the list in SQLite, groups it and reads the first
+    # page of rows, so the view has something to show without touching the store.
+    # source is list_messages' accounts/folder/text. Given a ListChanges, what
+    # changed since its last load is left in listing.changes
+    rows = store.list_messages(column=column, descending=descending, **source)
+    listing = group_rows(rows, threaded)
+    listing.emails = store.load_by_id(listing.row_ids(0, min(first_page, len(listing))))
+    if changes is not None:
+        listing.changes = changes.update(store, rows)
+    return listing
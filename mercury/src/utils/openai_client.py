@@ -0,0 +1,19 @@
+# src/utils/openai_client.py
+import os
+import threading
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_openai_client():
+    # openai and dotenv are imported on first use rather than at startup;
+    # call from a worker thread so the import never blocks the GUI
+    global _client
+    with _lock:
+        if _client is None:
+            from dotenv import load_dotenv
+            from openai import OpenAI
+            load_dotenv()
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
@@ -0,0 +1,90 @@
+# src/utils/raw_store.py
+import itertools
+import tempfile
+import threading
+
+
+class RawStore:
+    # Spill file for the bulky parts of messages: raw RFC 822 bytes and decoded
+    # bodies. Messages keep only the ref returned by put(); the bytes are read
+    # back on demand. release() hands a span back when its message goes away,
+    # and once the dead spans outweigh the live ones (and at least
+    # compact_bytes) the live ones are moved down and the file truncated, so a
+    # long session re-opening messages doesn't grow it without bound. The
+    # default anonymous temp file disappears when the process exits.
+
+    def __init__(self, path=None, compact_bytes=8 * 1024 * 1024):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self.file = None
+        self.size = 0
+        self.live = 0
+        self.spans = {}  # ref -> (offset, length)
+        self.refs = itertools.count(1)
+        # Refs given back, reclaimed by the next put(). release() doesn't take the
+        # lock: it runs from EmailMessage.__del__, possibly inside a put() on this thread
+        self.released = []
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile() if self.path is None else open(self.path, "w+b")
+
+    def put(self, data):
+        with self.lock:
+            self._open()
+            self._reclaim()
+            ref = next(self.refs)
+            self.file.seek(self.size)
+            self.file.write(data)
+            self.spans[ref] = (self.size, len(data))
+            self.size += len(data)
+            self.live += len(data)
+            return ref
+
+    def get(self, ref):
+        with self.lock:
+            offset, length = self.spans[ref]
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def release(self, ref):
+        self.released.append(ref)
+
+    def _reclaim(self):
+        while self.released:
+            span = self.spans.pop(self.released.pop(), None)
+            if span is not None:
+                self.live -= span[1]
+        dead = self.size - self.live
+        if dead and (self.live == 0 or (dead >= self.compact_bytes and dead > self.live)):
+            self._compact()
+
+    def _compact(self):
+        # Spans are moved down in file order, so each lands at or below where it
+        # was and never over one still to be moved
+        offset = 0
+        for ref, (start, length) in sorted(self.spans.items(), key=lambda item: item[1][0]):
+            if start != offset:
+                self.file.seek(start)
+                data = self.file.read(length)
+                self.file.seek(offset)
+                self.file.write(data)
+                self.spans[ref] = (offset, length)
+            offset += length
+        self.file.truncate(offset)
+        self.size = offset
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.size = 0
+            self.live = 0
+            self.spans = {}
+            self.released = []
+
+
+# Shared by every EmailMessage that was fetched with its full body
+raw_store = RawStore()
@@ -0,0 +1,109 @@
+# src/utils/summary_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'summary_cache.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    latency REAL NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_last_access ON summaries (last_access);
+"""
+
+
+def normalize_body(text):
+    return " ".join(text.split())
+
+
+def cache_key(body, model, prompt, params):
+    payload = json.dumps([normalize_body(body), model, prompt, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SummaryCache:
+    # Persistent LRU keyed by a hash of (normalized body, model, prompt, params).
+    # Entries older than ttl seconds are treated as misses; once max_entries or
+    # max_bytes is exceeded the least recently used entries are evicted.
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=5000, max_bytes=20 * 1024 * 1024,
+                 ttl=30 * 24 * 3600):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            # The GUI reads summaries while the daemon writes them from another process
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT summary, created, latency, tokens FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += row[2]
+            self.saved_tokens += row[3]
+            return row[0]
+
+    def put(self, key, summary, latency=0.0, tokens=0):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, summary, now, now, len(summary.encode()), latency, tokens))
+            self._evict()
+
+    def _evict(self):
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used until both limits hold again
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM summaries ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self.conn.executemany("DELETE FROM summaries WHERE key = ?", doomed)
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM summaries")
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "saved_seconds": round(self.saved_seconds, 2),
+            "saved_tokens": self.saved_tokens,
+        }
@@ -0,0 +1,121 @@
+# src/utils/summary_pipeline.py
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# HTTP statuses worth retrying: rate limited or a transient server error
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Summaries that failed for good are reported as this followed by the error
+FAILED_PREFIX = "Unable to summarize email content:"
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError")
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class SummaryRun:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.cancelled = threading.Event()
+        self.futures = []
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+
+class SummaryPipeline:
+    # Runs summarize(content) for many messages at once, at most max_concurrency
+    # in flight. A rate-limit response pauses every worker (not just the one
+    # that hit it) with exponential backoff and jitter, honouring Retry-After.
+
+    def __init__(self, summarize, max_concurrency=4, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.summarize = summarize
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mercury-summary")
+
+    def run(self, jobs, on_result, on_finished=None):
+        # jobs: iterable of (key, load_content) where load_content() returns the text
+        # on_result(key, summary) is called from worker threads as each one completes
+        jobs = list(jobs)
+        summary_run = SummaryRun(len(jobs))
+        lock = threading.Lock()
+
+        def complete(key, summary):
+            if summary is not None:
+                on_result(key, summary)
+            with lock:
+                summary_run.done += 1
+                finished = summary_run.done == summary_run.total
+            if finished and on_finished:
+                on_finished(summary_run)
+
+        def task(key, load_content):
+            summary = None
+            try:
+                if not summary_run.cancelled.is_set():
+                    summary = self._summarize_with_retry(load_content(), summary_run.cancelled)
+            except Exception as e:
+                summary = f"{FAILED_PREFIX} {e}"
+            complete(key, summary)
+
+        def count_if_cancelled(key, future):
+            # A job cancelled before it started never runs task(); still count it
+            if future.cancelled():
+                complete(key, None)
+
+        for key, load_content in jobs:
+            future = self._executor.submit(task, key, load_content)
+            future.add_done_callback(functools.partial(count_if_cancelled, key))
+            summary_run.futures.append(future)
+        if not jobs and on_finished:
+            on_finished(summary_run)
+        return summary_run
+
+    def _wait_for_slot(self, cancelled):
+        while not cancelled.is_set():
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return True
+            cancelled.wait(delay)
+        return False
+
+    def _summarize_with_retry(self, content, cancelled):
+        for attempt in range(self.max_retries + 1):
+            if not self._wait_for_slot(cancelled):
+                return None
+            try:
+                return self.summarize(content)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after(e) or min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay *= 1 + random.random() * 0.25
+                with self._lock:
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
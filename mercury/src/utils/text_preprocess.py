@@ -0,0 +1,127 @@
+# src/utils/text_preprocess.py
+import re
+
+CHARS_PER_TOKEN = 4
+
+# A line that starts a quoted reply; everything from here down is the previous message
+_REPLY_HEADER_RE = re.compile(
+    r"^(On .{0,200}wrote:\s*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|_{10,}\s*$"
+    r"|From:\s.+\n(Sent|Date):\s)",
+    re.IGNORECASE | re.MULTILINE)
+
+# Signature delimiters and mobile sign-offs; the rest of the message is dropped
+_SIGNATURE_RE = re.compile(
+    r"^(-- ?$|Sent from my \w+|Get Outlook for \w+)",
+    re.IGNORECASE | re.MULTILINE)
+
+# Lines that carry no content: unsubscribe footers, confidentiality notices, view-in-browser links
+_BOILERPLATE_RE = re.compile(
+    r"unsubscribe|view (this|it) in (your|a) browser|manage (your )?(email )?preferences"
+    r"|this (e-?mail|message)( and any attachments)? (is|are|may be) (confidential|intended)"
+    r"|please consider the environment before printing",
+    re.IGNORECASE)
+
+_URL_RE = re.compile(r"<?https?://\S+>?")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# tiktoken gives exact counts for OpenAI models; without it fall back to ~4 chars per token.
+# Imported on the first count, False once it is known to be missing.
+_encoding = None
+
+
+def strip_quoted(text):
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith(">")]
+    text = "\n".join(lines)
+    match = _REPLY_HEADER_RE.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()]
+    return text
+
+
+def strip_signature(text):
+    match = _SIGNATURE_RE.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()]
+    return text
+
+
+def strip_boilerplate(text):
+    lines = [line for line in text.splitlines() if not _BOILERPLATE_RE.search(line)]
+    text = "\n".join(line.rstrip() for line in lines)
+    # Long tracking URLs cost many tokens and add nothing to a summary
+    text = _URL_RE.sub("[link]", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def clean_email_text(text):
+    # The order matters: quoted replies often carry their own signatures
+    return strip_boilerplate(strip_signature(strip_quoted(text)))
+
+
+def thread_text(messages):
+    # messages: (sender, date, body) oldest first. Each body is cleaned on its own
+    # and paragraphs already seen earlier in the conversation are dropped, so text
+    # repeated down a reply chain (or the same message in two folders) is sent once
+    seen = set()
+    parts = []
+    for sender, date, body in messages:
+        paragraphs = []
+        for paragraph in clean_email_text(body or "").split("\n\n"):
+            key = " ".join(paragraph.split()).lower()
+            if key and key not in seen:
+                seen.add(key)
+                paragraphs.append(paragraph.strip())
+        if paragraphs:
+            parts.append(f"[{sender}, {date}]\n" + "\n\n".join(paragraphs))
+    return "\n\n".join(parts)
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _split_long(paragraph, max_tokens):
+    # A single paragraph over the limit is split on sentences, then hard-split by size
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+        while count_tokens(sentence) > max_tokens:
+            cut = max_tokens * CHARS_PER_TOKEN
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        pieces.append(sentence)
+    return pieces
+
+
+def chunk_text(text, max_tokens):
+    # Packs whole paragraphs into chunks of at most max_tokens tokens
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in text.split("\n\n"):
+        pieces = [paragraph] if count_tokens(paragraph) <= max_tokens else _split_long(paragraph, max_tokens)
+        for piece in pieces:
+            # +1 for the paragraph separator
+            tokens = count_tokens(piece) + 1
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
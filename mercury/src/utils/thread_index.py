@@ -0,0 +1,181 @@
+# src/utils/thread_index.py
+import re
+import threading
+
+_MESSAGE_ID_RE = re.compile(r"<[^<>\s]+>")
+_REPLY_PREFIX_RE = re.compile(r"^\s*((re|fw|fwd|aw|wg|sv|antw)(\[\d+\])?\s*:\s*)+", re.I)
+
+
+def parse_references(references, in_reply_to):
+    # Message-IDs from References (oldest first) followed by In-Reply-To when it adds a parent
+    refs = _MESSAGE_ID_RE.findall(references or "")
+    parent = _MESSAGE_ID_RE.findall(in_reply_to or "")
+    if parent and (not refs or refs[-1] != parent[0]):
+        refs.append(parent[0])
+    return refs
+
+
+def base_subject(subject):
+    return _REPLY_PREFIX_RE.sub("", subject or "").strip().lower()
+
+
+def is_reply_subject(subject):
+    return bool(_REPLY_PREFIX_RE.match(subject or ""))
+
+
+class ThreadIndex:
+    # Incremental JWZ threading (https://www.jwz.org/doc/threading.html) for one
+    # account. Each message links the containers of its References chain and
+    # hangs under the last one; a reply with no references joins the thread
+    # whose root has the same base subject. The thread id of a message is its
+    # tree's root container + 1. add() is O(references) per message, and
+    # flush() walks only trees that were touched since the last flush.
+    #
+    # Containers are indexes into parallel int lists (parent, first child, next
+    # sibling, stored row) rather than objects: 100k small objects cost more in
+    # allocation and garbage-collector passes than the threading itself.
+
+    def __init__(self):
+        self.ids = {}  # Message-ID -> container
+        self.parent = []
+        self.first_child = []
+        self.next_sibling = []
+        self.rowid = []  # stored row carrying the Message-ID, None if only referenced
+        self.more_rowids = {}  # container -> further rows with the same Message-ID (copies in other folders)
+        self.subjects = {}  # base subject -> container that started a thread with it
+        self.thread_of = {}  # rowid -> thread id as last reported
+        self._touched = []
+
+    def _get(self, message_id):
+        container = self.ids.get(message_id)
+        if container is None:
+            container = self.ids[message_id] = len(self.parent)
+            self.parent.append(-1)
+            self.first_child.append(-1)
+            self.next_sibling.append(-1)
+            self.rowid.append(None)
+        return container
+
+    def _root(self, container):
+        parent = self.parent
+        while parent[container] >= 0:
+            container = parent[container]
+        return container
+
+    def _link(self, new_parent, child):
+        parent = self.parent
+        if parent[child] == new_parent:
+            return
+        # Refuses links that would make a loop
+        ancestor = new_parent
+        while ancestor >= 0:
+            if ancestor == child:
+                return
+            ancestor = parent[ancestor]
+        old = parent[child]
+        if old >= 0:
+            if self.first_child[old] == child:
+                self.first_child[old] = self.next_sibling[child]
+            else:
+                sibling = self.first_child[old]
+                while self.next_sibling[sibling] != child:
+                    sibling = self.next_sibling[sibling]
+                self.next_sibling[sibling] = self.next_sibling[child]
+        parent[child] = new_parent
+        self.next_sibling[child] = self.first_child[new_parent]
+        self.first_child[new_parent] = child
+
+    def add(self, rowid, message_id, refs, subject):
+        ids = self.ids
+        container = self._get(message_id or f"<{rowid}@mercury.local>")
+        if self.rowid[container] is None:
+            self.rowid[container] = rowid
+        else:
+            self.more_rowids.setdefault(container, []).append(rowid)
+        self._touched.append(container)
+        previous = -1
+        for ref in refs:
+            ref_container = ids.get(ref)
+            if ref_container is None:
+                ref_container = self._get(ref)
+            # Earlier References entries only fill in missing links, they never move a message
+            if previous >= 0 and self.parent[ref_container] < 0:
+                self._link(previous, ref_container)
+            previous = ref_container
+        if previous >= 0 and previous != container:
+            # The message's own parent is authoritative
+            self._link(previous, container)
+        if not subject:
+            return
+        if self.parent[container] < 0:
+            key = base_subject(subject)
+            started = self.subjects.get(key)
+            if started is None or started == container:
+                if key:
+                    self.subjects[key] = container
+            elif is_reply_subject(subject):
+                self._link(self._root(started), container)
+        else:
+            # A thread whose root message is missing is known by its replies' subject
+            root = self._root(container)
+            if self.rowid[root] is None:
+                self.subjects.setdefault(base_subject(subject), root)
+
+    def flush(self):
+        # (thread id, rowid) for every message whose thread changed since the last flush
+        roots = set(map(self._root, self._touched))
+        self._touched = []
+        first_child, next_sibling, rowids = self.first_child, self.next_sibling, self.rowid
+        thread_of, more_rowids = self.thread_of, self.more_rowids
+        changed = []
+        for root in roots:
+            thread = root + 1
+            stack = [root]
+            while stack:
+                container = stack.pop()
+                child = first_child[container]
+                while child >= 0:
+                    stack.append(child)
+                    child = next_sibling[child]
+                rowid = rowids[container]
+                if rowid is not None and thread_of.get(rowid) != thread:
+                    thread_of[rowid] = thread
+                    changed.append((thread, rowid))
+                if container in more_rowids:
+                    for rowid in more_rowids[container]:
+                        if thread_of.get(rowid) != thread:
+                            thread_of[rowid] = thread
+                            changed.append((thread, rowid))
+        return changed
+
+
+class ThreadIndexer:
+    # Keeps a ThreadIndex per account in step with the store. The first update
+    # builds it from every stored row; later ones only add rows that have no
+    # thread yet (new or backfilled mail) and write back the ids that changed.
+
+    def __init__(self, store):
+        self.store = store
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def update(self, account):
+        with self.lock:
+            index = self.indexes.get(account)
+            fresh = index is None
+            if fresh:
+                index = self.indexes[account] = ThreadIndex()
+            thread_of = index.thread_of
+            for rowid, message_id, refs, subject, thread_id in self.store.thread_rows(account, fresh):
+                index.add(rowid, message_id, refs.split() if refs else (), subject)
+                if thread_id is not None:
+                    # Stored by an earlier session: only ids that really change are written back
+                    thread_of[rowid] = thread_id
+            changed = index.flush()
+            if changed:
+                self.store.set_thread_ids(changed)
+            return len(changed)
+
+    def forget(self, account):
+        with self.lock:
+            self.indexes.pop(account, None)
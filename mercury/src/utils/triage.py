@@ -0,0 +1,167 @@
+# src/utils/triage.py
+import json
+import os
+import re
+import threading
+from src.models.email_message import FLAG_KEYWORDS
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'triage.json')
+
+# Example src/config/triage.json; rules are tried in order and the first match wins:
+# {"rules": [{"flag": "urgent", "sender": "boss@example.com"},
+#            {"flag": "important", "domain": ["example.org", "client.com"]},
+#            {"flag": "on_track", "subject": "weekly report"},
+#            {"flag": "urgent", "keyword": ["outage", "incident"]}],
+#  "classifier": true, "threshold": 0.7, "push": false}
+# Triage flags stay in the local store; "push": true also stores them on the server as keywords
+DEFAULT_CONFIG = {"rules": [], "classifier": True, "threshold": 0.7, "min_examples": 20, "push": False}
+MATCHERS = ("sender", "domain", "subject", "keyword")
+_ADDRESS_RE = re.compile(r"[^\s<>\"',;:()]+@[^\s<>\"',;:()]+")
+
+
+def load_triage_config(path=DEFAULT_CONFIG_PATH):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error loading triage rules: {e}")
+    return config
+
+
+def sender_address(sender):
+    # The address of "Name <a@b.com>" or a bare a@b.com; the last one wins, as display names
+    # can contain addresses too. Far cheaper than email.utils.parseaddr on every message
+    found = _ADDRESS_RE.findall(sender or "")
+    return found[-1].lower() if found else (sender or "").strip().lower()
+
+
+class RuleMatcher:
+    # User rules compiled once: exact senders and domains become dict lookups
+    # (a domain also matches its subdomains), subject phrases and whole-word
+    # keywords become one alternation regex each, so a message costs a few
+    # lookups and two scans however many rules there are. When several rules
+    # match, the one listed first wins.
+
+    def __init__(self, rules):
+        self.flags = []
+        tables = {kind: {} for kind in MATCHERS}
+        for position, rule in enumerate(rules):
+            flag = rule.get("flag")
+            if flag not in FLAG_KEYWORDS:
+                print(f"Error in triage rule {position + 1}: unknown flag {flag!r}")
+                flag = None
+            self.flags.append(flag)
+            for kind in MATCHERS:
+                values = rule.get(kind) or ()
+                for value in [values] if isinstance(values, str) else values:
+                    value = value.strip().lower()
+                    if value and flag:
+                        tables[kind].setdefault(value, position)
+        self.senders = tables["sender"]
+        self.domains = tables["domain"]
+        self.subjects = tables["subject"]
+        self.keywords = tables["keyword"]
+        # Longest first, so a phrase wins over a shorter one starting at the same place
+        self.subject_re = self._compile(self.subjects, "{}")
+        self.keyword_re = self._compile(self.keywords, r"\b(?:{})\b")
+
+    @staticmethod
+    def _compile(table, template):
+        if not table:
+            return None
+        terms = sorted(table, key=len, reverse=True)
+        return re.compile(template.format("|".join(map(re.escape, terms))))
+
+    def __bool__(self):
+        return bool(self.senders or self.domains or self.subjects or self.keywords)
+
+    def match(self, sender, subject, body=None):
+        address = sender_address(sender)
+        best = self.senders.get(address)
+        domain = address.rpartition("@")[2]
+        while domain:
+            position = self.domains.get(domain)
+            if position is not None and (best is None or position < best):
+                best = position
+            domain = domain.partition(".")[2]
+        subject = (subject or "").lower()
+        for pattern, table, texts in ((self.subject_re, self.subjects, (subject,)),
+                                      (self.keyword_re, self.keywords, (subject, (body or "").lower()))):
+            if pattern is None:
+                continue
+            for text in texts:
+                for match in pattern.finditer(text):
+                    position = table[match.group()]
+                    if best is None or position < best:
+                        best = position
+        return self.flags[best] if best is not None else None
+
+
+class Triage:
+    # Pre-flags newly synced messages without any network call. Rules decide
+    # first; messages no rule matched go to the classifier (trained on flags the
+    # user or the server set, never on its own guesses) and are flagged only
+    # when it is at least `threshold` sure. Only unmarked messages are touched,
+    # each message is looked at once, and the flags stay local unless the
+    # config asks to push them. run() returns what it flagged.
+
+    def __init__(self, store, config=None, batch_size=2000, history_limit=50000):
+        self.store = store
+        self.config = config if config is not None else load_triage_config()
+        self.rules = RuleMatcher(self.config.get("rules", []))
+        self.batch_size = batch_size
+        self.history_limit = history_limit
+        self.classifier = None
+        self.trained = False
+        # labelled_count() when a fit last found too little to learn from; None otherwise
+        self.labelled = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        # The user re-flagged something: retrain before the next batch
+        self.trained = False
+
+    def _train(self):
+        self.trained = True
+        self.classifier = None
+        self.labelled = None
+        if not self.config.get("classifier"):
+            return
+        # NumPy is only imported once the classifier is actually needed
+        from src.utils.triage_model import TriageClassifier
+        classifier = TriageClassifier(min_examples=self.config.get("min_examples", 20))
+        labelled = self.store.labelled_count()
+        if classifier.fit(self.store.triage_history(self.history_limit)):
+            self.classifier = classifier
+        else:
+            # Too few flags to learn from yet (e.g. a fresh store); try again once there are more
+            self.labelled = labelled
+
+    def classify(self, rows):
+        # rows: (sender, subject, body); a flag or None for each
+        flags = [self.rules.match(*row) if self.rules else None for row in rows]
+        if self.classifier is not None:
+            rest = [i for i, flag in enumerate(flags) if flag is None]
+            if rest:
+                predicted = self.classifier.predict([rows[i] for i in rest], self.config.get("threshold", 0.7))
+                for i, flag in zip(rest, predicted):
+                    flags[i] = flag
+        return flags
+
+    def run(self, account):
+        flagged = []
+        with self.lock:
+            if not self.trained or self.labelled is not None and self.store.labelled_count() != self.labelled:
+                self._train()
+            while True:
+                rows = self.store.untriaged(account, self.batch_size)
+                if not rows:
+                    break
+                candidates = [row for row in rows if row[6] == "unmarked"]
+                flags = self.classify([(sender, subject, body) for _, _, _, sender, subject, body, _ in candidates])
+                batch = [(folder, uid, flag) for (_, folder, uid, _, _, _, _), flag in zip(candidates, flags) if flag]
+                self.store.set_triaged(account, [row[0] for row in rows], batch, self.config.get("push", False))
+                flagged.extend(batch)
+        return flagged
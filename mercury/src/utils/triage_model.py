@@ -0,0 +1,108 @@
+# src/utils/triage_model.py
+import numpy as np
+from src.models.email_message import FLAG_KEYWORDS
+from src.utils.mail_index import tokenize
+from src.utils.triage import sender_address
+
+LABELS = ("unmarked",) + tuple(FLAG_KEYWORDS)
+
+
+def sender_features(sender, dims):
+    # Bias, sender and domain. Python's string hash is salted per process, which is fine
+    # because the model is trained at the start of every session and never saved
+    address = sender_address(sender)
+    return [hash(feature) % dims for feature in ("", "@" + address, "@@" + address.rpartition("@")[2])]
+
+
+def text_features(subject, body, dims):
+    # Subject words, and body words when the body has been fetched
+    features = ["s:" + word for word in tokenize(subject or "")]
+    if body:
+        features += ["b:" + word for word in set(tokenize(body[:2000]))]
+    return [hash(feature) % dims for feature in features]
+
+
+class TriageClassifier:
+    # Multinomial logistic regression over hashed sparse features, trained with
+    # full-batch AdaGrad. A message is a run of feature ids in one flat array;
+    # scores are np.add.reduceat over the weight rows, gradients one np.bincount
+    # per class. Only hashed ids seen in training get a weight row (found with
+    # searchsorted at prediction time, unseen ones share a zero row), so every
+    # update touches tens of thousands of rows rather than all 2**18. Classes
+    # are weighted by inverse frequency so a few hundred flagged messages
+    # aren't drowned by tens of thousands of unmarked ones.
+
+    def __init__(self, dims=2 ** 18, epochs=30, learning_rate=0.5, l2=1e-6, min_examples=20):
+        self.dims = dims
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.min_examples = min_examples
+        self.features = None  # sorted hashed ids that have a weight row
+        self.weights = None
+        self.known = None  # classes with enough examples to be predicted
+
+    def _encode(self, rows):
+        # Senders repeat a lot and parsing addresses is the slow part, so each is done once
+        senders = {}
+        ids = []
+        for sender, subject, body in rows:
+            known = senders.get(sender)
+            if known is None:
+                known = senders[sender] = sender_features(sender, self.dims)
+            ids.append(known + text_features(subject, body, self.dims))
+        lengths = np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+        flat = np.fromiter((i for row in ids for i in row), dtype=np.int64, count=int(lengths.sum()))
+        starts = np.zeros(len(ids), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return flat, starts, lengths
+
+    def _rows(self, flat):
+        positions = np.searchsorted(self.features, flat)
+        found = self.features[np.minimum(positions, len(self.features) - 1)] == flat
+        return np.where(found, positions, len(self.features))
+
+    def _probabilities(self, flat, starts):
+        scores = np.add.reduceat(self.weights[flat], starts, axis=0)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def fit(self, history):
+        # history: (sender, subject, body, flag); False when there is too little to learn from
+        rows = [(sender, subject, body) for sender, subject, body, flag in history if flag in LABELS]
+        labels = np.array([LABELS.index(flag) for _, _, _, flag in history if flag in LABELS], dtype=np.int64)
+        counts = np.bincount(labels, minlength=len(LABELS))
+        self.known = counts >= self.min_examples
+        if not self.known[0] or not self.known[1:].any():
+            return False
+        flat, starts, lengths = self._encode(rows)
+        self.features, flat = np.unique(flat, return_inverse=True)
+        size = len(self.features) + 1
+        rows_of = np.repeat(np.arange(len(rows)), lengths)
+        targets = np.zeros((len(rows), len(LABELS)), dtype=np.float32)
+        targets[np.arange(len(rows)), labels] = 1
+        sample_weight = (len(rows) / (self.known.sum() * np.maximum(counts, 1)))[labels].astype(np.float32)
+        sample_weight /= len(rows)
+        self.weights = np.zeros((size, len(LABELS)), dtype=np.float32)
+        accumulated = np.full_like(self.weights, 1e-8)
+        for _ in range(self.epochs):
+            error = ((self._probabilities(flat, starts) - targets) * sample_weight[:, None])[rows_of]
+            gradient = np.stack([np.bincount(flat, weights=error[:, c], minlength=size)
+                                 for c in range(len(LABELS))], axis=1).astype(np.float32)
+            gradient += self.l2 * self.weights
+            accumulated += gradient * gradient
+            self.weights -= self.learning_rate * gradient / np.sqrt(accumulated)
+        return True
+
+    def predict(self, rows, threshold):
+        # A flag for each row, or None when unmarked wins or the best flag is below threshold
+        if self.weights is None or not rows:
+            return [None] * len(rows)
+        flat, starts, _ = self._encode(rows)
+        probabilities = self._probabilities(self._rows(flat), starts)
+        probabilities[:, ~self.known] = 0
+        best = probabilities.argmax(axis=1)
+        confident = probabilities[np.arange(len(rows)), best] >= threshold
+        return [LABELS[label] if sure and label else None for label, sure in zip(best.tolist(), confident.tolist())]
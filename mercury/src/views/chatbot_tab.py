@@ -1,16 +1,28 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QTextEdit, QLineEdit, 
-                               QPushButton, QHBoxLayout)
-from PySide6.QtCore import Qt, Slot
-from PySide6.QtGui import QTextCursor
-from openai import OpenAI
-import os
+                               QPushButton, QHBoxLayout, QCheckBox)
+from PySide6.QtCore import Qt, Slot, Signal, QThreadPool
+from PySide6.QtGui import QTextCursor, QTextCharFormat
+import threading
+
+from src.views.worker import Worker
+from src.utils.chat_stream import CHAT_SYSTEM_PROMPT, stream_chat, summarize_turns
+from src.utils.chat_context import ChatContext
+from src.utils.openai_client import get_openai_client
 
 class ChatbotTab(QWidget):
-    def __init__(self):
+    token_received = Signal(str)
+
+    def __init__(self, mail_index_provider=None):
         super().__init__()
+        # Returns the email tab's retrieval index, or None while it is still loading
+        self.mail_index_provider = mail_index_provider
         self.setup_ui()
-        self.chat_history = []
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Full conversation on disk; only the summary plus recent turns are sent
+        self.context = ChatContext()
+        self.threadpool = QThreadPool()
+        self.cancel_event = None
+        self.token_received.connect(self.append_token)
+        self.show_history()
 
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -25,9 +37,20 @@ class ChatbotTab(QWidget):
         self.message_input.returnPressed.connect(self.send_message)
         self.send_button = QPushButton("Send")
         self.send_button.clicked.connect(self.send_message)
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stop_response)
+        self.stop_button.setEnabled(False)
 
         input_layout.addWidget(self.message_input)
         input_layout.addWidget(self.send_button)
+        input_layout.addWidget(self.stop_button)
+        new_chat_button = QPushButton("New Chat")
+        new_chat_button.clicked.connect(self.new_chat)
+        input_layout.addWidget(new_chat_button)
+        self.use_mail_checkbox = QCheckBox("Use my email")
+        self.use_mail_checkbox.setChecked(self.mail_index_provider is not None)
+        self.use_mail_checkbox.setEnabled(self.mail_index_provider is not None)
+        input_layout.addWidget(self.use_mail_checkbox)
 
         # Add widgets to main layout
         layout.addWidget(self.chat_display)
@@ -38,31 +61,92 @@ class ChatbotTab(QWidget):
     @Slot()
     def send_message(self):
         user_message = self.message_input.text().strip()
-        if user_message:
+        if user_message and self.cancel_event is None:
             self.display_message("You", user_message)
-            self.chat_history.append({"role": "user", "content": user_message})
+            self.context.add("user", user_message)
             self.message_input.clear()
-            self.get_ai_response()
-
-    def get_ai_response(self):
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini", 
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    *self.chat_history
-                ],
-                temperature=1,
-                max_tokens=4000,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0
-            )
-            ai_message = response.choices[0].message.content.strip()
-            self.chat_history.append({"role": "assistant", "content": ai_message})
-            self.display_message("AI", ai_message)
-        except Exception as e:
-            self.display_message("System", f"Error: {str(e)}")
+            self.get_ai_response(user_message)
+
+    def get_ai_response(self, user_message):
+        # Tokens are streamed by a pool thread and appended as they arrive
+        messages = self.context.build_messages(CHAT_SYSTEM_PROMPT)
+        mail_index = self.mail_index_provider() if self.mail_index_provider else None
+        if mail_index is not None and self.use_mail_checkbox.isChecked():
+            # Only the best-matching chunks of cached mail go into this request;
+            # they are not kept in the conversation history
+            from src.utils.mail_index import format_context
+            results = mail_index.search(user_message)
+            if results:
+                messages.insert(-1, {"role": "system", "content": format_context(results)})
+        self.cancel_event = threading.Event()
+        self.set_streaming(True)
+        self.chat_display.moveCursor(QTextCursor.End)
+        self.chat_display.insertHtml("<b>AI:</b> ")
+        # The OpenAI client (and its import) is created on the worker, not the GUI thread
+        cancelled = self.cancel_event
+        worker = Worker(lambda: stream_chat(get_openai_client(), messages, self.token_received.emit, cancelled))
+        worker.signals.result.connect(self.on_response_finished)
+        worker.signals.error.connect(self.on_response_error)
+        self.threadpool.start(worker)
+
+    @Slot()
+    def stop_response(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    def set_streaming(self, streaming):
+        self.send_button.setEnabled(not streaming)
+        self.stop_button.setEnabled(streaming)
+
+    @Slot(str)
+    def append_token(self, text):
+        cursor = self.chat_display.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text, QTextCharFormat())
+        self.chat_display.setTextCursor(cursor)
+
+    @Slot(object)
+    def on_response_finished(self, ai_message):
+        # A stopped response keeps whatever arrived so the conversation stays coherent
+        if self.cancel_event.is_set():
+            self.append_token(" [stopped]")
+        if ai_message.strip():
+            self.context.add("assistant", ai_message.strip())
+        self.chat_display.insertHtml("<br><br>")
+        self.cancel_event = None
+        self.set_streaming(False)
+        self.fold_history()
+
+    def fold_history(self):
+        # Older turns are summarized in the background; the next request picks it up
+        if self.context.needs_fold():
+            self.threadpool.start(Worker(self.context.fold,
+                                         lambda summary, turns: summarize_turns(get_openai_client(), summary, turns)))
+
+    def show_history(self):
+        for message in self.context.messages:
+            sender = "You" if message["role"] == "user" else "AI"
+            self.chat_display.moveCursor(QTextCursor.End)
+            self.chat_display.insertHtml(f"<b>{sender}:</b> ")
+            self.append_token(message["content"])
+            self.chat_display.insertHtml("<br><br>")
+
+    @Slot()
+    def new_chat(self):
+        if self.cancel_event is None:
+            self.context.clear()
+            self.chat_display.clear()
+
+    @Slot(tuple)
+    def on_response_error(self, error):
+        self.chat_display.insertHtml("<br><br>")
+        self.display_message("System", f"Error: {str(error[1])}")
+        self.cancel_event = None
+        self.set_streaming(False)
+
+    def shutdown(self):
+        self.stop_response()
+        self.threadpool.waitForDone()
 
     def display_message(self, sender, message):
         self.chat_display.moveCursor(QTextCursor.End)
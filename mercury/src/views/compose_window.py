@@ -0,0 +1,71 @@
+# src/views/compose_window.py
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QFormLayout, QLineEdit, QTextEdit,
+                               QPushButton, QComboBox, QMessageBox)
+from PySide6.QtCore import Signal, QThreadPool, Slot
+from src.controllers.email_controller import build_message, send_email, send_email_async
+from src.utils.async_backend import use_async_backend, get_async_backend
+from src.views.worker import Worker
+
+
+class ComposeWindow(QWidget):
+    # Emitted from worker/loop threads; Qt queues it onto the GUI thread
+    send_finished = Signal(object)
+
+    def __init__(self, email_accounts):
+        super().__init__()
+        self.email_accounts = email_accounts
+        self.setWindowTitle("Compose Email")
+        self.send_finished.connect(self.on_send_finished)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+
+        self.from_input = QComboBox()
+        self.from_input.addItems([account.email for account in self.email_accounts])
+        self.to_input = QLineEdit()
+        self.to_input.setPlaceholderText("alice@example.com, bob@example.com")
+        self.subject_input = QLineEdit()
+
+        form_layout.addRow("From:", self.from_input)
+        form_layout.addRow("To:", self.to_input)
+        form_layout.addRow("Subject:", self.subject_input)
+        layout.addLayout(form_layout)
+
+        self.body_input = QTextEdit()
+        layout.addWidget(self.body_input)
+
+        self.send_button = QPushButton("Send")
+        self.send_button.clicked.connect(self.send)
+        layout.addWidget(self.send_button)
+
+        self.setLayout(layout)
+
+    def send(self):
+        to_addrs = [addr.strip() for addr in self.to_input.text().split(",") if addr.strip()]
+        index = self.from_input.currentIndex()
+        if not to_addrs or not 0 <= index < len(self.email_accounts):
+            QMessageBox.warning(self, "Incomplete Information", "Please choose an account and a recipient.")
+            return
+
+        account = self.email_accounts[index]
+        message = build_message(account, to_addrs, self.subject_input.text(), self.body_input.toPlainText())
+        self.send_button.setEnabled(False)
+        if use_async_backend():
+            get_async_backend().submit(send_email_async(account, message, to_addrs),
+                                       lambda future: self.send_finished.emit(future.exception()))
+        else:
+            worker = Worker(send_email, account, message, to_addrs)
+            worker.signals.error.connect(lambda error: self.send_finished.emit(error[1]))
+            worker.signals.result.connect(lambda _: self.send_finished.emit(None))
+            QThreadPool.globalInstance().start(worker)
+
+    @Slot(object)
+    def on_send_finished(self, error):
+        self.send_button.setEnabled(True)
+        if error is not None:
+            QMessageBox.critical(self, "Error", f"An error occurred while sending the email: {error}")
+            return
+        QMessageBox.information(self, "Email Sent", "Your email has been sent.")
+        self.close()
@@ -3,16 +3,45 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QListWidget
 from PySide6.QtCharts import QChart, QChartView, QPieSeries
 from PySide6.QtGui import QPainter
-from collections import Counter
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from io import BytesIO
-from PySide6.QtGui import QPixmap
+from PySide6.QtCore import QThreadPool, QTimer
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from PySide6.QtGui import QPixmap, QImage
+from src.utils.dashboard_stats import DashboardStats
+from src.views.worker import Worker
+
+WORD_CLOUD_TERMS = 200
+WORD_CLOUD_CACHE_SIZE = 8
+
+
+def render_word_cloud(frequencies):
+    # Runs on a worker: the RGB array goes straight into a QImage, no PNG round trip.
+    # wordcloud pulls in NumPy and PIL, so it is imported here rather than at startup.
+    from wordcloud import WordCloud
+    array = WordCloud(width=400, height=200, background_color='white').generate_from_frequencies(
+        frequencies).to_array()
+    height, width, _ = array.shape
+    return QImage(array.data, width, height, 3 * width, QImage.Format_RGB888).copy()
 
 class DashboardTab(QWidget):
-    def __init__(self, email_accounts):
+    def __init__(self, email_accounts, load_mailbox_stats=None):
         super().__init__()
         self.email_accounts = email_accounts
+        # Returns the whole-mailbox statistics (precomputed by the daemon when it runs); called on a worker
+        self.load_mailbox_stats = load_mailbox_stats
+        self.stats = DashboardStats()
+        self.sorted_senders = []  # mirrors senders_list rows
+        self.word_cloud_version = None
+        self.word_cloud_key = None
+        self.word_cloud_cache = OrderedDict()  # frequencies key -> QImage
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(1)
+        # Bursts of updates (e.g. a multi-account fetch) collapse into one render
+        self.word_cloud_timer = QTimer(self)
+        self.word_cloud_timer.setSingleShot(True)
+        self.word_cloud_timer.setInterval(300)
+        self.word_cloud_timer.timeout.connect(self.render_word_cloud)
         self.setup_ui()
 
     def setup_ui(self):
@@ -21,6 +50,8 @@ class DashboardTab(QWidget):
         # Email account statistics
         account_stats_layout = QHBoxLayout()
         account_stats_layout.addWidget(QLabel(f"Email Accounts Monitored: {len(self.email_accounts)}"))
+        self.mailbox_label = QLabel()
+        account_stats_layout.addWidget(self.mailbox_label)
         layout.addLayout(account_stats_layout)
 
         # Email flag statistics
@@ -40,8 +71,16 @@ class DashboardTab(QWidget):
         self.senders_list = QListWidget()
         layout.addWidget(self.senders_list)
 
-        # Pie chart for email flags
-        self.chart_view = QChartView()
+        # Pie chart for email flags; the series is built once and its slices updated in place
+        self.flag_series = QPieSeries()
+        self.flag_slices = {}
+        for flag, label in (("urgent", "Urgent"), ("important", "Important"),
+                            ("on_track", "On Track"), ("unmarked", "Unmarked")):
+            self.flag_slices[flag] = self.flag_series.append(label, 0)
+        chart = QChart()
+        chart.addSeries(self.flag_series)
+        chart.setTitle("Email Flags Distribution")
+        self.chart_view = QChartView(chart)
         self.chart_view.setRenderHint(QPainter.Antialiasing)
         layout.addWidget(self.chart_view)
 
@@ -51,52 +90,90 @@ class DashboardTab(QWidget):
 
         self.setLayout(layout)
 
-    def update_dashboard(self, emails):
-        # Update flag statistics
-        flag_counts = Counter(email.get('flag', 'unmarked') for email in emails)
-        self.urgent_label.setText(f"Urgent: {flag_counts['red']}")
-        self.important_label.setText(f"Important: {flag_counts['orange']}")
-        self.on_track_label.setText(f"On Track: {flag_counts['green']}")
-        self.unmarked_label.setText(f"Unmarked: {flag_counts['grey']}")
+    def update_dashboard(self, changes):
+        # (added, removed, reflagged) from the email tab's ListChanges; the list itself isn't re-read
+        self.stats.apply(*changes)
+        self.refresh()
 
-        # Update unique senders list
-        unique_senders = set(email['sender'] for email in emails)
-        self.senders_list.clear()
-        self.senders_list.addItems(sorted(unique_senders))
+    def on_email_marked(self, emails):
+        for email in emails:
+            self.stats.set_flag(email)
+        self.refresh()
 
-        # Update pie chart
-        series = QPieSeries()
-        series.append("Urgent", flag_counts['red'])
-        series.append("Important", flag_counts['orange'])
-        series.append("On Track", flag_counts['green'])
-        series.append("Unmarked", flag_counts['grey'])
+    def refresh(self):
+        stats = self.stats
+        if stats.flags_changed:
+            counts = stats.flag_counts
+            self.urgent_label.setText(f"Urgent: {counts['urgent']}")
+            self.important_label.setText(f"Important: {counts['important']}")
+            self.on_track_label.setText(f"On Track: {counts['on_track']}")
+            self.unmarked_label.setText(f"Unmarked: {counts['unmarked']}")
+            for flag, pie_slice in self.flag_slices.items():
+                pie_slice.setValue(counts[flag])
 
-        chart = QChart()
-        chart.addSeries(series)
-        chart.setTitle("Email Flags Distribution")
-        self.chart_view.setChart(chart)
-
-        # Update word cloud
-        subject_text = ' '.join(email['subject'] for email in emails)
-        wordcloud = WordCloud(width=400, height=200, background_color='white').generate(subject_text)
-        
-        plt.figure(figsize=(5, 2.5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image = QPixmap()
-        image.loadFromData(buffer.getvalue())
-        self.word_cloud_label.setPixmap(image)
-        plt.close()
+        # Senders list kept sorted by inserting/removing single rows
+        for sender in stats.senders_removed:
+            row = bisect_left(self.sorted_senders, sender)
+            if row < len(self.sorted_senders) and self.sorted_senders[row] == sender:
+                del self.sorted_senders[row]
+                self.senders_list.takeItem(row)
+        for sender in sorted(stats.senders_added):
+            row = bisect_left(self.sorted_senders, sender)
+            self.sorted_senders.insert(row, sender)
+            self.senders_list.insertItem(row, sender)
+
+        if stats.terms_changed and stats.terms_version != self.word_cloud_version:
+            self.word_cloud_version = stats.terms_version
+            self.update_word_cloud()
+        stats.reset_changes()
+
+    def refresh_mailbox_stats(self):
+        if self.load_mailbox_stats is not None:
+            worker = Worker(self.load_mailbox_stats)
+            worker.signals.result.connect(self.show_mailbox_stats)
+            self.threadpool.start(worker)
+
+    def show_mailbox_stats(self, data):
+        if not data:
+            self.mailbox_label.clear()
+            return
+        updated = datetime.fromtimestamp(data["updated"]).strftime("%Y-%m-%d %H:%M")
+        self.mailbox_label.setText(f"All stored mail: {data['messages']} messages from "
+                                   f"{data['unique_senders']} senders (as of {updated})")
+
+    def update_word_cloud(self):
+        self.word_cloud_timer.start()
+
+    def render_word_cloud(self):
+        frequencies = dict(self.stats.term_counts.most_common(WORD_CLOUD_TERMS))
+        if not frequencies:
+            self.word_cloud_key = None
+            self.word_cloud_label.clear()
+            return
+        key = frozenset(frequencies.items())
+        self.word_cloud_key = key
+        image = self.word_cloud_cache.get(key)
+        if image is not None:
+            self.word_cloud_cache.move_to_end(key)
+            self.word_cloud_label.setPixmap(QPixmap.fromImage(image))
+            return
+        worker = Worker(render_word_cloud, frequencies)
+        worker.signals.result.connect(lambda image, key=key: self.word_cloud_ready(key, image))
+        self.threadpool.start(worker)
+
+    def word_cloud_ready(self, key, image):
+        self.word_cloud_cache[key] = image
+        while len(self.word_cloud_cache) > WORD_CLOUD_CACHE_SIZE:
+            self.word_cloud_cache.popitem(last=False)
+        # A newer render may have been requested while this one ran
+        if key == self.word_cloud_key:
+            self.word_cloud_label.setPixmap(QPixmap.fromImage(image))
 
     def reset(self):
+        self.stats.clear()
+        self.sorted_senders = []
         self.senders_list.clear()
-        self.urgent_label.setText("Urgent: 0")
-        self.important_label.setText("Important: 0")
-        self.on_track_label.setText("On Track: 0")
-        self.unmarked_label.setText("Unmarked: 0")
-        self.chart_view.chart().removeAllSeries()
-        self.word_cloud_label.clear()
\ No newline at end of file
+        self.refresh()
+        self.word_cloud_timer.stop()
+        self.word_cloud_key = None
+        self.word_cloud_label.clear()
@@ -0,0 +1,171 @@
+# src/views/email_list_model.py
+from datetime import datetime
+
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, Signal
+from PySide6.QtGui import QColor
+
+from src.utils.message_list import MessageList
+
+COLUMNS = ("Date", "Sender", "Subject", "Flag")
+
+FLAG_COLORS = {
+    "urgent": QColor(255, 0, 0, 100),  # Red
+    "important": QColor(255, 165, 0, 100),  # Orange
+    "on_track": QColor(0, 255, 0, 100),  # Green
+}
+
+FLAG_LABELS = {
+    "urgent": "Urgent",
+    "important": "Important",
+    "on_track": "On Track",
+    "unmarked": "",
+}
+
+
+class EmailListModel(QAbstractItemModel):
+    # List over a MessageList: message ids already sorted (and grouped when
+    # threaded) by the store on a worker, with EmailMessage objects read only
+    # for the rows exposed so far. Rows are exposed to the view fetch_size at a
+    # time through canFetchMore/fetchMore, each page read from the store by id;
+    # cells are formatted only when the view asks for them, and a flag change
+    # repaints just its row. Sorting doesn't reorder anything here:
+    # sort_requested asks the owner to load the list again in the new order.
+    #
+    # When threaded, top-level rows are conversations showing their first
+    # message in sort order, and the rest of the conversation are its
+    # children. A child's internal id is its top-level row + 1; top-level rows use 0.
+    sort_requested = Signal()
+
+    def __init__(self, store, fetch_size=500, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.listing = MessageList()
+        self.loaded = 0
+        self.fetch_size = fetch_size
+        self.sort_column = 0
+        self.sort_order = Qt.DescendingOrder
+
+    @property
+    def threaded(self):
+        return self.listing.threaded
+
+    @property
+    def emails(self):
+        # The messages read so far, by id
+        return self.listing.emails
+
+    def set_listing(self, listing):
+        self.beginResetModel()
+        self.listing = listing
+        self.loaded = min(self.fetch_size, len(listing))
+        self._read_rows(0, self.loaded)
+        self.endResetModel()
+
+    def _read_rows(self, first, last):
+        missing = [message_id for message_id in self.listing.row_ids(first, last) if message_id not in self.emails]
+        if missing:
+            self.emails.update(self.store.load_by_id(missing))
+
+    def email_at(self, index):
+        if not index.isValid():
+            return None
+        group = index.internalId()
+        if group:
+            start, stop = self.listing.span(group - 1)
+            position = start + index.row() + 1
+            return self.emails.get(self.listing.ids[position]) if position < stop else None
+        if index.row() >= self.loaded:
+            return None
+        return self.emails.get(self.listing.ids[self.listing.span(index.row())[0]])
+
+    def find(self, account, folder, uid):
+        # Index of a loaded message, or an invalid index
+        key = (account, folder, uid)
+        for message_id, email in self.emails.items():
+            if key == (email.account, email.folder, email.uid):
+                break
+        else:
+            return QModelIndex()
+        found = self.listing.locate(message_id, self.loaded)
+        if found is None:
+            return QModelIndex()
+        row, position = found
+        top = self.index(row, 0)
+        return top if position == 0 else self.index(position - 1, 0, top)
+
+    def email_changed(self, index):
+        if self.email_at(index) is not None:
+            self.dataChanged.emit(index.siblingAtColumn(0), index.siblingAtColumn(len(COLUMNS) - 1))
+
+    def _children(self, row):
+        start, stop = self.listing.span(row)
+        return stop - start - 1
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not 0 <= column < len(COLUMNS):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0) if 0 <= row < self.loaded else QModelIndex()
+        if self.threaded and not parent.internalId() and 0 <= row < self._children(parent.row()):
+            return self.createIndex(row, column, parent.row() + 1)
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or not index.internalId():
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.loaded
+        if self.threaded and not parent.internalId() and parent.column() == 0:
+            return self._children(parent.row())
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.listing)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.fetch_size, len(self.listing) - self.loaded)
+        if count <= 0:
+            return
+        self._read_rows(self.loaded, self.loaded + count)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        email = self.email_at(index)
+        if email is None:
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return datetime.fromtimestamp(email.date).strftime("%Y-%m-%d %H:%M") if email.date else ""
+            if column == 1:
+                return email.sender
+            if column == 2:
+                children = self._children(index.row()) if self.threaded and not index.internalId() else 0
+                return f"{email.subject} ({children + 1})" if children else email.subject
+            return FLAG_LABELS.get(email.flag, email.flag)
+        if role == Qt.BackgroundRole:
+            return FLAG_COLORS.get(email.flag)
+        if role == Qt.ToolTipRole and column == 2:
+            return str(email)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # The store sorts (see LIST_ORDER); the owner reloads the list off the GUI thread
+        self.sort_column = column
+        self.sort_order = order
+        self.sort_requested.emit()
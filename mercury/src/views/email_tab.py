@@ -1,53 +1,96 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QListWidget, 
                                QTextEdit, QSplitter, QHBoxLayout, QAbstractItemView, 
-                               QFileDialog, QMessageBox, QMenu)
-from PySide6.QtCore import Slot, Qt, QThreadPool, Signal, QRunnable, QObject
-from PySide6.QtGui import QAction, QColor
+                               QFileDialog, QMessageBox, QMenu, QLineEdit, QProgressBar, QLabel,
+                               QTreeView, QCheckBox, QTreeWidget, QTreeWidgetItem)
+from PySide6.QtCore import Slot, Qt, QThreadPool, Signal, QTimer
+from PySide6.QtGui import QAction, QTextCursor
 from src.views.account_setup_window import AccountSetupWindow
-from src.utils.ai_summarizer import summarize_email
-from src.models.email_account import EmailAccount
-import json
-import os
-import traceback
-import sys
-
-class WorkerSignals(QObject):
-    finished = Signal()
-    error = Signal(tuple)
-    result = Signal(object)
-
-class Worker(QRunnable):
-    def __init__(self, fn, *args, **kwargs):
-        super(Worker, self).__init__()
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
-        self.signals = WorkerSignals()
-
-    @Slot()
-    def run(self):
-        try:
-            result = self.fn(*self.args, **self.kwargs)
-        except:
-            traceback.print_exc()
-            exctype, value = sys.exc_info()[:2]
-            self.signals.error.emit((exctype, value, traceback.format_exc()))
-        else:
-            self.signals.result.emit(result)
-        finally:
-            self.signals.finished.emit()
+from src.views.compose_window import ComposeWindow
+from src.views.worker import Worker
+from src.views.email_list_model import EmailListModel
+from src.utils.ai_summarizer import get_summary_cache
+from src.models.email_account import decode_folder_name
+from src.controllers.email_controller import EmailController
+from src.utils.folder_sync import is_selectable
+from src.utils.message_list import ListChanges, load_message_list
+from src.utils.email_parser import body_cache
 
 class EmailTab(QWidget):
     emails_fetched = Signal()
-    email_marked = Signal()
+    email_marked = Signal(object)  # list of re-flagged EmailMessages
+    # Emitted from scheduler threads, delivered on the GUI thread
+    fetch_progress = Signal(object, str)
+    fetch_all_finished = Signal(object)
+    folders_listed = Signal(object)
+    folder_synced = Signal(object, str, object)
+    folder_sync_finished = Signal(object)
+    summary_ready = Signal(str, str)
+    # From the IDLE watchers on the event loop thread: account, sync counts, new messages
+    mailbox_changed = Signal(object, object, object)
+    new_mail_arrived = Signal(object, object)
+    summaries_finished = Signal(object)
+    # From the controller's worker once new mail is threaded and triaged: account, threads changed, flagged
+    mail_processed = Signal(object, object, object)
+    # From list_pool: request number, MessageList, keep the selection
+    list_ready = Signal(int, object, bool)
+    # (added, removed, reflagged) for every load once follow_list_changes was called
+    list_changed = Signal(object)
 
     def __init__(self):
         super().__init__()
-        self.email_accounts = []
-        self.emails_cache = []
         self.threadpool = QThreadPool()
+        # Message lists are sorted and grouped here, one load at a time; only the newest is shown
+        self.list_pool = QThreadPool(self)
+        self.list_pool.setMaxThreadCount(1)
+        self.list_source = None
+        self.list_request = 0
+        self.list_changes = None
+        self.list_ready.connect(self.list_loaded)
+        # Syncing, threading, triage, flags, bodies and summaries live in the controller;
+        # its callbacks are signals, so results arrive on the GUI thread
+        self.controller = EmailController(
+            on_folders=self.folders_listed.emit, on_synced=self.folder_synced.emit,
+            on_sync_finished=self.folder_sync_finished.emit, on_mailbox_changed=self.mailbox_changed.emit,
+            on_processed=self.mail_processed.emit)
+        self.store = self.controller.store
+        self.email_accounts = self.controller.accounts
+        # A daemon (python -m src.daemon) may already keep the store synced, threaded and
+        # triaged; the tab then follows its commits instead of doing the same work again
+        self.controller.attached = self.controller.daemon_status() is not None
+        self.fetch_batch = None
+        self.fetch_progress.connect(self.on_fetch_progress)
+        self.fetch_all_finished.connect(self.on_fetch_all_finished)
+        self.current_folder = 'INBOX'
+        self.folders_listed.connect(self.on_folders_listed)
+        self.folder_synced.connect(self.on_folder_synced)
+        self.folder_sync_finished.connect(self.on_folder_sync_finished)
+        # Backfill chunks arrive in quick succession; the list is reloaded at most this often
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh_current_view)
+        self.summary_run = None
+        self.summary_ready.connect(self.on_summary_ready)
+        self.summaries_finished.connect(self.on_summaries_finished)
+        # Retrieval index for the chatbot; NumPy is imported and the index loaded in the background
+        self.threadpool.start(Worker(self.controller.build_mail_index))
         self.setup_ui()
         self.load_accounts()
+        self.mail_processed.connect(self.on_mail_processed)
+        self.mailbox_changed.connect(self.on_mailbox_changed)
+        # Pushes flags left queued by the last session and starts the IDLE watchers (unless attached)
+        self.controller.start()
+        # Attached: poll the store for the daemon's commits
+        self.store_timer = QTimer(self)
+        self.daemon_missed = 0
+        self.store_timer.setInterval(5000)
+        self.store_timer.timeout.connect(self.check_store)
+        if self.controller.attached:
+            print("Attached to the running Mercury daemon")
+            self.controller.store_changed()
+            for account in self.email_accounts:
+                self.controller.arrived(account)
+            self.store_timer.start()
 
 
     def setup_ui(self):
@@ -58,8 +101,14 @@ class EmailTab(QWidget):
         left_layout = QVBoxLayout()
         
         self.account_list = QListWidget()
+        self.account_list.currentRowChanged.connect(self.on_account_changed)
         left_layout.addWidget(self.account_list)
 
+        self.folder_tree = QTreeWidget()
+        self.folder_tree.setHeaderHidden(True)
+        self.folder_tree.currentItemChanged.connect(self.on_folder_changed)
+        left_layout.addWidget(self.folder_tree)
+
         add_account_button = QPushButton("Add Email Account")
         add_account_button.clicked.connect(self.open_account_setup)
         left_layout.addWidget(add_account_button)
@@ -72,6 +121,22 @@ class EmailTab(QWidget):
         fetch_emails_button.clicked.connect(self.fetch_emails)
         left_layout.addWidget(fetch_emails_button)
 
+        fetch_all_button = QPushButton("Fetch All Accounts")
+        fetch_all_button.clicked.connect(self.fetch_all_emails)
+        left_layout.addWidget(fetch_all_button)
+
+        cancel_fetch_button = QPushButton("Cancel Fetch")
+        cancel_fetch_button.clicked.connect(self.cancel_fetch)
+        left_layout.addWidget(cancel_fetch_button)
+
+        compose_button = QPushButton("Compose Email")
+        compose_button.clicked.connect(self.open_compose)
+        left_layout.addWidget(compose_button)
+
+        self.fetch_progress_bar = QProgressBar()
+        self.fetch_progress_bar.setVisible(False)
+        left_layout.addWidget(self.fetch_progress_bar)
+
         left_widget.setLayout(left_layout)
 
         # Right side: email list, summary, and full content
@@ -81,8 +146,31 @@ class EmailTab(QWidget):
         email_splitter = QSplitter(Qt.Vertical)
         content_splitter = QSplitter(Qt.Horizontal)
 
-        self.email_list = QListWidget()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search cached mail (e.g. budget sender:alice)")
+        self.search_input.returnPressed.connect(self.search_emails)
+        self.search_input.textChanged.connect(self.search_text_changed)
+        right_layout.addWidget(self.search_input)
+
+        self.threaded_check = QCheckBox("Group by conversation")
+        self.threaded_check.toggled.connect(self.set_threaded)
+        right_layout.addWidget(self.threaded_check)
+
+        # Model/view list: rows are formatted on demand and added in pages as the user scrolls;
+        # grouped by conversation, each thread is one row that expands to the rest of it
+        self.email_model = EmailListModel(self.store, parent=self)
+        self.email_model.sort_requested.connect(self.reload_list)
+        self.email_list = QTreeView()
+        self.email_list.setModel(self.email_model)
+        self.email_list.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.email_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.email_list.setRootIsDecorated(False)
+        self.email_list.setUniformRowHeights(True)
+        self.email_list.setAllColumnsShowFocus(True)
+        self.email_list.setWordWrap(False)
+        self.email_list.header().setStretchLastSection(True)
+        self.email_list.header().setSortIndicator(0, Qt.DescendingOrder)
+        self.email_list.setSortingEnabled(True)
         email_splitter.addWidget(self.email_list)
 
         self.summary_text = QTextEdit()
@@ -96,7 +184,7 @@ class EmailTab(QWidget):
         email_splitter.addWidget(content_splitter)
         right_layout.addWidget(email_splitter)
 
-        self.email_list.itemClicked.connect(self.display_email)
+        self.email_list.selectionModel().currentRowChanged.connect(self.display_email)
         self.email_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.email_list.customContextMenuRequested.connect(self.show_email_context_menu)
 
@@ -104,6 +192,18 @@ class EmailTab(QWidget):
         summarize_button.clicked.connect(self.summarize_selected_emails)
         right_layout.addWidget(summarize_button)
 
+        summarize_thread_button = QPushButton("Summarize Thread")
+        summarize_thread_button.clicked.connect(self.summarize_current_thread)
+        right_layout.addWidget(summarize_thread_button)
+
+        cancel_summaries_button = QPushButton("Cancel Summaries")
+        cancel_summaries_button.clicked.connect(self.cancel_summaries)
+        right_layout.addWidget(cancel_summaries_button)
+
+        # The cache is only opened by the first summary, not while the window is built
+        self.cache_stats_label = QLabel("Summary cache: no summaries requested yet")
+        right_layout.addWidget(self.cache_stats_label)
+
         save_summary_button = QPushButton("Save Summary")
         save_summary_button.clicked.connect(self.save_summary)
         right_layout.addWidget(save_summary_button)
@@ -121,104 +221,350 @@ class EmailTab(QWidget):
         self.account_setup_window.account_created.connect(self.add_account)
         self.account_setup_window.show()
 
+    def open_compose(self):
+        self.compose_window = ComposeWindow(self.email_accounts)
+        self.compose_window.show()
+
     @Slot(object)
     def add_account(self, account):
-        self.email_accounts.append(account)
+        self.controller.add_account(account)
         self.account_list.addItem(account.email)
-        self.save_accounts()
 
     def remove_account(self):
         current_row = self.account_list.currentRow()
         if current_row >= 0:
+            # The controller first: takeItem() moves the current row, and its handler
+            # looks the new row up in email_accounts
+            self.controller.remove_account(self.email_accounts[current_row])
             self.account_list.takeItem(current_row)
-            del self.email_accounts[current_row]
-            self.save_accounts()
-
-    def save_accounts(self):
-        accounts_data = [account.to_dict() for account in self.email_accounts]
-        config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'email_accounts.json')
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        with open(config_path, 'w') as f:
-            json.dump(accounts_data, f)
 
     def load_accounts(self):
-        config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'email_accounts.json')
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                accounts_data = json.load(f)
-            for account_data in accounts_data:
-                account = EmailAccount.from_dict(account_data)
-                self.email_accounts.append(account)
-                self.account_list.addItem(account.email)
+        for account in self.email_accounts:
+            self.account_list.addItem(account.email)
 
     def fetch_emails(self):
-        if not self.email_accounts:
+        account = self.current_account()
+        if account is not None:
+            self.controller.sync_account(account, self.current_folder)
+
+    def fetch_all_emails(self):
+        if self.fetch_batch is not None and self.fetch_batch.done < self.fetch_batch.total:
+            return
+        # The visible account goes first
+        self.fetch_batch = self.controller.sync_inboxes(
+            self.current_account(), self.fetch_progress.emit, self.fetch_all_finished.emit)
+        self.fetch_progress_bar.setRange(0, self.fetch_batch.total)
+        self.fetch_progress_bar.setValue(self.fetch_batch.done)
+        self.fetch_progress_bar.setVisible(self.fetch_batch.done < self.fetch_batch.total)
+
+    def cancel_fetch(self):
+        self.controller.cancel_sync(self.fetch_batch)
+
+    def show_unified_inbox(self):
+        self.load_list(dict(accounts=tuple(account.email for account in self.email_accounts), folder='INBOX'))
+
+    @Slot(object, str)
+    def on_fetch_progress(self, batch, key):
+        if batch is not self.fetch_batch:
             return
+        self.fetch_progress_bar.setValue(batch.done)
+        if key in batch.results:
+            self.show_unified_inbox()
 
-        selected_account = self.email_accounts[self.account_list.currentRow()]
-        
-        # Use a worker thread for email fetching
-        worker = Worker(selected_account.fetch_emails)
-        worker.signals.result.connect(self.update_email_list)
-        worker.signals.finished.connect(self.fetch_finished)
-        self.threadpool.start(worker)
-        self.emails_fetched.emit()
+    @Slot(object)
+    def on_fetch_all_finished(self, batch):
+        for key, error in batch.errors.items():
+            print(f"Error syncing {key}: {error}")
+        self.fetch_progress_bar.setVisible(False)
+        print("Fetching all accounts cancelled" if batch.cancelled else "Fetching all accounts completed")
+        if batch.results:
+            self.controller.flag_sync.wake()
+
+    def current_account(self):
+        row = self.account_list.currentRow()
+        return self.email_accounts[row] if 0 <= row < len(self.email_accounts) else None
+
+    @Slot(int)
+    def on_account_changed(self, row):
+        self.populate_folders()
+        self.show_cached_emails(row)
+        if 0 <= row < len(self.email_accounts):
+            self.controller.process(self.email_accounts[row])
+
+    def populate_folders(self):
+        # Tree from the folder list stored by the last LIST; path segments that
+        # aren't folders themselves (or are \Noselect) can't be selected
+        account = self.current_account()
+        folders = self.store.load_folders(account.email) if account else []
+        if not any(name.upper() == 'INBOX' for name, _, _ in folders):
+            folders.insert(0, ('INBOX', '/', ()))
+        if self.current_folder not in {name for name, _, _ in folders}:
+            self.current_folder = 'INBOX'
+        self.folder_tree.blockSignals(True)
+        self.folder_tree.clear()
+        items = {}
+        for name, delimiter, flags in sorted(folders, key=lambda f: (f[0].upper() != 'INBOX', f[0].lower())):
+            parts = name.split(delimiter) if delimiter else [name]
+            parent = None
+            for depth in range(1, len(parts) + 1):
+                path = delimiter.join(parts[:depth]) if delimiter else name
+                if path not in items:
+                    item = QTreeWidgetItem([decode_folder_name(parts[depth - 1])])
+                    item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
+                    if parent is None:
+                        self.folder_tree.addTopLevelItem(item)
+                    else:
+                        parent.addChild(item)
+                    items[path] = item
+                parent = items[path]
+            if is_selectable(flags):
+                parent.setData(0, Qt.UserRole, name)
+                parent.setFlags(parent.flags() | Qt.ItemIsSelectable)
+        self.folder_tree.expandAll()
+        if self.current_folder in items:
+            self.folder_tree.setCurrentItem(items[self.current_folder])
+        self.folder_tree.blockSignals(False)
+
+    def on_folder_changed(self, current, previous=None):
+        folder = current.data(0, Qt.UserRole) if current is not None else None
+        if not folder or folder == self.current_folder:
+            return
+        self.current_folder = folder
+        account = self.current_account()
+        if account is not None:
+            self.controller.view(account, folder)
+        self.show_cached_emails(self.account_list.currentRow())
 
-    @Slot(list)
-    def update_email_list(self, emails):
-        self.emails_cache = emails
-        self.email_list.clear()
-        for email in emails:
-            self.email_list.addItem(f"{email['subject']} - From: {email['sender']}")
-        self.emails_fetched.emit()  # Emit signal after updating the list
+    @Slot(object)
+    def on_folders_listed(self, account):
+        if account is self.current_account():
+            self.populate_folders()
+
+    @Slot(object, str, object)
+    def on_folder_synced(self, account, folder, result):
+        # New mail is threaded and triaged by the controller; on_mail_processed follows
+        if account is self.current_account() and folder == self.current_folder and any(result.values()):
+            self.refresh_timer.start()
+
+    @Slot(object)
+    def on_folder_sync_finished(self, account):
+        print(f"Synced all folders of {account.email}")
+
+    def refresh_current_view(self):
+        # Reload from the store, keeping the message being read selected
+        row = self.account_list.currentRow()
+        if not 0 <= row < len(self.email_accounts) or self.search_input.text():
+            return
+        self.show_cached_emails(row, keep_selection=True)
+
+    def select_email(self, email):
+        if email is None:
+            return
+        index = self.email_model.find(email.account, email.folder, email.uid)
+        if index.isValid():
+            if index.parent().isValid():
+                self.email_list.expand(index.parent())
+            self.email_list.setCurrentIndex(index)
+
+    @Slot(object, object, object)
+    def on_mail_processed(self, account, changed, flagged):
+        if changed and self.email_model.threaded and account is self.current_account():
+            self.refresh_timer.start()
+        # The store already has the triage flags and the push is queued; update the listed messages
+        if not flagged:
+            return
+        # Messages not read into the list yet reach the dashboard with the next load
+        if self.list_changes is not None:
+            self.refresh_timer.start()
+        listed = {(email.account, email.folder, email.uid): email for email in self.email_model.emails.values()}
+        marked = []
+        for folder, uid, flag in flagged:
+            email = listed.get((account.email, folder, uid))
+            if email is not None:
+                email.flag = flag
+                marked.append(email)
+        if marked:
+            self.email_list.viewport().update()
+            self.email_marked.emit(marked)
+
+    @Slot(bool)
+    def set_threaded(self, threaded):
+        self.reload_list()
+
+    @Slot(object, object, object)
+    def on_mailbox_changed(self, account, result, new):
+        print(f"Mailbox changed for {account.email}: {result}")
+        # The watchers follow INBOX
+        if account is self.current_account() and self.current_folder == 'INBOX':
+            self.refresh_current_view()
+        if new:
+            self.new_mail_arrived.emit(account, new)
+
+    def check_store(self):
+        # Attached to a daemon: reload when it has committed, and announce new INBOX mail
+        if self.controller.daemon_status() is None:
+            # One failed read can be a daemon restarting or a slow disk; two in a row means it's gone
+            self.daemon_missed += 1
+            if self.daemon_missed < 2:
+                return
+            print("Mercury daemon stopped; syncing from this window")
+            self.store_timer.stop()
+            self.controller.attached = False
+            self.controller.start()
+            for account in self.email_accounts:
+                self.controller.process(account)
+            return
+        self.daemon_missed = 0
+        if not self.controller.store_changed():
+            return
+        self.refresh_current_view()
+        for account in self.email_accounts:
+            new = self.controller.arrived(account)
+            if new:
+                self.new_mail_arrived.emit(account, new)
+
+    @Slot(int)
+    def show_cached_emails(self, row, keep_selection=False):
+        if 0 <= row < len(self.email_accounts):
+            self.controller.scheduler.promote(self.email_accounts[row].email)
+            self.load_list(dict(accounts=(self.email_accounts[row].email,), folder=self.current_folder),
+                           keep_selection)
 
     @Slot()
-    def fetch_finished(self):
-        print("Email fetching completed")
+    def search_emails(self):
+        text = self.search_input.text().strip()
+        if not text:
+            self.show_cached_emails(self.account_list.currentRow())
+            return
+        row = self.account_list.currentRow()
+        account = self.email_accounts[row].email if 0 <= row < len(self.email_accounts) else None
+        self.load_list(dict(accounts=(account,) if account else (), text=text))
+
+    @Slot(str)
+    def search_text_changed(self, text):
+        if not text:
+            self.show_cached_emails(self.account_list.currentRow())
+
+    def load_list(self, source, keep_selection=False):
+        # source: list_messages' accounts/folder/text. The store sorts in the model's
+        # order and the worker groups the ids and reads the first page
+        self.list_source = source
+        self.list_request += 1
+        model = self.email_model
+        self.list_pool.start(Worker(self.read_list, self.list_request, keep_selection, self.store, model.sort_column,
+                                    model.sort_order == Qt.DescendingOrder, self.threaded_check.isChecked(),
+                                    model.fetch_size, self.list_changes, **source))
+
+    def read_list(self, request, keep_selection, *args, **source):
+        # On list_pool; list_ready hands the listing to list_loaded on the GUI thread
+        self.list_ready.emit(request, load_message_list(*args, **source), keep_selection)
+
+    def follow_list_changes(self):
+        # From now on each load also reports what changed since the previous one, starting
+        # with the whole current list
+        if self.list_changes is None:
+            self.list_changes = ListChanges()
+            self.reload_list()
+
+    @Slot()
+    def reload_list(self):
+        # The same messages in a new order or grouping, keeping the one being read selected
+        if self.list_source is not None:
+            self.load_list(self.list_source, keep_selection=True)
+
+    @Slot(int, object, bool)
+    def list_loaded(self, request, listing, keep_selection):
+        # Changes follow one another, so even a listing too old to show has its changes passed on
+        if listing.changes is not None:
+            self.list_changed.emit(listing.changes)
+        if request != self.list_request:
+            return
+        current = self.email_model.email_at(self.email_list.currentIndex()) if keep_selection else None
+        self.email_model.set_listing(listing)
+        self.email_list.setRootIsDecorated(listing.threaded)
+        self.select_email(current)
+        self.emails_fetched.emit()
 
-    def display_email(self, item):
-        index = self.email_list.row(item)
-        if 0 <= index < len(self.emails_cache):
-            email = self.emails_cache[index]
-            content = self.get_email_content(email['raw'])
-            self.full_email_content.setPlainText(content)
+    def display_email(self, current, previous=None):
+        email = self.email_model.email_at(current)
+        if email is not None:
+            if email.has_body:
+                self.full_email_content.setPlainText(self.reading_text(email, email.body))
+                return
+            if self.controller.account_for(email) is None and email.raw is None:
+                return
+            # Fetching and MIME decoding both happen on the worker
+            self.full_email_content.setPlainText("Loading...")
+            worker = Worker(self.controller.load_body, email)
+            worker.signals.result.connect(lambda body, email=email: self.body_fetched(email, body))
+            self.threadpool.start(worker)
+
+    def reading_text(self, email, body):
+        parsed = body_cache.get((email.account, email.folder, email.uid))
+        if parsed is None or not parsed.attachments:
+            return body
+        attachments = "\n".join(f"- {attachment}" for attachment in parsed.attachments)
+        return f"{body}\n\nAttachments:\n{attachments}"
+
+    def body_fetched(self, email, body):
+        if not email.has_body:
+            self.full_email_content.setPlainText("Unable to load email content.")
+            return
+        if self.email_model.email_at(self.email_list.currentIndex()) is email:
+            self.full_email_content.setPlainText(self.reading_text(email, body))
 
     def summarize_selected_emails(self):
-        selected_items = self.email_list.selectedItems()
-        if not selected_items:
+        # In list order: a conversation's row, then its expanded children
+        indexes = sorted(self.email_list.selectionModel().selectedRows(),
+                         key=lambda index: (index.parent().row(), index.row()) if index.parent().isValid()
+                         else (index.row(), -1))
+        emails = [email for email in map(self.email_model.email_at, indexes) if email is not None]
+        if not emails:
             return
 
-        selected_account = self.email_accounts[self.account_list.currentRow()]
-        emails = selected_account.fetch_emails()
-        
-        summaries = []
-        for item in selected_items:
-            index = self.email_list.row(item)
-            email_content = self.get_email_content(emails[index]['raw'])
-            summary = summarize_email(email_content)
-            summaries.append(f"Email: {item.text()}\n{summary}\n\n")
-
-        self.summary_text.setText("\n".join(summaries))
-
-    def get_email_content(self, email_message):
-        content = ""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                if part.get_content_type() == "text/plain":
-                    try:
-                        payload = part.get_payload(decode=True)
-                        charset = part.get_content_charset() or 'utf-8'
-                        content += payload.decode(charset, errors='replace')
-                    except Exception as e:
-                        content += f"[Error decoding part: {str(e)}]"
-        else:
-            try:
-                payload = email_message.get_payload(decode=True)
-                charset = email_message.get_content_charset() or 'utf-8'
-                content = payload.decode(charset, errors='replace')
-            except Exception as e:
-                content = f"[Error decoding email: {str(e)}]"
-        return content
+        if self.summary_run is not None and self.summary_run.done < self.summary_run.total:
+            self.summary_run.cancel()
+
+        # Summaries are appended as they complete, in completion order
+        self.summary_text.clear()
+        self.summary_run = self.controller.summarize(emails, self.summary_ready.emit, self.summaries_finished.emit)
+
+    def summarize_current_thread(self):
+        email = self.email_model.email_at(self.email_list.currentIndex())
+        if email is None:
+            return
+        if self.summary_run is not None and self.summary_run.done < self.summary_run.total:
+            self.summary_run.cancel()
+        self.summary_text.clear()
+        self.summary_run = self.controller.summarize_conversation(
+            email, self.summary_ready.emit, self.summaries_finished.emit)
+
+    def cancel_summaries(self):
+        if self.summary_run is not None:
+            self.summary_run.cancel()
+
+    @Slot(str, str)
+    def on_summary_ready(self, title, summary):
+        self.summary_text.moveCursor(QTextCursor.End)
+        self.summary_text.insertPlainText(f"Email: {title}\n{summary}\n\n\n")
+        self.update_cache_stats()
+
+    @Slot(object)
+    def on_summaries_finished(self, summary_run):
+        if summary_run is self.summary_run:
+            self.update_cache_stats()
+            if summary_run.cancelled.is_set():
+                self.summary_text.append("Summarization cancelled.")
+
+    def update_cache_stats(self):
+        cache = get_summary_cache()
+        if cache is None:
+            self.cache_stats_label.setText("Summary cache: off")
+            return
+        stats = cache.stats()
+        self.cache_stats_label.setText(
+            f"Summary cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"~{stats['saved_tokens']} tokens and {stats['saved_seconds']:.1f} s saved")
 
     def show_email_context_menu(self, position):
         menu = QMenu()
@@ -237,29 +583,21 @@ class EmailTab(QWidget):
         menu.addAction(on_track_action)
         menu.addAction(unmarked_action)
 
-        menu.exec_(self.email_list.mapToGlobal(position))
+        menu.exec_(self.email_list.viewport().mapToGlobal(position))
 
     def mark_email(self, category):
-        item = self.email_list.currentItem()
-        if item:
-            if category == "urgent":
-                item.setBackground(QColor(255, 0, 0, 100))  # Red
-            elif category == "important":
-                item.setBackground(QColor(255, 165, 0, 100))  # Orange
-            elif category == "on_track":
-                item.setBackground(QColor(0, 255, 0, 100))  # Green
-            else:
-                item.setBackground(QColor(255, 255, 255, 0))  # Transparent
-            # Update the email in the cache with the new category
-            index = self.email_list.row(item)
-            if 0 <= index < len(self.emails_cache):
-                self.emails_cache[index]['flag'] = category
-
-        self.email_marked.emit()
-
-    def get_all_emails(self):
-        return self.emails_cache
-    
+        # Colors come from the model's FLAG_COLORS; only the marked rows are repainted
+        marked = []
+        for index in self.email_list.selectionModel().selectedRows():
+            email = self.email_model.email_at(index)
+            if email is not None and email.flag != category:
+                email.flag = category
+                self.email_model.email_changed(index)
+                marked.append(email)
+
+        self.controller.mark(marked, category)
+        self.email_marked.emit(marked)
+
     def save_summary(self):
         summary = self.summary_text.toPlainText()
         if not summary:
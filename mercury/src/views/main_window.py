@@ -3,20 +3,48 @@
 from PySide6.QtWidgets import (QMainWindow, QApplication, QStyle, QWidget, QVBoxLayout, QTabWidget,
                                QTextEdit, QSystemTrayIcon, QMenu)
 from PySide6.QtGui import QIcon, QPixmap
-from PySide6.QtCore import Qt, QThreadPool, Slot
+from PySide6.QtCore import Qt, Slot
 import os
-import markdown
 
 from src.views.email_tab import EmailTab
-from src.views.chatbot_tab import ChatbotTab
-from src.views.dashboard_tab import DashboardTab
+from src.utils.imap_pool import imap_pool
+from src.utils.async_backend import stop_async_backend
+from src.utils.email_parser import body_cache
+
+README_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'README.md')
+README_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'readme_cache.html')
+# Whole-mailbox statistics older than this are recomputed when the dashboard is opened
+# (the daemon keeps them fresh when it runs)
+MAILBOX_STATS_MAX_AGE = 600
+
+
+def readme_html():
+    # The rendered HTML is cached next to the config, stamped with README.md's
+    # mtime and size; markdown is only imported when the README has changed
+    stat = os.stat(README_PATH)
+    stamp = f"<!-- {stat.st_mtime_ns} {stat.st_size} -->\n"
+    try:
+        with open(README_CACHE_PATH, 'r', encoding='utf-8') as file:
+            cached = file.read()
+        if cached.startswith(stamp):
+            return cached[len(stamp):]
+    except OSError:
+        pass
+    import markdown
+    with open(README_PATH, 'r', encoding='utf-8') as file:
+        html_content = markdown.markdown(file.read())
+    try:
+        with open(README_CACHE_PATH, 'w', encoding='utf-8') as file:
+            file.write(stamp + html_content)
+    except OSError as e:
+        print(f"Error caching README: {e}")
+    return html_content
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Communications Toolbox")
-        self.threadpool = QThreadPool()
-        self.email_accounts = []  # Add this line to keep track of email accounts
         self.setup_ui()
         self.setup_system_tray()
 
@@ -37,29 +65,24 @@ class MainWindow(QMainWindow):
         self.email_tab = EmailTab()
         self.tab_widget.addTab(self.email_tab, "E-Mail")
         
-        # Chatbot tab
-        self.chatbot_tab = ChatbotTab()
-        self.tab_widget.addTab(self.chatbot_tab, "Chatbot")
-        
-        # Dashboard tab
-        self.dashboard_tab = DashboardTab(self.email_accounts)
-        self.tab_widget.addTab(self.dashboard_tab, "Dashboard")
+        # Chatbot and Dashboard tabs start as placeholders and are built when first selected
+        self.chatbot_tab = None
+        self.tab_widget.addTab(QWidget(), "Chatbot")
+        self.dashboard_tab = None
+        self.tab_widget.addTab(QWidget(), "Dashboard")
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         
         main_layout.addWidget(self.tab_widget)
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
-        # In MainWindow's setup_ui method
-        self.email_tab.emails_fetched.connect(self.update_dashboard)
-        self.email_tab.email_marked.connect(self.update_dashboard)
+        self.email_tab.list_changed.connect(self.update_dashboard)
+        self.email_tab.email_marked.connect(self.on_email_marked)
+        self.email_tab.new_mail_arrived.connect(self.notify_new_mail)
 
     def load_readme(self, text_edit):
-        readme_path = os.path.join(os.path.dirname(__file__), '..', '..', 'README.md')
-        if os.path.exists(readme_path):
-            with open(readme_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                html_content = markdown.markdown(content)
-                text_edit.setHtml(html_content)
+        if os.path.exists(README_PATH):
+            text_edit.setHtml(readme_html())
         else:
             text_edit.setPlainText("README.md not found.")
 
@@ -80,8 +103,24 @@ class MainWindow(QMainWindow):
         quit_action.triggered.connect(self.quit_application)
 
         self.tray_icon.setContextMenu(tray_menu)
+        self.tray_icon.messageClicked.connect(self.show_from_tray)
         self.tray_icon.show()
 
+    def show_from_tray(self):
+        self.showNormal()
+        self.activateWindow()
+        self.tab_widget.setCurrentWidget(self.email_tab)
+
+    @Slot(object, object)
+    def notify_new_mail(self, account, messages):
+        if len(messages) == 1:
+            title = f"New mail from {messages[0].sender}"
+            text = messages[0].subject or "(no subject)"
+        else:
+            title = f"{len(messages)} new messages for {account.email}"
+            text = "\n".join(message.subject or "(no subject)" for message in messages[-3:])
+        self.tray_icon.showMessage(title, text, QSystemTrayIcon.Information, 5000)
+
     def closeEvent(self, event):
         event.ignore()
         self.hide()
@@ -93,30 +132,51 @@ class MainWindow(QMainWindow):
         )
 
     def quit_application(self):
-        self.threadpool.waitForDone()
+        self.email_tab.store_timer.stop()
+        self.email_tab.controller.shutdown()
+        self.email_tab.threadpool.waitForDone()
+        if self.chatbot_tab is not None:
+            self.chatbot_tab.shutdown()
+        if self.dashboard_tab is not None:
+            self.dashboard_tab.threadpool.waitForDone()
+        imap_pool.close_all()
+        body_cache.clear()
+        stop_async_backend()
         QApplication.quit()
 
-    @Slot()
-    def update_dashboard(self):
-        emails = self.email_tab.get_all_emails()
-        self.dashboard_tab.update_dashboard(emails)
-
     @Slot(int)
     def on_tab_changed(self, index):
-        if self.tab_widget.tabText(index) == "Dashboard":
-            self.update_dashboard()
-
-    # Add these methods to handle email account management and updates
-    def add_email_account(self, account):
-        self.email_accounts.append(account)
-        self.email_tab.add_account(account)
-        self.dashboard_tab.update_account_count(len(self.email_accounts))
-
-    def fetch_emails(self):
-        emails = self.email_tab.fetch_emails()
-        self.dashboard_tab.update_dashboard(emails)
-
-    # You might want to call this method when switching to the Dashboard tab
-    def update_dashboard(self):
-        emails = self.email_tab.get_all_emails()
-        self.dashboard_tab.update_dashboard(emails)
\ No newline at end of file
+        name = self.tab_widget.tabText(index)
+        if name == "Chatbot" and self.chatbot_tab is None:
+            from src.views.chatbot_tab import ChatbotTab
+            self.chatbot_tab = ChatbotTab(lambda: self.email_tab.controller.mail_index)
+            self.replace_tab(index, self.chatbot_tab, name)
+        elif name == "Dashboard":
+            if self.dashboard_tab is None:
+                # Dashboard tab, sharing the email tab's account list
+                from src.views.dashboard_tab import DashboardTab
+                self.dashboard_tab = DashboardTab(
+                    self.email_tab.email_accounts,
+                    lambda: self.email_tab.controller.mailbox_stats(max_age=MAILBOX_STATS_MAX_AGE))
+                self.replace_tab(index, self.dashboard_tab, name)
+                self.email_tab.follow_list_changes()
+            self.dashboard_tab.refresh_mailbox_stats()
+
+    def replace_tab(self, index, widget, name):
+        placeholder = self.tab_widget.widget(index)
+        self.tab_widget.blockSignals(True)
+        self.tab_widget.removeTab(index)
+        self.tab_widget.insertTab(index, widget, name)
+        self.tab_widget.setCurrentIndex(index)
+        self.tab_widget.blockSignals(False)
+        placeholder.deleteLater()
+
+    @Slot(object)
+    def update_dashboard(self, changes):
+        if self.dashboard_tab is not None:
+            self.dashboard_tab.update_dashboard(changes)
+
+    @Slot(object)
+    def on_email_marked(self, emails):
+        if self.dashboard_tab is not None:
+            self.dashboard_tab.on_email_marked(emails)
\ No newline at end of file
@@ -0,0 +1,217 @@
+import json
+import os
+import smtplib
+import time
+
+import pytest
+
+from src.controllers.account_controller import AccountController
+from src.controllers.email_controller import EmailController, build_message, send_email
+from src.models.email_account import EmailAccount
+from src.models.email_message import EmailMessage
+from src.utils.database import MessageStore
+from src.utils.email_parser import body_cache
+from src.utils.imap_pool import imap_pool
+from src.utils.summary_pipeline import SummaryPipeline
+from tools.fake_imap import FakeImapServer, FakeMailbox, PlainAccount, make_message
+from tools.fake_smtp import FakeSmtpServer
+
+ADDRESS = "user@example.com"
+
+
+@pytest.fixture
+def accounts(tmp_path):
+    return AccountController(str(tmp_path / "accounts.json"))
+
+
+@pytest.fixture
+def imap(accounts):
+    # A fake server with count messages in INBOX, its account saved in accounts
+    servers = []
+
+    def start(count):
+        mailbox = FakeMailbox()
+        for i in range(count):
+            mailbox.append(make_message(i, body_size=200))
+        server = FakeImapServer({"INBOX": mailbox}).start()
+        servers.append(server)
+        account = PlainAccount(ADDRESS, "secret", "127.0.0.1", "", server.port)
+        accounts.accounts.append(account)
+        return account
+
+    yield start
+    imap_pool.close_all()
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def controller(accounts):
+    store = MessageStore(":memory:")
+    controller = EmailController(store, accounts)
+    yield controller
+    controller.shutdown()
+    store.close()
+
+
+@pytest.fixture
+def file_controller(tmp_path, accounts):
+    # On a file, so another connection (the daemon's) can share the store
+    store = MessageStore(str(tmp_path / "store.db"))
+    controller = EmailController(store, accounts)
+    yield controller
+    controller.shutdown()
+    store.close()
+
+
+def test_send_email_refuses_to_log_in_without_starttls():
+    server = FakeSmtpServer().start()
+    account = EmailAccount(ADDRESS, "secret", "127.0.0.1", "127.0.0.1", smtp_port=server.port)
+    try:
+        with pytest.raises(smtplib.SMTPNotSupportedError):
+            send_email(account, build_message(account, ["friend@example.com"], "Hi", "Hello"), ["friend@example.com"])
+        assert not any(command.upper().startswith("AUTH") for command in server.commands)
+        assert server.messages == []
+    finally:
+        server.stop()
+
+
+def test_load_body_fetches_once_then_reads_the_store(controller, imap):
+    account = imap(3)
+    controller.mail_sync.sync_folder(account)
+    email = controller.store.load_messages(ADDRESS, "INBOX")[0]
+    assert not email.has_body
+    body = controller.load_body(email)
+    assert body.startswith("Line 0 of a fairly ordinary email body.")
+    assert email.body == body and controller.store.get_body(ADDRESS, "INBOX", email.uid) == body
+    assert body_cache.get((ADDRESS, "INBOX", email.uid)).text == body
+    # A fresh list row is answered from the store, even with the server gone
+    imap_pool.close_all()
+    controller.accounts.remove(account)
+    again = controller.store.load_messages(ADDRESS, "INBOX")[0]
+    assert controller.load_body(again) == body
+    # Nothing stored and no account to fetch from
+    assert controller.load_body(EmailMessage("nobody@example.com", "INBOX", 1)) == ""
+
+
+def test_presummarize_stores_bodies_and_counts_failures(controller, imap):
+    account = imap(4)
+    controller.mail_sync.sync_folder(account)
+    summarized = []
+
+    def summarize(content):
+        summarized.append(content)
+        if "Line 2 " in content:
+            raise ValueError("no summary")
+        return "summary"
+
+    controller.summary_pipeline = SummaryPipeline(summarize, base_delay=0)
+    assert controller.presummarize(account, since=0, batch_size=3) == (4, 1)
+    assert len(summarized) == 4
+    assert all(controller.store.get_body(ADDRESS, "INBOX", uid) for uid in range(1, 5))
+    # Only mail newer than since is covered
+    assert controller.presummarize(account, since=1700000000 + 2 * 60) == (2, 1)
+
+
+def test_mailbox_stats_are_saved_and_recomputed_when_stale(controller):
+    store = controller.store
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 1, subject="Budget", sender="a@example.com", flag="urgent"),
+                        EmailMessage("other@example.com", "INBOX", 1, subject="Lunch", sender="b@example.com")])
+    stats = controller.mailbox_stats()
+    assert stats["messages"] == 2 and stats["flags"]["urgent"] == 1
+    assert controller.mailbox_stats(ADDRESS)["messages"] == 1
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 2, subject="Later", sender="c@example.com")])
+    # Saved totals are served until they are older than max_age
+    assert controller.mailbox_stats(max_age=3600) == stats
+    time.sleep(0.01)
+    fresh = controller.mailbox_stats(max_age=0)
+    assert fresh["messages"] == 3 and fresh["updated"] > stats["updated"]
+    assert controller.mailbox_stats("nobody@example.com") is None
+
+
+def test_arrived_reports_mail_stored_since_the_last_call(controller):
+    account = EmailAccount(ADDRESS, "secret", "", "")
+    store = controller.store
+    # The first call only sets the mark
+    assert controller.arrived(account) == []
+    store.set_folder_state(ADDRESS, "INBOX", 1, 2)
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", uid, subject=f"m{uid}") for uid in (1, 2)])
+    assert [email.uid for email in controller.arrived(account)] == [1, 2]
+    assert controller.arrived(account) == []
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 3, subject="m3")])
+    store.set_folder_state(ADDRESS, "INBOX", 1, 3)
+    assert [email.subject for email in controller.arrived(account)] == ["m3"]
+
+
+def test_store_changed_sees_only_other_connections(file_controller):
+    store = file_controller.store
+    # The first call sets the baseline
+    assert file_controller.store_changed() is False
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 1)])
+    assert file_controller.store_changed() is False
+    other = MessageStore(store.path)
+    try:
+        other.add_messages([EmailMessage(ADDRESS, "INBOX", 2)])
+        assert file_controller.store_changed() is True
+        assert file_controller.store_changed() is False
+    finally:
+        other.close()
+
+
+def test_heartbeat_is_replaced_whole_and_goes_stale(file_controller, monkeypatch):
+    path = file_controller.status_path()
+    assert file_controller.daemon_status() is None
+    file_controller.heartbeat(30)
+    status = file_controller.daemon_status()
+    assert status["pid"] == os.getpid() and status["heartbeat"] == 30
+
+    def interrupted_dump(data, f):
+        f.write('{"pid": ')
+        raise OSError("disk full")
+
+    # A write that fails halfway leaves the last heartbeat readable and no temp file behind
+    monkeypatch.setattr(json, "dump", interrupted_dump)
+    with pytest.raises(OSError):
+        file_controller.heartbeat(30)
+    monkeypatch.undo()
+    assert file_controller.daemon_status()["pid"] == os.getpid()
+    assert [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")] == []
+    # Three missed beats and the daemon counts as gone
+    stale = time.time() - 91
+    os.utime(path, (stale, stale))
+    assert file_controller.daemon_status() is None
+    file_controller.clear_heartbeat()
+    assert not os.path.exists(path)
+
+
+def test_in_memory_store_has_no_heartbeat(controller):
+    controller.heartbeat(30)
+    assert controller.status_path() is None and controller.daemon_status() is None
+
+
+def test_daemon_warm_up_processes_changed_accounts(accounts, imap):
+    pytest.importorskip("dotenv")
+    from src.daemon import MailDaemon
+
+    account = imap(3)
+    store = MessageStore(":memory:")
+    daemon = MailDaemon(store, accounts, summarize_days=0, watch=False)
+    try:
+        daemon.controller.mail_sync.sync_folder(account)
+        # Nothing changed yet: no work, no statistics
+        daemon.warm_up()
+        assert store.get_stats("mailbox") is None
+        daemon.changed.add(ADDRESS)
+        daemon.warm_up()
+        assert daemon.changed == set()
+        assert store.get_stats("mailbox")[1]["messages"] == 3
+        assert store.get_stats(f"mailbox:{ADDRESS}")[1]["messages"] == 3
+        # Threaded by the controller's processor before the statistics were counted
+        assert {row[4] for row in store.thread_rows(ADDRESS)} != {None}
+        daemon.stop()
+        store.add_messages([EmailMessage(ADDRESS, "INBOX", 10)])
+        daemon.warm_up(everything=True)
+        assert store.get_stats("mailbox")[1]["messages"] == 3
+    finally:
+        daemon.controller.shutdown()
+        store.close()
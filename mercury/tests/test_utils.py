@@ -0,0 +1,1260 @@
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+import types
+
+import pytest
+
+from src.models.email_message import EmailMessage
+from src.utils.async_imap import AsyncImapConnection
+from src.utils.async_smtp import AsyncSmtpClient, AsyncSmtpError
+from src.utils.chat_context import ChatContext, message_tokens
+from src.utils.dashboard_stats import DashboardStats, MailboxStats
+from src.utils.database import MessageStore, build_fts_query
+from src.utils.email_parser import BodyCache, decode_bytes, html_to_text, parse_message
+from src.utils.fetch_scheduler import FetchScheduler
+from src.utils.imap_pool import ImapConnectionPool, PooledConnection
+from src.utils.idle_watcher import IdleWatcher
+from src.utils.mail_sync import AsyncMailSync, MailSync
+from src.utils.message_list import ListChanges, group_rows, load_message_list
+from src.utils.raw_store import RawStore, raw_store
+from src.utils import summary_cache
+from src.utils.summary_cache import SummaryCache, cache_key
+from src.utils.summary_pipeline import FAILED_PREFIX, SummaryPipeline, is_retryable, retry_after
+from src.utils.thread_index import ThreadIndex, ThreadIndexer, base_subject, parse_references
+from src.utils.text_preprocess import chunk_text, clean_email_text, count_tokens, thread_text
+from src.utils.triage import RuleMatcher, Triage
+from src.models.email_account import parse_fetch_response
+from tools.fake_imap import FakeImapServer, FakeMailbox, PlainAccount, make_message
+from tools.fake_smtp import FakeSmtpServer
+
+ADDRESS = "user@example.com"
+
+
+def build_mailbox(count, uidvalidity=1):
+    mailbox = FakeMailbox(uidvalidity)
+    for i in range(count):
+        mailbox.append(make_message(i, body_size=200))
+    return mailbox
+
+
+@pytest.fixture
+def imap():
+    servers = []
+
+    def start(mailbox, capabilities=("IMAP4rev1",), unsolicited=False):
+        server = FakeImapServer({"INBOX": mailbox}, capabilities=capabilities, unsolicited=unsolicited).start()
+        servers.append(server)
+        return PlainAccount(ADDRESS, "secret", "127.0.0.1", "", server.port)
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def store():
+    store = MessageStore(":memory:")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def pool():
+    pool = ImapConnectionPool()
+    yield pool
+    pool.close_all()
+
+
+def test_first_sync_takes_newest_messages(imap, store, pool):
+    account = imap(build_mailbox(30))
+    result = MailSync(store, pool, initial_limit=10).sync_folder(account)
+
+    assert result == {"new": 10, "changed": 0, "removed": 0}
+    assert store.message_uids(ADDRESS, "INBOX") == set(range(21, 31))
+    state = store.get_folder_state(ADDRESS, "INBOX")
+    assert state["uidvalidity"] == 1 and state["last_uid"] == 30
+
+
+def test_sync_fetches_only_new_uids(imap, store, pool):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox)
+    sync = MailSync(store, pool)
+    sync.sync_folder(account)
+
+    assert sync.sync_folder(account) == {"new": 0, "changed": 0, "removed": 0}
+    mailbox.append(make_message(5, body_size=200))
+    mailbox.append(make_message(6, body_size=200))
+    assert sync.sync_folder(account)["new"] == 2
+    assert store.message_uids(ADDRESS, "INBOX") == set(range(1, 8))
+    assert store.get_folder_state(ADDRESS, "INBOX")["last_uid"] == 7
+
+
+def test_uidvalidity_change_purges_folder(imap, store, pool):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox)
+    sync = MailSync(store, pool)
+    sync.sync_folder(account)
+
+    # The server renumbered the folder: same count, different UIDs
+    mailbox.uidvalidity = 2
+    mailbox.messages = [[uid + 100, raw, flags, modseq] for uid, raw, flags, modseq in mailbox.messages]
+    mailbox.next_uid = 106
+    assert sync.sync_folder(account)["new"] == 5
+    assert store.message_uids(ADDRESS, "INBOX") == set(range(101, 106))
+    assert store.get_folder_state(ADDRESS, "INBOX")["uidvalidity"] == 2
+
+
+def test_condstore_pulls_changed_flags(imap, store, pool):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox, capabilities=("IMAP4rev1", "CONDSTORE"))
+    sync = MailSync(store, pool)
+    sync.sync_folder(account)
+    assert store.get_folder_state(ADDRESS, "INBOX")["highest_modseq"] == mailbox.modseq
+
+    mailbox.set_flags(3, {"\\Seen", "$MercuryUrgent"})
+    assert sync.sync_folder(account)["changed"] == 1
+    flags = store.message_flags(ADDRESS, "INBOX")
+    assert set(flags[3].split()) == {"\\Seen", "$MercuryUrgent"}
+    assert flags[2] == ""
+    assert store.load_messages(ADDRESS, "INBOX")[2].flag == "urgent"
+
+
+def test_flag_scan_without_condstore(imap, store, pool):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox)
+    sync = MailSync(store, pool)
+    sync.sync_folder(account)
+
+    mailbox.set_flags(1, {"\\Flagged"})
+    assert sync.sync_folder(account)["changed"] == 1
+    assert store.message_flags(ADDRESS, "INBOX")[1] == "\\Flagged"
+    assert sync.sync_folder(account)["changed"] == 0
+
+
+def test_expunged_messages_are_pruned(imap, store, pool):
+    mailbox = build_mailbox(6)
+    account = imap(mailbox)
+    sync = MailSync(store, pool)
+    sync.sync_folder(account)
+
+    mailbox.expunge(2)
+    mailbox.expunge(5)
+    mailbox.append(make_message(6, body_size=200))
+    result = sync.sync_folder(account)
+    assert result["removed"] == 2 and result["new"] == 1
+    assert store.message_uids(ADDRESS, "INBOX") == {1, 3, 4, 6, 7}
+
+
+
+def test_backfill_walks_down_by_uid_despite_expunges(imap, store, pool):
+    mailbox = build_mailbox(30)
+    account = imap(mailbox)
+    sync = MailSync(store, pool, initial_limit=10)
+    sync.sync_folder(account)
+
+    assert sync.backfill_folder(account, chunk=8) == {"new": 8, "complete": False}
+    assert store.message_uids(ADDRESS, "INBOX") == set(range(13, 31))
+    # One stored and one not yet fetched message disappear before the next chunk
+    mailbox.expunge(20)
+    mailbox.expunge(5)
+    assert sync.backfill_folder(account, chunk=8) == {"new": 8, "complete": False}
+    assert sync.backfill_folder(account, chunk=8) == {"new": 3, "complete": True}
+    assert sync.backfill_folder(account, chunk=8) == {"new": 0, "complete": True}
+    sync.sync_folder(account)
+    assert store.message_uids(ADDRESS, "INBOX") == {m[0] for m in mailbox.messages}
+
+
+def test_sync_selects_once_per_checkout(imap, store, pool, monkeypatch):
+    selects = []
+    original = PooledConnection.select
+    monkeypatch.setattr(PooledConnection, "select",
+                        lambda conn, folder: selects.append(folder) or original(conn, folder))
+    mailbox = build_mailbox(5)
+    account = imap(mailbox)
+    sync = MailSync(store, pool)
+
+    sync.sync_folder(account)
+    assert selects == ["INBOX"]
+    # Reused on the same folder: re-selected so a new UIDNEXT is seen
+    mailbox.append(make_message(5, body_size=200))
+    assert sync.sync_folder(account)["new"] == 1
+    assert selects == ["INBOX", "INBOX"]
+
+
+def fetched_uids(data):
+    return [int(meta.split(b"UID ")[1].split()[0].rstrip(b")")) for meta, _ in parse_fetch_response(data)]
+
+
+def test_async_client_pipelines_fetches(imap):
+    account = imap(build_mailbox(10))
+
+    async def run():
+        client = await account.open_async_connection()
+        try:
+            await client.select("INBOX")
+            return await asyncio.gather(client.fetch("1:4", "(UID FLAGS)"), client.fetch("5:10", "(UID FLAGS)"))
+        finally:
+            await client.logout()
+
+    first, second = asyncio.run(run())
+    assert fetched_uids(first[1]) == [1, 2, 3, 4]
+    assert fetched_uids(second[1]) == [5, 6, 7, 8, 9, 10]
+
+
+def test_async_client_attributes_unsolicited_exists_to_oldest_command(imap):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox, unsolicited=True)
+
+    async def run():
+        client = await account.open_async_connection()
+        try:
+            await client.select("INBOX")
+            mailbox.append(make_message(5, body_size=200))
+            return await asyncio.gather(client.command("FETCH", "1:3", "(UID FLAGS)"),
+                                        client.command("FETCH", "4:5", "(UID FLAGS)"))
+        finally:
+            await client.logout()
+
+    (_, first), (_, second) = asyncio.run(run())
+    assert first["EXISTS"] == [b"6"]
+    assert fetched_uids(first["FETCH"]) == [1, 2, 3]
+    assert "EXISTS" not in second
+    assert fetched_uids(second["FETCH"]) == [4, 5]
+
+
+def test_async_client_keeps_unsolicited_changes_out_of_uid_fetch(imap):
+    mailbox = build_mailbox(5)
+    account = imap(mailbox, unsolicited=True)
+
+    async def run():
+        client = await account.open_async_connection()
+        try:
+            await client.select("INBOX")
+            mailbox.expunge(2)
+            mailbox.set_flags(3, {"\\Seen"})
+            return await client.command("UID", "FETCH", "4:*", "(UID FLAGS)")
+        finally:
+            await client.logout()
+
+    _, untagged = asyncio.run(run())
+    assert untagged["EXPUNGE"] == [b"2"]
+    # The flag update rides along with the FETCH data, carrying its UID
+    assert fetched_uids(untagged["FETCH"]) == [4, 5, 3]
+
+
+def test_async_sync_ignores_unsolicited_fetches(imap, store):
+    mailbox = build_mailbox(8)
+    account = imap(mailbox, unsolicited=True)
+    sync = AsyncMailSync(store)
+
+    async def run():
+        conn = AsyncImapConnection(await account.open_async_connection())
+        try:
+            await conn.select("INBOX")
+            # Reported at the end of the first sync's FETCH, without a header literal
+            mailbox.set_flags(2, {"\\Flagged"})
+            first = await sync.sync_connection(conn, ADDRESS, "INBOX")
+            mailbox.expunge(4)
+            mailbox.append(make_message(8, body_size=200))
+            await conn.select("INBOX")
+            mailbox.set_flags(3, {"\\Seen"})
+            second = await sync.sync_connection(conn, ADDRESS, "INBOX")
+            return first, second
+        finally:
+            await conn.imap.logout()
+
+    first, second = asyncio.run(run())
+    assert first["new"] == 8
+    assert second["new"] == 1 and second["removed"] == 1
+    messages = {message.uid: message for message in store.load_messages(ADDRESS, "INBOX")}
+    assert sorted(messages) == [1, 2, 3, 5, 6, 7, 8, 9]
+    assert all(message.subject for message in messages.values())
+    assert messages[2].flags == ("\\Flagged",)
+    assert messages[3].flags == ("\\Seen",)
+
+
+def test_idle_watcher_builds_no_pool(store):
+    # The watcher syncs on its own connection
+    watcher = IdleWatcher(store, lambda account, result, new: None)
+    assert watcher.sync.pool is None
+
+
+REPLY = """Thanks, Friday works for me.
+
+Let's meet at 10.
+"""
+
+
+@pytest.mark.parametrize("quoted", [
+    "> Can we meet on Friday?\n> Anna\n",
+    "On Mon, 4 Mar 2024 at 09:12, Anna <anna@example.com> wrote:\nCan we meet on Friday?\n",
+    "-----Original Message-----\nFrom: Anna\nCan we meet on Friday?\n",
+    "From: Anna <anna@example.com>\nSent: Monday, March 4, 2024 09:12\nCan we meet on Friday?\n",
+    "________________________________\nFrom: Anna\nCan we meet on Friday?\n",
+])
+def test_clean_text_drops_quoted_replies(quoted):
+    assert clean_email_text(REPLY + "\n" + quoted) == "Thanks, Friday works for me.\n\nLet's meet at 10."
+
+
+@pytest.mark.parametrize("signature", [
+    "-- \nBob Smith\nHead of Operations\n",
+    "--\nBob\n",
+    "Sent from my iPhone\n",
+    "Get Outlook for Android\n",
+])
+def test_clean_text_drops_signatures(signature):
+    assert clean_email_text(REPLY + "\n" + signature) == "Thanks, Friday works for me.\n\nLet's meet at 10."
+
+
+def test_clean_text_drops_footers_and_links():
+    text = ("Your invoice is attached.\n\n\n\nDetails: https://example.com/track?id=123&u=456\n"
+            "To unsubscribe click here\n"
+            "This email and any attachments are confidential and intended for the addressee only.\n"
+            "View this in your browser\n")
+    assert clean_email_text(text) == "Your invoice is attached.\n\nDetails: [link]"
+
+
+def test_clean_text_keeps_a_message_that_starts_with_a_marker():
+    # Nothing above the marker would be left, so the text is kept rather than emptied
+    assert clean_email_text("Sent from my iPhone") == "Sent from my iPhone"
+    assert clean_email_text("On Monday Anna wrote:\nhello") == "On Monday Anna wrote:\nhello"
+
+
+def test_cache_key_survives_quotes_and_whitespace():
+    key = cache_key(clean_email_text(REPLY), "model", "prompt", {})
+    reply = REPLY.replace("\n\n", "\n   \n\n") + "\n> Can we meet on Friday?\n-- \nBob\n"
+    assert cache_key(clean_email_text(reply), "model", "prompt", {}) == key
+    assert cache_key(clean_email_text(REPLY + "\nAlso, bring the slides."), "model", "prompt", {}) != key
+
+
+def test_thread_text_sends_repeated_paragraphs_once():
+    text = thread_text([
+        ("Anna", "Mon", "Can we meet on Friday?\n\nAgenda attached."),
+        ("Bob", "Tue", "Friday works.\n\ncan we meet on   friday?"),
+        ("Anna", "Wed", "Agenda attached."),
+    ])
+    assert text == "[Anna, Mon]\nCan we meet on Friday?\n\nAgenda attached.\n\n[Bob, Tue]\nFriday works."
+
+
+def test_chunk_text_packs_whole_paragraphs():
+    paragraphs = [f"Paragraph {i} " + "word " * (10 + i % 7) for i in range(40)]
+    paragraphs = [paragraph.strip() for paragraph in paragraphs]
+    chunks = chunk_text("\n\n".join(paragraphs), 100)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    # No paragraph is cut in two, and none is lost or reordered
+    assert [p for chunk in chunks for p in chunk.split("\n\n")] == paragraphs
+
+
+def test_chunk_text_splits_an_oversized_paragraph():
+    sentences = [f"Sentence {i} " + "word " * 30 + "end." for i in range(10)]
+    long_paragraph = " ".join(sentences)
+    chunks = chunk_text("Intro.\n\n" + long_paragraph + "\n\nOutro.", 60)
+
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    pieces = [p for chunk in chunks for p in chunk.split("\n\n")]
+    assert pieces[0] == "Intro." and pieces[-1] == "Outro."
+    # Split on sentence boundaries, so every sentence survives intact
+    assert pieces[1:-1] == sentences
+    # A sentence longer than a whole chunk is hard-split by size
+    run_on = "x" * 1000
+    assert "".join(chunk_text(run_on, 50)) == run_on
+    assert all(count_tokens(chunk) <= 50 for chunk in chunk_text(run_on, 50))
+
+
+def test_raw_store_compacts_released_spans():
+    store = RawStore(compact_bytes=100)
+    refs = [store.put(bytes([i]) * 50) for i in range(10)]
+    for ref in refs[:8]:
+        store.release(ref)
+    store.put(b"new")
+    # The two survivors were moved down; the file holds only live bytes
+    assert store.size == store.live == 103
+    assert store.get(refs[8]) == bytes([8]) * 50
+    assert store.get(refs[9]) == bytes([9]) * 50
+    store.close()
+
+
+def test_raw_store_keeps_small_dead_spans_until_worthwhile():
+    store = RawStore(compact_bytes=1000)
+    first, second = store.put(b"a" * 100), store.put(b"b" * 100)
+    store.release(first)
+    store.put(b"c")
+    assert store.size == 201
+    assert store.get(second) == b"b" * 100
+    store.close()
+
+
+def test_message_body_lives_in_spill_file_and_is_released():
+    raw_store.put(b"")
+    before = raw_store.live
+    message = EmailMessage(ADDRESS, "INBOX", 1, body="Hello \u00e9")
+    assert message.has_body and message.body == "Hello \u00e9"
+    message.body = "Shorter"
+    message.raw = b"raw bytes"
+    assert message.body == "Shorter" and message.raw == b"raw bytes"
+    empty = EmailMessage(ADDRESS, "INBOX", 2, body="")
+    assert empty.has_body and empty.body == ""
+    assert not EmailMessage(ADDRESS, "INBOX", 3).has_body
+    del message, empty
+    raw_store.put(b"")
+    assert raw_store.live == before
+
+
+def test_bulk_reads_keep_bodies_out_of_the_raw_store(store):
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", uid, date=uid, body=f"body {uid}", thread_id=1)
+                        for uid in (1, 2)])
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 3, date=3)])
+    raw_store.put(b"")
+    before = raw_store.live
+    [batch] = store.iter_messages()
+    thread = store.load_thread(ADDRESS, 1)
+    indexed = list(store.iter_with_bodies())
+    assert [email.body for email in batch] == ["body 1", "body 2", None]
+    assert [email.body for email in thread] == ["body 1", "body 2"] and len(indexed) == 2
+    assert batch[0].has_body and not batch[2].has_body
+    raw_store.put(b"")
+    assert raw_store.live == before
+    # A body set later (e.g. fetched from the server) is spilled as usual
+    batch[2].body = "fetched"
+    assert batch[2].body == "fetched" and raw_store.live > before
+    del batch
+    raw_store.put(b"")
+    assert raw_store.live == before
+
+
+def test_store_keeps_local_flag_while_push_pending(store):
+    message = EmailMessage(ADDRESS, "INBOX", 1, subject="Hello", flags=())
+    store.add_messages([message])
+    store.set_flag([message], "important")
+
+    store.update_flags(ADDRESS, "INBOX", {1: ("$MercuryUrgent",)})
+    assert store.load_messages(ADDRESS, "INBOX")[0].flag == "important"
+    store.flags_pushed(ADDRESS, "INBOX", [(1, "important", ("$MercuryImportant",))])
+    store.update_flags(ADDRESS, "INBOX", {1: ("$MercuryUrgent",)})
+    assert store.load_messages(ADDRESS, "INBOX")[0].flag == "urgent"
+
+
+def test_pending_flags_survive_a_schema_rebuild(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = MessageStore(path)
+    message = EmailMessage(ADDRESS, "INBOX", 7, subject="Hello")
+    store.add_messages([message])
+    store.set_flag([message], "urgent")
+    # As if the store had been written by an older version
+    store.conn.execute("PRAGMA user_version = 1")
+    store.close()
+
+    store = MessageStore(path)
+    try:
+        assert store.count_messages(ADDRESS, "INBOX") == 0
+        # Nothing to push until the message is back and its server keywords are known
+        assert store.pending_flags() == []
+        store.add_messages([EmailMessage(ADDRESS, "INBOX", 7, subject="Hello", flags=("$MercuryOnTrack",))])
+        assert store.load_messages(ADDRESS, "INBOX")[0].flag == "urgent"
+        assert store.pending_flags() == [(ADDRESS, "INBOX", 7, "urgent", "$MercuryOnTrack")]
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # summary_cache's time.time(), moved by hand: clock[0] = seconds
+    now = [1000.0]
+    monkeypatch.setattr(summary_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_summary_cache_expires_entries_after_ttl(clock):
+    cache = SummaryCache(':memory:', ttl=60)
+    cache.put("a", "Summary A")
+    clock[0] += 59
+    assert cache.get("a") == "Summary A"
+    clock[0] += 2
+    # Age counts from when it was stored, not last read
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_summary_cache_evicts_least_recently_used(clock):
+    cache = SummaryCache(':memory:', max_entries=2, ttl=0)
+    for key in "abc":
+        clock[0] += 1
+        cache.put(key, f"Summary {key}")
+        if key == "b":
+            clock[0] += 1
+            cache.get("a")  # a is now more recent than b
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("Summary a", "Summary c")
+
+    cache = SummaryCache(':memory:', max_bytes=25, ttl=0)
+    for key in "abc":
+        clock[0] += 1
+        cache.put(key, key * 10)
+    # 30 bytes don't fit in 25, so the oldest goes
+    assert [cache.get(key) for key in "abc"] == [None, "b" * 10, "c" * 10]
+
+
+def test_summary_cache_counts_hits_misses_and_savings():
+    cache = SummaryCache(':memory:')
+    cache.put("a", "Summary A", latency=1.5, tokens=120)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1, "saved_seconds": 3.0, "saved_tokens": 240}
+    cache.clear()
+    assert cache.get("a") is None and cache.stats()["entries"] == 0
+
+
+def test_async_smtp_refuses_to_log_in_without_starttls():
+    server = FakeSmtpServer().start()
+    try:
+        with pytest.raises(AsyncSmtpError, match="STARTTLS"):
+            asyncio.run(AsyncSmtpClient("127.0.0.1", server.port, timeout=5).connect())
+        # Nothing after EHLO, so no credentials on the unencrypted connection
+        assert server.commands == ["EHLO mercury.localdomain"]
+    finally:
+        server.stop()
+
+
+def blocked_scheduler(max_workers=1):
+    # A scheduler whose workers are all held by a job on "gate" until the returned event is set
+    scheduler = FetchScheduler(max_workers=max_workers, per_server=max_workers)
+    started, release = threading.Event(), threading.Event()
+
+    def gate():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit_batch([("gate", "gate", 0, gate)])
+    assert started.wait(5)
+    return scheduler, release
+
+
+def test_fetch_scheduler_limits_jobs_per_server():
+    scheduler = FetchScheduler(max_workers=6, per_server=2)
+    lock, release = threading.Lock(), threading.Event()
+    running, peak, order = {}, {}, []
+
+    def job(server):
+        with lock:
+            running[server] = running.get(server, 0) + 1
+            peak[server] = max(peak.get(server, 0), running[server])
+            order.append(server)
+        if server == "slow":
+            release.wait(5)
+        with lock:
+            running[server] -= 1
+        return server
+
+    finished = threading.Event()
+    jobs = [(f"slow{i}", "slow", 0, lambda: job("slow")) for i in range(5)]
+    jobs += [(f"fast{i}", "fast", 1, lambda: job("fast")) for i in range(3)]
+    batch = scheduler.submit_batch(jobs, on_finished=lambda batch: finished.set())
+    # The slow server holds two workers; the fast one still gets through
+    deadline = time.monotonic() + 5
+    while order.count("fast") < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert order.count("fast") == 3 and order.count("slow") == 2
+    release.set()
+    assert finished.wait(5)
+    assert peak["slow"] == 2 and peak["fast"] <= 2
+    assert len(batch.results) == 8 and not batch.errors
+    scheduler.shutdown()
+
+
+def test_fetch_scheduler_runs_by_priority_and_promote():
+    scheduler, release = blocked_scheduler()
+    order, finished = [], threading.Event()
+    jobs = [(key, "imap.example.com", priority, lambda key=key: order.append(key))
+            for key, priority in (("low", 5), ("high", 1), ("middle", 3), ("switched", 9))]
+    scheduler.submit_batch(jobs, on_finished=lambda batch: finished.set())
+    scheduler.promote("switched")
+    release.set()
+    assert finished.wait(5)
+    assert order == ["switched", "high", "middle", "low"]
+    scheduler.shutdown()
+
+
+def test_fetch_scheduler_cancel_completes_dropped_jobs():
+    scheduler, release = blocked_scheduler()
+    ran, progress, finished = [], [], []
+    batch = scheduler.submit_batch([(key, "imap.example.com", 0, lambda key=key: ran.append(key)) for key in "abc"],
+                                   lambda batch, key: progress.append(key), finished.append)
+    scheduler.cancel(batch)
+    # Jobs that never started still count, so the batch finishes without waiting for a worker
+    assert (batch.done, batch.total) == (3, 3)
+    assert sorted(progress) == ["a", "b", "c"] and finished == [batch]
+    assert batch.results == {} and batch.cancelled
+    release.set()
+    time.sleep(0.1)
+    assert ran == []
+    scheduler.shutdown()
+
+
+def test_build_fts_query_quotes_terms_and_keeps_column_prefixes():
+    assert build_fts_query("budget Q3") == '"budget"* "Q3"*'
+    assert build_fts_query("Sender:alice report") == 'sender : "alice"* "report"*'
+    # FTS5 operators and quotes in the input are dropped rather than interpreted
+    assert build_fts_query('a" OR (b* NEAR') == '"a"* "OR"* "b"* "NEAR"*'
+    assert build_fts_query("  -- ") == ""
+
+
+def test_search_matches_prefixes_newest_first(store):
+    store.add_messages([
+        EmailMessage(ADDRESS, "INBOX", 1, subject="Budget review", sender="alice@example.com"),
+        EmailMessage(ADDRESS, "INBOX", 2, subject="Lunch", sender="bob@example.com", body="the budgets are in"),
+        EmailMessage(ADDRESS, "INBOX", 3, subject="Budget final", sender="carol@example.com"),
+        EmailMessage("other@example.com", "INBOX", 1, subject="Budget elsewhere", sender="dave@example.com"),
+    ])
+    found = store.search("budget", account=ADDRESS)
+    assert [email.uid for email in found] == [3, 2, 1]
+    # List rows only: bodies stay in the store
+    assert all(email.body is None for email in found)
+    assert [email.subject for email in store.search("sender:bob")] == ["Lunch"]
+    assert [email.subject for email in store.search("subject:budget final")] == ["Budget final"]
+    assert len(store.search("budget")) == 4
+    assert len(store.search("budget", limit=2)) == 2
+    assert store.search("()") == []
+    # The index follows bodies fetched later
+    store.set_body(ADDRESS, "INBOX", 1, "quarterly forecast")
+    assert [email.uid for email in store.search("forecast")] == [1]
+
+
+def test_list_messages_sorts_in_the_store_and_pages_by_id(store):
+    store.add_messages([
+        EmailMessage(ADDRESS, "INBOX", 1, subject="b", sender="Carol@example.com", date=300, thread_id=7),
+        EmailMessage(ADDRESS, "INBOX", 2, subject="A", sender="alice@example.com", date=100, flag="urgent"),
+        EmailMessage(ADDRESS, "INBOX", 3, subject="c budget", sender="bob@example.com", date=200, thread_id=7),
+        EmailMessage(ADDRESS, "Sent", 4, subject="budget", sender="me@example.com", date=400),
+        EmailMessage("other@example.com", "INBOX", 1, subject="budget", sender="dave@example.com", date=250),
+    ])
+
+    def uids(rows):
+        found = store.load_by_id(row[0] for row in rows)
+        return [found[row[0]].uid for row in rows]
+
+    assert uids(store.list_messages((ADDRESS,), "INBOX")) == [1, 3, 2]
+    assert uids(store.list_messages((ADDRESS,), "INBOX", column=0, descending=False)) == [2, 3, 1]
+    assert uids(store.list_messages((ADDRESS,), "INBOX", column=1, descending=False)) == [2, 3, 1]
+    assert uids(store.list_messages((ADDRESS,), "INBOX", column=2, descending=False)) == [2, 1, 3]
+    assert uids(store.list_messages((ADDRESS,), "INBOX", column=3, descending=True)) == [2, 3, 1]
+    assert [row[1:] for row in store.list_messages((ADDRESS,), "INBOX")] == [
+        (ADDRESS, 7, "unmarked"), (ADDRESS, 7, "unmarked"), (ADDRESS, None, "urgent")]
+    assert len(store.list_messages((ADDRESS, "other@example.com"), "INBOX")) == 4
+    assert store.list_messages((), "INBOX") == []
+    # Search matches are the newest `limit` by id, then sorted like any list
+    assert uids(store.list_messages(text="budget", column=0, descending=False)) == [3, 1, 4]
+    assert uids(store.list_messages((ADDRESS,), text="budget", limit=1)) == [4]
+    assert store.list_messages(text="()") == []
+    ids = [row[0] for row in store.list_messages((ADDRESS,), "INBOX")]
+    found = store.load_by_id(ids + [999])
+    assert sorted(found) == sorted(ids) and found[ids[0]].subject == "b"
+    assert found[ids[0]].body is None
+
+
+def test_group_rows_keeps_conversations_together_in_sort_order():
+    rows = [(1, "a", 7, "unmarked"), (2, "a", None, "urgent"), (3, "b", 7, "unmarked"), (4, "a", 7, "unmarked"),
+            (5, "a", None, "unmarked")]
+    flat = group_rows(rows, threaded=False)
+    assert list(flat.ids) == [1, 2, 3, 4, 5] and len(flat) == 5 and not flat.threaded
+    assert list(flat.row_ids(1, 3)) == [2, 3]
+    # Thread ids are per account: b's thread 7 is its own conversation
+    threaded = group_rows(rows, threaded=True)
+    assert list(threaded.ids) == [1, 4, 2, 3, 5] and list(threaded.starts) == [0, 2, 3, 4]
+    assert len(threaded) == 4 and threaded.span(0) == (0, 2) and threaded.span(3) == (4, 5)
+    assert list(threaded.row_ids(0, 2)) == [1, 4, 2] and list(threaded.row_ids(2, 2)) == []
+    assert threaded.locate(4, rows=1) == (0, 1) and threaded.locate(5, rows=4) == (3, 0)
+    assert threaded.locate(5, rows=3) is None and threaded.locate(9, rows=4) is None
+
+
+def test_load_message_list_reads_only_the_first_page(store):
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", uid, subject=f"m{uid}", date=uid) for uid in range(1, 8)])
+    listing = load_message_list(store, first_page=3, accounts=(ADDRESS,), folder="INBOX")
+    assert len(listing) == 7
+    assert [listing.emails[message_id].uid for message_id in listing.ids[:3]] == [7, 6, 5]
+    assert len(listing.emails) == 3
+    assert len(load_message_list(store, accounts=(ADDRESS,), text="nothing")) == 0
+
+
+def test_list_changes_reports_only_what_changed_between_loads(store):
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", uid, subject=f"m{uid}", date=uid) for uid in range(1, 5)])
+    changes = ListChanges()
+    source = dict(accounts=(ADDRESS,), folder="INBOX")
+    added, removed, reflagged = load_message_list(store, changes=changes, **source).changes
+    assert sorted(email.uid for email in added) == [1, 2, 3, 4] and removed == [] and reflagged == []
+    assert load_message_list(store, changes=changes, **source).changes == ([], [], [])
+    store.set_flag([EmailMessage(ADDRESS, "INBOX", 2)], "urgent")
+    store.delete_messages(ADDRESS, "INBOX", [3])
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 5, subject="m5", date=5)])
+    added, removed, reflagged = load_message_list(store, changes=changes, **source).changes
+    assert [email.uid for email in added] == [5]
+    assert removed == [(ADDRESS, "INBOX", 3)]
+    assert reflagged == [((ADDRESS, "INBOX", 2), "urgent")]
+    # A load that isn't followed leaves nothing behind
+    assert load_message_list(store, **source).changes is None
+
+
+def test_dashboard_stats_add_remove_and_reflag_touch_only_their_entries():
+    stats = DashboardStats()
+    first = EmailMessage(ADDRESS, "INBOX", 1, subject="Budget review", sender="alice@example.com", flag="urgent")
+    second = EmailMessage(ADDRESS, "INBOX", 2, subject="Re: budget", sender="alice@example.com")
+    stats.apply([first, second], [], [])
+    assert dict(stats.flag_counts) == {"urgent": 1, "important": 0, "on_track": 0, "unmarked": 1}
+    assert stats.sender_counts == {"alice@example.com": 2}
+    assert stats.term_counts == {"budget": 2, "review": 1}
+    assert stats.senders_added == {"alice@example.com"} and stats.flags_changed and stats.terms_changed
+    version = stats.terms_version
+    stats.reset_changes()
+
+    # Re-flagging moves one count between flag keys and leaves senders and terms alone
+    stats.apply([], [], [((ADDRESS, "INBOX", 2), "important"), ((ADDRESS, "INBOX", 9), "urgent")])
+    assert stats.flag_counts["important"] == 1 and stats.flag_counts["unmarked"] == 0
+    assert stats.flags_changed and not stats.terms_changed and stats.terms_version == version
+    stats.reset_changes()
+    first.flag = "on_track"
+    stats.set_flag(first)
+    assert dict(stats.flag_counts) == {"urgent": 0, "important": 1, "on_track": 1, "unmarked": 0}
+    stats.reset_changes()
+    stats.set_flag(first)
+    assert not stats.flags_changed
+
+    # Adding the same message again replaces its entry instead of counting it twice
+    stats.add(EmailMessage(ADDRESS, "INBOX", 1, subject="Budget review", sender="bob@example.com"))
+    assert stats.sender_counts == {"alice@example.com": 1, "bob@example.com": 1}
+    assert sum(stats.flag_counts.values()) == 2
+    stats.reset_changes()
+
+    stats.apply([], [(ADDRESS, "INBOX", 2), (ADDRESS, "INBOX", 2)], [])
+    assert stats.senders_removed == {"alice@example.com"} and "alice@example.com" not in stats.sender_counts
+    assert stats.term_counts == {"budget": 1, "review": 1}
+    assert dict(stats.flag_counts) == {"urgent": 0, "important": 0, "on_track": 0, "unmarked": 1}
+    stats.clear()
+    assert stats.entries == {} and sum(stats.flag_counts.values()) == 0 and stats.flags_changed
+
+
+def test_mailbox_stats_merges_partial_totals():
+    first, second = MailboxStats(), MailboxStats()
+    first.add(EmailMessage(ADDRESS, "INBOX", 1, subject="Budget review", sender="alice@example.com", date=200,
+                           flag="urgent"), summary="short")
+    first.add(EmailMessage(ADDRESS, "INBOX", 2, subject="Lunch", sender="bob@example.com"), summary_failed=True)
+    second.add(EmailMessage(ADDRESS, "INBOX", 3, subject="Budget final", sender="alice@example.com", date=100,
+                            flag="on_track"))
+    first.merge(second)
+    data = first.as_dict(top=1)
+    assert (data["messages"], data["summarized"], data["summary_failures"]) == (3, 1, 1)
+    assert (data["first"], data["last"]) == (100, 200)
+    assert data["flags"] == {"urgent": 1, "important": 0, "on_track": 1, "unmarked": 1}
+    assert data["unique_senders"] == 2 and data["top_senders"] == [("alice@example.com", 2)]
+    assert data["top_subject_terms"] == [("budget", 2)]
+    assert MailboxStats().as_dict()["first"] is None
+
+
+def test_triage_history_holds_only_user_and_server_flags(store):
+    store.add_messages([
+        EmailMessage(ADDRESS, "INBOX", 1, subject="Unread", sender="a@example.com"),
+        EmailMessage(ADDRESS, "INBOX", 2, subject="Read", sender="b@example.com", flags=("\\Seen",)),
+        EmailMessage(ADDRESS, "INBOX", 3, subject="Keyword", sender="c@example.com", flags=("$MercuryUrgent",),
+                     flag="urgent"),
+        EmailMessage(ADDRESS, "INBOX", 4, subject="By hand", sender="d@example.com"),
+        EmailMessage(ADDRESS, "INBOX", 5, subject="Guess", sender="e@example.com"),
+    ])
+    by_hand, guess = store.load_messages(ADDRESS, "INBOX")[3:]
+    store.set_flag([by_hand], "important")
+    store.set_triaged(ADDRESS, [row[0] for row in store.untriaged(ADDRESS, 10)], [("INBOX", 5, "on_track")])
+
+    history = {subject: flag for _, subject, _, flag in store.triage_history(10)}
+    assert history == {"Read": "unmarked", "Keyword": "urgent", "By hand": "important"}
+    # The guess stays local: only the flag set by hand is queued for the server
+    assert [row[2] for row in store.pending_flags()] == [4]
+
+    # A server without the keyword keeps the guess; one the server carries replaces it
+    store.update_flags(ADDRESS, "INBOX", {5: ("\\Seen",)})
+    assert store.load_messages(ADDRESS, "INBOX")[4].flag == "on_track"
+    assert "Guess" not in {subject for _, subject, _, _ in store.triage_history(10)}
+    store.update_flags(ADDRESS, "INBOX", {5: ("$MercuryImportant",)})
+    assert store.load_messages(ADDRESS, "INBOX")[4].flag == "important"
+    assert ("e@example.com", "Guess", None, "important") in store.triage_history(10)
+
+
+@pytest.mark.parametrize("push", [False, True])
+def test_triage_pushes_its_flags_only_when_asked(store, push):
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 1, subject="Hi", sender="Boss <boss@example.com>")])
+    config = {"rules": [{"flag": "urgent", "sender": "boss@example.com"}], "classifier": False, "push": push}
+    assert Triage(store, config).run(ADDRESS) == [("INBOX", 1, "urgent")]
+    assert store.load_messages(ADDRESS, "INBOX")[0].flag == "urgent"
+    assert store.pending_flags() == ([(ADDRESS, "INBOX", 1, "urgent", "")] if push else [])
+
+
+def test_triage_retries_a_failed_fit_only_when_labels_change(store, monkeypatch):
+    pytest.importorskip("numpy")
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 1, subject="Read", sender="a@example.com", flags=("\\Seen",))])
+    triage = Triage(store, {"rules": [], "classifier": True, "min_examples": 20})
+    reads = []
+    history = store.triage_history
+
+    def counted_history(limit):
+        reads.append(limit)
+        return history(limit)
+
+    monkeypatch.setattr(store, "triage_history", counted_history)
+    triage.run(ADDRESS)
+    triage.run(ADDRESS)
+    assert len(reads) == 1 and triage.classifier is None
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 2, subject="Also read", flags=("\\Seen",))])
+    triage.run(ADDRESS)
+    triage.run(ADDRESS)
+    assert len(reads) == 2
+    triage.invalidate()
+    triage.run(ADDRESS)
+    assert len(reads) == 3
+
+
+def test_rule_matcher_first_listed_rule_wins():
+    rules = RuleMatcher([{"flag": "urgent", "keyword": "outage"},
+                         {"flag": "important", "domain": "example.org"},
+                         {"flag": "on_track", "sender": "alice@example.org"},
+                         {"flag": "on_track", "subject": "weekly report"}])
+    assert rules.match("Alice <alice@example.org>", "Outage in eu-west") == "urgent"
+    assert rules.match("Alice <alice@example.org>", "Lunch") == "important"
+    assert rules.match("bob@example.net", "Re: Weekly report", "there was an outage") == "urgent"
+    assert rules.match("bob@example.net", "Re: Weekly report") == "on_track"
+
+
+def test_rule_matcher_domains_and_keywords():
+    rules = RuleMatcher([{"flag": "important", "domain": ["Client.com"]},
+                         {"flag": "urgent", "keyword": ["incident"]},
+                         {"flag": "nonsense", "sender": "x@example.com"}])
+    # A domain matches its subdomains but not a name that merely ends the same way
+    assert rules.match("ops@eu.mail.client.com", "Hi") == "important"
+    assert rules.match("ops@notclient.com", "Hi") is None
+    # Keywords are whole words, in the subject or the body
+    assert rules.match("a@example.net", "New incident!") == "urgent"
+    assert rules.match("a@example.net", "Hi", "Incident report attached") == "urgent"
+    assert rules.match("a@example.net", "Incidents this week") is None
+    # A rule with an unknown flag is ignored
+    assert rules.match("x@example.com", "Hi") is None
+
+
+def test_classifier_flags_only_above_threshold():
+    pytest.importorskip("numpy")
+    from src.utils.triage_model import TriageClassifier
+
+    history = ([("Boss <boss@corp.example>", f"Server down {i}", None, "urgent") for i in range(30)]
+               + [(f"news{i}@shop.example", f"Weekly newsletter {i}", None, "unmarked") for i in range(30)])
+    classifier = TriageClassifier(min_examples=20)
+    assert classifier.fit(history)
+    rows = [("boss@corp.example", "Server down again", None), ("boss@corp.example", "Lunch", None),
+            ("news1@shop.example", "Weekly newsletter", None)]
+    assert classifier.predict(rows, 0.5) == ["urgent", "urgent", None]
+    # The boss writing about something new is a weaker case, left alone by a strict threshold
+    assert classifier.predict(rows, 0.95) == ["urgent", None, None]
+
+    # Too few examples of any flag to learn from
+    assert not TriageClassifier(min_examples=40).fit(history)
+
+
+def chat(context, count, words=3):
+    for i in range(count):
+        context.add("user" if i % 2 == 0 else "assistant", " ".join([f"turn{i}"] * words))
+
+
+def test_chat_context_keeps_newest_messages_within_budget():
+    context = ChatContext(None, token_budget=10 ** 6)
+    chat(context, 6)
+    system = {"role": "system", "content": "Be brief."}
+    # Room for the system prompt and exactly the last three messages
+    context.token_budget = message_tokens(system) + sum(map(message_tokens, context.messages[-3:]))
+    sent = context.build_messages("Be brief.")
+    assert sent[0] == system and sent[1:] == context.messages[-3:]
+    # The latest message goes even when it alone is over budget
+    context.add("user", "long " * 5000)
+    assert context.build_messages("Be brief.")[1:] == context.messages[-1:]
+
+
+def test_chat_context_folds_older_turns_and_drops_stale_folds():
+    context = ChatContext(None, token_budget=10 ** 6, keep_turns=2, fold_after=4)
+    chat(context, 4)
+    assert not context.needs_fold()
+    chat(context, 1)
+    assert context.needs_fold()
+    seen = []
+
+    def summarize(previous, turns):
+        seen.append((previous, [message["content"] for message in turns]))
+        assert not context.needs_fold()  # one fold at a time
+        return f"summary {len(seen)}"
+
+    assert context.fold(summarize)
+    assert seen == [("", ["turn0 turn0 turn0", "turn1 turn1 turn1", "turn2 turn2 turn2"])]
+    assert context.summarized == 3 and not context.needs_fold()
+    sent = context.build_messages("Be brief.")
+    assert "summary 1" in sent[0]["content"] and sent[1:] == context.messages[3:]
+
+    # Too many tokens also triggers a fold, even under fold_after messages
+    context.token_budget = 50
+    chat(context, 1, words=100)
+    assert context.needs_fold()
+
+    # A fold that finishes after clear() belongs to the old conversation and is dropped
+    def summarize_then_clear(previous, turns):
+        context.clear()
+        return "stale"
+
+    assert not context.fold(summarize_then_clear)
+    assert (context.summary, context.summarized, context.messages) == ("", 0, [])
+
+
+def test_chat_context_reloads_history_from_jsonl(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    context = ChatContext(path, keep_turns=2, fold_after=3)
+    chat(context, 5)
+    context.fold(lambda previous, turns: "the story so far")
+    context.add("user", "and now?")
+
+    reloaded = ChatContext(path, keep_turns=2, fold_after=3)
+    assert reloaded.messages == context.messages
+    assert (reloaded.summary, reloaded.summarized) == ("the story so far", 3)
+    assert reloaded.build_messages("Be brief.") == context.build_messages("Be brief.")
+    # One line per message and one per fold
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 7
+    reloaded.clear()
+    assert ChatContext(path).messages == []
+
+
+def test_mail_index_ranks_adds_and_removes(store):
+    pytest.importorskip("numpy")
+    from src.utils.mail_index import MailIndex, tokenize
+
+    assert tokenize("The budget, and Q3's plan!") == ["budget", "q3's", "plan"]
+    store.add_messages([
+        EmailMessage(ADDRESS, "INBOX", 1, subject="Budget", body="budget budget budget for the offsite"),
+        EmailMessage(ADDRESS, "INBOX", 2, subject="Lunch", body="lunch plans and a short budget note"),
+        EmailMessage(ADDRESS, "INBOX", 3, subject="Travel", body="travel booking for the offsite"),
+        EmailMessage(ADDRESS, "INBOX", 4, subject="No body"),
+    ])
+    index = MailIndex(store, chunk_words=5)
+    assert index.build() == 3  # messages without a body aren't indexed
+
+    hits = index.search("budget")
+    assert [hit["uid"] for hit in hits] == [1, 2]
+    assert hits[0]["score"] > hits[1]["score"] and hits[0]["subject"] == "Budget"
+    # A rarer term weighs more: "travel" is in one message, "offsite" in two
+    assert [hit["uid"] for hit in index.search("offsite travel")][0] == 3
+    # Hits carry the matching chunk, re-read from the store
+    assert "short budget note" in index.search("note")[0]["text"]
+    assert index.search("the and") == [] and index.search("missing") == []
+
+    index.remove_message(ADDRESS, "INBOX", 1)
+    assert [hit["uid"] for hit in index.search("budget")] == [2]
+    # Adding a message again replaces its old chunks
+    store.set_body(ADDRESS, "INBOX", 2, "nothing about money")
+    index.add_message(EmailMessage(ADDRESS, "INBOX", 2, subject="Lunch", body="nothing about money"))
+    assert index.search("budget") == [] and len(index) == 2
+    assert index.search("money", k=1)[0]["uid"] == 2
+
+
+class ApiError(Exception):
+    # Shaped like an OpenAI APIStatusError: a status code and the response's headers
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+def run_pipeline(pipeline, jobs):
+    # {key: summary} once every job has completed
+    results, finished = {}, threading.Event()
+    pipeline.run(jobs, results.__setitem__, lambda run: finished.set())
+    assert finished.wait(10)
+    return results
+
+
+def test_summary_pipeline_retries_with_backoff_and_retry_after():
+    assert retry_after(ApiError(429, "2.5")) == 2.5 and retry_after(ApiError(429)) is None
+    assert is_retryable(ApiError(503)) and not is_retryable(ApiError(400)) and not is_retryable(ValueError())
+    attempts = []
+
+    def summarize(content):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ApiError(429, "0.2")
+        if len(attempts) == 2:
+            raise ApiError(503)
+        return f"Summary of {content}"
+
+    pipeline = SummaryPipeline(summarize, base_delay=0.05)
+    try:
+        assert run_pipeline(pipeline, [("a", lambda: "mail")]) == {"a": "Summary of mail"}
+    finally:
+        pipeline.shutdown()
+    # Retry-After is honoured first, then exponential backoff from base_delay (plus up to 25% jitter)
+    assert 0.2 <= attempts[1] - attempts[0] < 0.5
+    assert 0.1 <= attempts[2] - attempts[1] < 0.3
+
+
+def test_summary_pipeline_reports_failures():
+    calls = []
+
+    def summarize(content):
+        calls.append(content)
+        raise ApiError(400 if content == "bad" else 503)
+
+    pipeline = SummaryPipeline(summarize, max_retries=2, base_delay=0.01)
+    try:
+        results = run_pipeline(pipeline, [("bad", lambda: "bad"), ("busy", lambda: "busy")])
+    finally:
+        pipeline.shutdown()
+    # A client error isn't retried; a server error is, until max_retries runs out
+    assert (calls.count("bad"), calls.count("busy")) == (1, 3)
+    assert results == {"bad": f"{FAILED_PREFIX} status 400", "busy": f"{FAILED_PREFIX} status 503"}
+
+
+def test_summary_pipeline_rate_limit_pauses_every_worker():
+    limited, started = threading.Event(), {}
+
+    def summarize(content):
+        if content == "first" and not limited.is_set():
+            limited.set()
+            raise ApiError(429, "0.3")
+        started[content] = time.monotonic()
+        return content
+
+    def second():
+        # Only asks once the first job has been rate limited
+        limited.wait(5)
+        time.sleep(0.05)
+        return "second"
+
+    pipeline = SummaryPipeline(summarize, max_concurrency=2)
+    try:
+        begin = time.monotonic()
+        assert run_pipeline(pipeline, [("a", lambda: "first"), ("b", second)]) == {"a": "first", "b": "second"}
+    finally:
+        pipeline.shutdown()
+    assert started["second"] - begin >= 0.3
+
+
+def test_summary_pipeline_cancel_completes_every_job():
+    gate, started = threading.Event(), threading.Event()
+
+    def summarize(content):
+        if content == "slow":
+            started.set()
+            gate.wait(5)
+        elif content == "limited":
+            raise ApiError(429, "30")
+        return content
+
+    pipeline = SummaryPipeline(summarize, max_concurrency=2)
+    results, finished = {}, []
+    try:
+        summary_run = pipeline.run([("slow", lambda: "slow"), ("limited", lambda: "limited")]
+                                   + [(str(i), lambda: "queued") for i in range(5)],
+                                   results.__setitem__, finished.append)
+        assert started.wait(5)
+        time.sleep(0.1)
+        summary_run.cancel()
+        gate.set()
+        deadline = time.monotonic() + 5
+        while not finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pipeline.shutdown()
+    # Queued jobs and the one waiting out a 30 s Retry-After finish at once, without a result;
+    # the one already running still delivers its summary
+    assert finished == [summary_run] and summary_run.done == summary_run.total == 7
+    assert results == {"slow": "slow"}
+
+
+def test_export_keeps_failed_summaries_out_of_the_summary(store, monkeypatch):
+    from src.utils import export
+
+    def summarize(content, raise_errors=False):
+        if "broken" in content:
+            raise ValueError("bad request")
+        return f"Summary of {content}"
+
+    monkeypatch.setattr(export, "summarize_email", summarize)
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", uid, subject=f"Message {uid}", date=1700000000 + uid,
+                                     body=body) for uid, body in ((1, "fine"), (2, "broken"), (3, None))])
+    stream = io.StringIO()
+    writer = export.JsonlWriter(stream)
+    stats = export.Exporter(store, summaries="generate").export(writer)
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    assert [(row["summary"], row["summary_error"]) for row in rows] == [
+        ("Summary of fine", None), (None, "bad request"), (None, None)]
+    assert (stats.summarized, stats.summary_failures) == (1, 1)
+    assert stats.as_dict()["summary_failures"] == 1
+
+
+def thread_ids(index, rows):
+    # rows: (rowid, message_id, refs, subject); thread id by rowid once all are added
+    for row in rows:
+        index.add(*row)
+    index.flush()
+    return {rowid: index.thread_of[rowid] for rowid, _, _, _ in rows}
+
+
+def test_parse_references_appends_in_reply_to():
+    assert parse_references("<a@x> <b@x>", "<c@x>") == ["<a@x>", "<b@x>", "<c@x>"]
+    assert parse_references("<a@x> <b@x>", "<b@x>") == ["<a@x>", "<b@x>"]
+    assert parse_references(None, "Anna's message <c@x>") == ["<c@x>"]
+    assert base_subject("RE: Fwd: AW:  Budget Q3 ") == "budget q3"
+
+
+def test_thread_index_links_reply_chains():
+    threads = thread_ids(ThreadIndex(), [
+        (1, "<a>", [], "Budget"),
+        (2, "<b>", ["<a>"], "Re: Budget"),
+        (3, "<c>", ["<a>", "<b>"], "Re: Budget"),
+        (4, "<d>", ["<a>"], "Re: Budget"),
+        (5, "<e>", [], "Lunch"),
+    ])
+    assert threads[1] == threads[2] == threads[3] == threads[4]
+    assert threads[5] != threads[1]
+
+
+def test_thread_index_joins_through_missing_parents():
+    # The root was never stored (e.g. deleted); its replies still share a thread,
+    # and a reply arriving before its parent moves with it
+    threads = thread_ids(ThreadIndex(), [
+        (1, "<c>", ["<root>", "<b>"], "Re: Plan"),
+        (2, "<d>", ["<root>"], "Re: Plan"),
+        (3, "<b>", ["<root>"], "Re: Plan"),
+    ])
+    assert threads[1] == threads[2] == threads[3]
+
+
+def test_thread_index_refuses_reference_loops():
+    index = ThreadIndex()
+    threads = thread_ids(index, [
+        (1, "<a>", ["<b>"], "Loop"),
+        (2, "<b>", ["<a>"], "Re: Loop"),
+        (3, "<c>", ["<c>"], "Self"),
+        (4, "<d>", ["<e>", "<d>"], "Re: Self"),
+    ])
+    assert threads[1] == threads[2]
+    assert threads[3] != threads[1]
+    # Every container still reaches a root
+    assert all(index._root(container) >= 0 for container in range(len(index.parent)))
+
+
+def test_thread_index_joins_replies_by_subject():
+    threads = thread_ids(ThreadIndex(), [
+        (1, "<a>", [], "Quarterly numbers"),
+        (2, "<b>", [], "RE: Fwd: quarterly numbers"),
+        (3, "<c>", [], "Quarterly numbers"),
+        (4, "<d>", [], "Re: Something else"),
+    ])
+    assert threads[1] == threads[2]
+    # Not a reply, so a new conversation with the same subject
+    assert threads[3] != threads[1]
+    assert threads[4] not in (threads[1], threads[3])
+
+
+def test_thread_index_updates_incrementally():
+    index = ThreadIndex()
+    thread_ids(index, [(1, "<a>", [], "Trip"), (2, "<x>", ["<p>"], "Re: Venue")])
+    first = dict(index.thread_of)
+
+    # A new reply: only its own row is reported
+    index.add(3, "<b>", ["<a>"], "Re: Trip")
+    assert index.flush() == [(first[1], 3)]
+    assert index.flush() == []
+    # The missing parent turns up: it joins its reply's thread, which keeps its id
+    index.add(4, "<p>", [], "Venue")
+    assert index.flush() == [(first[2], 4)]
+    # ...and turns out to answer the trip thread, so that whole subtree moves
+    index.add(5, "<p>", ["<a>"], "Re: Trip")
+    assert sorted(index.flush()) == [(first[1], 2), (first[1], 4), (first[1], 5)]
+
+
+def test_thread_indexer_writes_only_changed_ids(store):
+    store.add_messages([
+        EmailMessage(ADDRESS, "INBOX", 1, subject="Trip", message_id="<a>"),
+        EmailMessage(ADDRESS, "INBOX", 2, subject="Re: Trip", message_id="<b>", refs="<a>"),
+        EmailMessage(ADDRESS, "Sent", 1, subject="Re: Trip", message_id="<c>", refs="<a> <b>"),
+    ])
+    indexer = ThreadIndexer(store)
+    assert indexer.update(ADDRESS) == 3
+    assert indexer.update(ADDRESS) == 0
+    store.add_messages([EmailMessage(ADDRESS, "INBOX", 3, subject="Re: Trip", message_id="<d>", refs="<a> <c>")])
+    assert indexer.update(ADDRESS) == 1
+    thread = store.load_messages(ADDRESS, "INBOX")[0].thread_id
+    assert sorted((message.folder, message.uid) for message in store.load_thread(ADDRESS, thread)) == [
+        ("INBOX", 1), ("INBOX", 2), ("INBOX", 3), ("Sent", 1)]
+
+
+def test_decode_bytes_falls_back_through_the_charsets():
+    assert decode_bytes("caf\u00e9".encode("iso-8859-15"), "iso-8859-15") == "caf\u00e9"
+    # An unknown or wrong declared charset doesn't stop decoding
+    assert decode_bytes("caf\u00e9".encode(), "x-no-such-charset") == "caf\u00e9"
+    assert decode_bytes("\u201cquoted\u201d".encode("cp1252"), "utf-8") == "\u201cquoted\u201d"
+    # 0x81 is undefined in cp1252; latin-1 takes any byte
+    assert decode_bytes(b"a\x81b") == "a\x81b"
+
+
+def test_html_to_text_keeps_blocks_and_drops_markup():
+    html = ("<html><head><title>t</title><style>p {color: red}</style></head><body>"
+            "<h1>Agenda</h1><p>Budget&nbsp;&amp;   plans</p><script>alert(1)</script>"
+            "<ul><li>One</li><li>Two</li></ul><p></p><p></p><p></p><div>Bye<br>now</div></body></html>")
+    assert html_to_text(html) == "Agenda\n\nBudget & plans\n\n- One\n- Two\n\nBye\nnow"
+
+
+def mime_message(*parts):
+    boundary = "BOUNDARY"
+    lines = ["Subject: parts", "MIME-Version: 1.0", f'Content-Type: multipart/mixed; boundary="{boundary}"', ""]
+    for headers, payload in parts:
+        lines += [f"--{boundary}", *headers, "", payload]
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines).encode("latin-1")
+
+
+def test_parse_message_prefers_plain_text_and_spills_attachments(tmp_path):
+    raw = mime_message(
+        (["Content-Type: text/plain; charset=utf-8"], "Gr\xfc\xdfe"),
+        (["Content-Type: text/html"], "<p>html version</p>"),
+        (["Content-Type: application/pdf", 'Content-Disposition: attachment; filename="report.pdf"',
+          "Content-Transfer-Encoding: base64"], "JVBERi0xLjQ="))
+    parsed = parse_message(raw, spill_dir=str(tmp_path))
+    # Declared utf-8 but really latin-1: decoded by the fallbacks
+    assert parsed.text == "Gr\xfc\xdfe"
+    [attachment] = parsed.attachments
+    assert (attachment.filename, attachment.content_type, attachment.size) == ("report.pdf", "application/pdf", 8)
+    assert attachment.read() == b"%PDF-1.4" and os.path.dirname(attachment.path) == str(tmp_path)
+    parsed.discard()
+    assert not os.path.exists(attachment.path)
+
+    html_only = parse_message(mime_message((["Content-Type: text/html; charset=utf-8"], "<b>Hi</b> there")),
+                              spill_dir=str(tmp_path))
+    assert html_only.text == "Hi there" and html_only.attachments == []
+
+
+def test_body_cache_eviction_deletes_spill_files(tmp_path):
+    raw = mime_message((["Content-Type: text/plain"], "body"),
+                       (["Content-Type: image/png", 'Content-Disposition: attachment; filename="a.png"'], "png"))
+    cache = BodyCache(max_entries=2)
+    parsed = [parse_message(raw, spill_dir=str(tmp_path)) for _ in range(4)]
+    paths = [body.attachments[0].path for body in parsed]
+    cache.put(1, parsed[0])
+    cache.put(2, parsed[1])
+    assert cache.get(1) is parsed[0]
+    cache.put(3, parsed[2])
+    # 2 was least recently used
+    assert cache.get(2) is None and not os.path.exists(paths[1])
+    assert os.path.exists(paths[0]) and os.path.exists(paths[2])
+    # Replacing an entry discards the old body; putting the same one again keeps it
+    cache.put(1, parsed[3])
+    assert not os.path.exists(paths[0]) and cache.get(1) is parsed[3]
+    cache.put(1, parsed[3])
+    assert os.path.exists(paths[3])
+    cache.clear()
+    assert cache.entries == {} and os.listdir(tmp_path) == []
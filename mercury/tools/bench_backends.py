@@ -0,0 +1,114 @@
+# tools/bench_backends.py
+"""Compare the thread and asyncio network backends against local fake IMAP servers.
+
+Each account gets its own fake server with a fixed per-command latency, then
+a first sync of every account runs through the thread backend (FetchScheduler
+plus MailSync on imaplib) and through the async backend (AsyncMailSync on one
+event loop). Reports wall time and the number of client threads used.
+
+Run from the mercury directory:
+    python -m tools.bench_backends [--accounts 10 50 200] [--messages 200] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from src.utils.database import MessageStore
+from src.utils.fetch_scheduler import FetchScheduler
+from src.utils.imap_pool import ImapConnectionPool
+from src.utils.mail_sync import AsyncMailSync, MailSync
+from tools.fake_imap import PlainAccount, build_server
+
+
+class ThreadSampler:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            count = sum(1 for t in threading.enumerate() if t.name.startswith(self.prefix))
+            self.peak = max(self.peak, count)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_threads(accounts, workers):
+    sync = MailSync(MessageStore(':memory:'), pool=ImapConnectionPool())
+    scheduler = FetchScheduler(max_workers=workers)
+    done = threading.Event()
+    jobs = [(a.email, f"{a.imap_server}:{a.imap_port}", 1, lambda a=a: sync.sync_folder(a)) for a in accounts]
+    with ThreadSampler("mercury-fetch") as sampler:
+        start = time.perf_counter()
+        batch = scheduler.submit_batch(jobs, on_finished=lambda batch: done.set())
+        done.wait()
+        elapsed = time.perf_counter() - start
+    scheduler.shutdown()
+    sync.pool.close_all()
+    return elapsed, sampler.peak, len(batch.errors)
+
+
+def run_async(accounts):
+    sync = AsyncMailSync(MessageStore(':memory:'))
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(sync.sync_folder(a) for a in accounts), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        await sync.pool.close_all()
+        return elapsed, sum(isinstance(r, Exception) for r in results)
+
+    elapsed, errors = asyncio.run(main())
+    return elapsed, 1, errors
+
+
+def run_pipelining(messages, latency):
+    server = build_server(messages, body_size=200, latency=latency)
+    account = PlainAccount("pipe@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+    kwargs = {"batch_size": 500, "initial_limit": messages}
+
+    start = time.perf_counter()
+    MailSync(MessageStore(':memory:'), pool=ImapConnectionPool(), **kwargs).sync_folder(account)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(AsyncMailSync(MessageStore(':memory:'), **kwargs).sync_folder(account))
+    pipelined = time.perf_counter() - start
+    server.stop()
+    print(f"first sync of {messages} messages in 500-message FETCHes: "
+          f"serial {serial:.3f} s, pipelined {pipelined:.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=8, help="thread backend pool size")
+    args = parser.parse_args()
+
+    for count in args.accounts:
+        servers = [build_server(args.messages, body_size=200, latency=args.latency) for _ in range(count)]
+        accounts = [PlainAccount(f"user{i}@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+                    for i, server in enumerate(servers)]
+        print(f"{count} accounts, {args.messages} messages each, {args.latency * 1000:.0f} ms per command")
+        for label, run in (("thread", lambda: run_threads(accounts, args.workers)),
+                           ("async", lambda: run_async(accounts))):
+            elapsed, threads, errors = run()
+            print(f"  {label:<7} {elapsed:>8.3f} s  {threads:>4} client threads  {errors} errors")
+        for server in servers:
+            server.stop()
+    run_pipelining(10000, args.latency)
+
+
+if __name__ == "__main__":
+    main()
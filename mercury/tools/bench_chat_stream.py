@@ -0,0 +1,68 @@
+# tools/bench_chat_stream.py
+"""Compare blocking and streaming chat completions against the local stub server.
+
+Reports time to first visible text and total time for a blocking call (the
+old ChatbotTab behaviour) and for stream_chat, then how quickly a stream
+stops after it is cancelled.
+
+Run from the mercury directory:
+    python -m tools.bench_chat_stream [--first-token-latency 0.3] [--token-latency 0.02]
+"""
+import argparse
+import threading
+import time
+
+from openai import OpenAI
+
+from src.utils.chat_stream import CHAT_MODEL, CHAT_SYSTEM_PROMPT, stream_chat
+from tools.fake_openai import FakeOpenAIServer
+
+HISTORY = [{"role": "system", "content": CHAT_SYSTEM_PROMPT},
+           {"role": "user", "content": "Explain what this benchmark measures."}]
+
+
+def run_blocking(client):
+    start = time.perf_counter()
+    response = client.chat.completions.create(model=CHAT_MODEL, messages=HISTORY)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, len(response.choices[0].message.content)
+
+
+def run_streaming(client):
+    first = []
+    start = time.perf_counter()
+    text = stream_chat(client, HISTORY, lambda delta: first or first.append(time.perf_counter() - start))
+    return first[0], time.perf_counter() - start, len(text)
+
+
+def run_cancel(client, server, after):
+    cancelled = threading.Event()
+    timer = threading.Timer(after, cancelled.set)
+    start = time.perf_counter()
+    timer.start()
+    text = stream_chat(client, HISTORY, lambda delta: None, cancelled)
+    elapsed = time.perf_counter() - start
+    # Give the server a moment to notice the closed socket
+    time.sleep(0.2)
+    return elapsed, len(text), server.cancelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(first_token_latency=args.first_token_latency,
+                              token_latency=args.token_latency).start()
+    client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    for label, run in (("blocking", run_blocking), ("streaming", run_streaming)):
+        first, total, chars = run(client)
+        print(f"  {label:<10} first text {first:>6.3f} s  total {total:>6.3f} s  {chars} chars")
+    elapsed, chars, closed = run_cancel(client, server, args.first_token_latency + 0.1)
+    print(f"  cancelled  stopped after {elapsed:.3f} s with {chars} chars, server saw {closed} closed stream(s)")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# tools/bench_email_parser.py
+"""Compare the old per-click MIME walk with parse-once cached bodies.
+
+Builds multipart messages with a plain part, an HTML part and a binary
+attachment, then measures the time to "open" each message repeatedly and
+the memory held per cached message (a parsed email.message.Message as
+before versus a ParsedBody with the attachment spilled to disk).
+
+Run from the mercury directory:
+    python -m tools.bench_email_parser [--messages 200] [--attachment-kb 512] [--opens 5]
+"""
+import argparse
+import email
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from src.utils.email_parser import BodyCache, parse_message
+
+
+def make_raw(index, attachment_kb):
+    message = MIMEMultipart("mixed")
+    message["Subject"] = f"Report {index}"
+    alternative = MIMEMultipart("alternative")
+    text = f"Quarterly report {index}.\n" * 200
+    alternative.attach(MIMEText(text, "plain", "utf-8"))
+    alternative.attach(MIMEText(f"<html><body><p>{text}</p></body></html>", "html", "utf-8"))
+    message.attach(alternative)
+    message.attach(MIMEApplication(os.urandom(attachment_kb * 1024), Name=f"report{index}.pdf"))
+    return message.as_bytes()
+
+
+def legacy_content(email_message):
+    # The old EmailTab.get_email_content, run on every click
+    content = ""
+    for part in email_message.walk():
+        if part.get_content_type() == "text/plain":
+            payload = part.get_payload(decode=True)
+            content += payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+    return content
+
+
+def measure(label, build, open_message, count, opens):
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(opens):
+        for key in range(count):
+            open_message(held, key)
+    elapsed = (time.perf_counter() - start) / (count * opens)
+    print(f"  {label:<22} {elapsed * 1e6:>9.1f} us per open  {current / count / 1024:>9.1f} KB held per message")
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--attachment-kb", type=int, default=512)
+    parser.add_argument("--opens", type=int, default=5)
+    args = parser.parse_args()
+
+    raws = [make_raw(i, args.attachment_kb) for i in range(args.messages)]
+    spill_dir = tempfile.mkdtemp(prefix="mercury-bench-")
+    print(f"{args.messages} messages with a {args.attachment_kb} KB attachment, opened {args.opens} times each")
+    measure("legacy Message walk", lambda: [email.message_from_bytes(raw) for raw in raws],
+            lambda held, key: legacy_content(held[key]), args.messages, args.opens)
+
+    def build_cache():
+        cache = BodyCache(max_entries=args.messages)
+        for key, raw in enumerate(raws):
+            cache.put(key, parse_message(raw, spill_dir))
+        return cache
+
+    cache = measure("parse once, cached", build_cache, lambda held, key: held.get(key).text,
+                    args.messages, args.opens)
+    cache.clear()
+    shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# tools/bench_flag_sync.py
+"""Round trips for bulk flagging: per-message STORE versus batched FlagSync.
+
+Syncs a fake mailbox into an in-memory store, flags a selection of messages
+one UID STORE at a time (what a naive push would do) and then through
+FlagSync, which coalesces the selection into UID sets. Finally changes
+keywords on the server and checks that a sync pulls them back into the
+store, with and without CONDSTORE.
+
+Run from the mercury directory:
+    python -m tools.bench_flag_sync [--messages 2000] [--selected 500] [--latency 0.005]
+"""
+import argparse
+import time
+
+from src.models.email_message import FLAG_KEYWORDS
+from src.utils.database import MessageStore
+from src.utils.flag_sync import FlagSync
+from src.utils.imap_pool import ImapConnectionPool
+from src.utils.mail_sync import MailSync
+from tools.fake_imap import PlainAccount, build_server
+
+
+def per_message(pool, account, uids, keyword):
+    def store(conn):
+        for uid in uids:
+            conn.imap.uid('STORE', str(uid), '+FLAGS.SILENT', f"({keyword})")
+    pool.run(account, store)
+
+
+def run(label, server, fn):
+    server.reset_stats()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {server.commands:>6} round trips {elapsed:>8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--selected", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    for capabilities in (("IMAP4rev1", "CONDSTORE"), ("IMAP4rev1",)):
+        server = build_server(args.messages, body_size=200, latency=args.latency, capabilities=capabilities)
+        account = PlainAccount("bench@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+        pool = ImapConnectionPool()
+        store = MessageStore(':memory:')
+        sync = MailSync(store, pool, initial_limit=args.messages)
+        sync.sync_folder(account)
+        pool.run(account, lambda conn: None)  # warm connection, so only flag commands are counted
+        messages = store.load_messages(account.email, 'INBOX')
+        # Every other message, so the UID set can't collapse into one range
+        selected = messages[::2][:args.selected]
+        # push() is called directly; the app's background thread does the same after a short delay
+        flag_sync = FlagSync(store, [account], pool)
+
+        print(f"{' '.join(capabilities)}: {len(selected)} of {args.messages} messages, "
+              f"{args.latency * 1000:.0f} ms per command")
+        # Counts include the NOOP that checks a pooled connection before reuse
+        run("per-message UID STORE", server,
+            lambda: per_message(pool, account, [m.uid for m in messages[1::2][:args.selected]],
+                                FLAG_KEYWORDS["on_track"]))
+        run("FlagSync: unmarked -> urgent", server,
+            lambda: (store.set_flag(selected, "urgent"), flag_sync.push()))
+        run("FlagSync: urgent -> important", server,
+            lambda: (store.set_flag(selected, "important"), flag_sync.push()))
+        run("FlagSync: 3 re-flags coalesced", server,
+            lambda: (store.set_flag(selected, "urgent"), store.set_flag(selected, "on_track"),
+                     store.set_flag(selected, "important"), flag_sync.push()))
+        on_server = sum(1 for m in server.mailboxes["INBOX"].messages if FLAG_KEYWORDS["important"] in m[2])
+        print(f"  server messages marked important: {on_server}, still queued: {len(store.pending_flags())}")
+
+        # Another client re-flags a message; the next sync brings it back
+        uid = selected[0].uid
+        server.mailboxes["INBOX"].set_flags(uid, {"\\Seen", FLAG_KEYWORDS["urgent"]})
+        run("sync pulling keyword changes", server, lambda: sync.sync_folder(account))
+        pulled = next(m for m in store.load_messages(account.email, 'INBOX') if m.uid == uid)
+        print(f"  UID {uid} after sync: flag={pulled.flag} keywords={' '.join(pulled.flags)}")
+
+        pool.close_all()
+        store.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
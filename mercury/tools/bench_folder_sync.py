@@ -0,0 +1,100 @@
+# tools/bench_folder_sync.py
+"""Time to first results when syncing an account with many folders.
+
+Builds a fake account with INBOX, Sent, a few small folders and one large
+archive, then syncs it into an empty store two ways:
+  sequential  every folder in turn, each downloaded in full, on one connection
+  FolderSync  the viewed folder first, the rest in parallel over pooled
+              connections, older mail backfilled in chunks at low priority
+and reports when the viewed folder first has messages, when every folder
+has its newest messages, and when everything is stored.
+
+Run from the mercury directory:
+    python -m tools.bench_folder_sync [--archive 100000] [--latency 0.01]
+"""
+import argparse
+import threading
+import time
+
+from src.utils.database import MessageStore
+from src.utils.fetch_scheduler import FetchScheduler
+from src.utils.folder_sync import FolderSync
+from src.utils.imap_pool import ImapConnectionPool
+from src.utils.mail_sync import MailSync
+from tools.fake_imap import FakeImapServer, FakeMailbox, PlainAccount, make_message
+
+
+def build_mailboxes(archive):
+    sizes = {"INBOX": 5000, "Sent": 3000, "Drafts": 20, "Projects/Alpha": 800, "Projects/Beta": 400,
+             "Archive": archive}
+    mailboxes = {}
+    for name, count in sizes.items():
+        mailbox = FakeMailbox()
+        for i in range(count):
+            mailbox.append(make_message(i, 300))
+        mailboxes[name] = mailbox
+    return mailboxes
+
+
+def sequential(account, store, pool, viewed, marks, start):
+    sync = MailSync(store, pool, initial_limit=0)
+    for name, _, _ in sync.list_folders(account):
+        sync.sync_folder(account, name)
+        if name == viewed:
+            marks.setdefault("viewed", time.perf_counter() - start)
+    marks["recent"] = marks["all"] = time.perf_counter() - start
+
+
+def folder_sync(account, store, pool, viewed, marks, start, folders):
+    done = threading.Event()
+    synced = set()
+
+    def on_synced(account, folder, result):
+        elapsed = time.perf_counter() - start
+        if folder == viewed:
+            marks.setdefault("viewed", elapsed)
+        synced.add(folder)
+        if len(synced) == folders:
+            marks.setdefault("recent", elapsed)
+
+    scheduler = FetchScheduler(per_server=pool.max_per_server)
+    sync = FolderSync(MailSync(store, pool), scheduler, on_synced=on_synced,
+                      on_finished=lambda account: done.set())
+    sync.sync_account(account, viewed)
+    done.wait()
+    marks["all"] = time.perf_counter() - start
+    scheduler.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--viewed", default="Sent")
+    args = parser.parse_args()
+
+    mailboxes = build_mailboxes(args.archive)
+    total = sum(len(mailbox.messages) for mailbox in mailboxes.values())
+    print(f"{len(mailboxes)} folders, {total} messages, {args.latency * 1000:.0f} ms per command, "
+          f"viewing {args.viewed}")
+    for label, run in (("sequential", sequential), ("FolderSync", folder_sync)):
+        server = FakeImapServer(mailboxes, latency=args.latency).start()
+        account = PlainAccount("bench@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+        store = MessageStore(':memory:')
+        pool = ImapConnectionPool()
+        marks = {}
+        start = time.perf_counter()
+        if run is sequential:
+            run(account, store, pool, args.viewed, marks, start)
+        else:
+            run(account, store, pool, args.viewed, marks, start, len(mailboxes))
+        stored = sum(store.count_messages(account.email, name) for name in mailboxes)
+        print(f"  {label:<11} viewed folder {marks['viewed']:>7.2f} s   newest of every folder "
+              f"{marks['recent']:>7.2f} s   all {stored} stored {marks['all']:>7.2f} s")
+        pool.close_all()
+        store.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
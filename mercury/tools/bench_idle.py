@@ -0,0 +1,83 @@
+# tools/bench_idle.py
+"""Cost of noticing new mail: full refresh versus IDLE push and polling.
+
+Delivers messages into a fake mailbox one at a time and measures, per new
+message, the bytes the server sends and the delay before the app knows
+about it. "full refresh" is pressing Fetch Emails with the original
+implementation (re-downloading the newest N messages in full); "IDLE" and
+"poll" run IdleWatcher, which syncs only the new UIDs.
+
+Run from the mercury directory:
+    python -m tools.bench_idle [--messages 1000] [--deliveries 5] [--poll-interval 2]
+"""
+import argparse
+import threading
+import time
+
+from src.utils.async_backend import stop_async_backend
+from src.utils.database import MessageStore
+from src.utils.idle_watcher import IdleWatcher
+from src.utils.imap_pool import imap_pool
+from tools.bench_imap_fetch import batched_fetch
+from tools.fake_imap import PlainAccount, build_server, make_message
+
+
+def full_refresh(server, account, count, deliveries):
+    sent = 0
+    for i in range(deliveries):
+        server.mailboxes["INBOX"].append(make_message(100000 + i))
+        server.reset_stats()
+        batched_fetch(account, count)
+        sent += server.bytes_sent
+    imap_pool.close_all()
+    return sent / deliveries, None
+
+
+def watched(server, account, deliveries, poll_interval):
+    store = MessageStore(':memory:')
+    arrived = threading.Event()
+    watcher = IdleWatcher(store, lambda account, result, new: new and arrived.set(), poll_interval=poll_interval)
+    watcher.start(account)
+    # Wait for the catch-up sync, then measure steady state
+    while store.get_folder_state(account.email, 'INBOX') is None:
+        time.sleep(0.05)
+    time.sleep(0.5)
+    sent = delay = 0
+    for i in range(deliveries):
+        arrived.clear()
+        server.reset_stats()
+        start = time.perf_counter()
+        server.mailboxes["INBOX"].append(make_message(200000 + i))
+        arrived.wait(poll_interval * 2 + 5)
+        delay += time.perf_counter() - start
+        time.sleep(0.2)
+        sent += server.bytes_sent
+    watcher.stop_all()
+    store.close()
+    return sent / deliveries, delay / deliveries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--deliveries", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.messages} messages in the mailbox, {args.deliveries} deliveries")
+    for label, capabilities, run in (
+            ("full refresh", ("IMAP4rev1",), lambda s, a: full_refresh(s, a, args.messages, args.deliveries)),
+            ("IDLE", ("IMAP4rev1", "IDLE", "CONDSTORE"), lambda s, a: watched(s, a, args.deliveries, 60)),
+            (f"poll every {args.poll_interval:g} s", ("IMAP4rev1", "CONDSTORE"),
+             lambda s, a: watched(s, a, args.deliveries, args.poll_interval))):
+        server = build_server(args.messages, capabilities=capabilities)
+        account = PlainAccount("bench@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+        sent, delay = run(server, account)
+        delay_text = "on demand" if delay is None else f"{delay * 1000:.0f} ms after delivery"
+        print(f"  {label:<18} {sent / 1024:>10.1f} KB per new message, noticed {delay_text}")
+        server.stop()
+    stop_async_backend()
+
+
+if __name__ == "__main__":
+    main()
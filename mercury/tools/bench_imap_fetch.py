@@ -0,0 +1,84 @@
+# tools/bench_imap_fetch.py
+"""Compare per-message RFC822 fetching with batched fetching and a header-only MailSync.
+
+Run from the mercury directory:
+    python -m tools.bench_imap_fetch [--sizes 100 1000 10000] [--body-size 20000]
+"""
+import argparse
+import email
+import time
+
+from src.models.email_account import build_email, build_sequence_sets, parse_fetch_response
+from src.utils.database import MessageStore
+from src.utils.imap_pool import imap_pool
+from src.utils.mail_sync import MailSync
+from tools.fake_imap import PlainAccount, build_server
+
+
+def legacy_fetch(account, limit):
+    # The original implementation: SEARCH ALL, then one RFC822 FETCH per message
+    emails = []
+    mail = account.open_connection()
+    mail.select('inbox')
+    _, search_data = mail.search(None, 'ALL')
+    for num in search_data[0].split()[-limit:]:
+        _, msg_data = mail.fetch(num, '(RFC822)')
+        for response_part in msg_data:
+            if isinstance(response_part, tuple):
+                email_msg = email.message_from_bytes(response_part[1])
+                emails.append({"subject": email_msg["Subject"], "sender": email_msg["From"], "raw": email_msg})
+    mail.close()
+    mail.logout()
+    return emails
+
+
+def batched_fetch(account, limit, batch_size=500):
+    # The newest `limit` messages in full, one FETCH per sequence range instead of one per message
+    def fetch(conn):
+        emails = []
+        start = max(1, conn.exists - limit + 1)
+        for sequence_set in build_sequence_sets(start, conn.exists, batch_size):
+            _, msg_data = conn.imap.fetch(sequence_set, "(UID FLAGS RFC822.SIZE BODY.PEEK[])")
+            emails.extend(build_email(meta, literal, False, account.email, conn.folder)
+                          for meta, literal in parse_fetch_response(msg_data))
+        return emails
+    return imap_pool.run(account, fetch)
+
+
+def header_sync(account, limit):
+    # What the app does: a first MailSync of the newest `limit` headers into a fresh store
+    store = MessageStore(':memory:')
+    MailSync(store, initial_limit=limit).sync_folder(account)
+    emails = store.load_messages(account.email, 'INBOX')
+    store.close()
+    return emails
+
+
+def run(label, server, fn):
+    server.reset_stats()
+    start = time.perf_counter()
+    emails = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {len(emails):>7} msgs {server.commands:>7} round trips "
+          f"{server.bytes_sent / 1e6:>10.2f} MB {elapsed:>8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--body-size", type=int, default=20000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        server = build_server(size, body_size=args.body_size)
+        account = PlainAccount("bench@example.com", "secret", "127.0.0.1", "127.0.0.1", server.port)
+        print(f"{size} messages ({args.body_size} byte bodies)")
+        run("legacy per-message", server, lambda: legacy_fetch(account, size))
+        run("batched full", server, lambda: batched_fetch(account, size))
+        run("MailSync headers only", server, lambda: header_sync(account, size))
+        imap_pool.close_all()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
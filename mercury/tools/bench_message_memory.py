@@ -0,0 +1,85 @@
+# tools/bench_message_memory.py
+"""Measure memory held per listed message, before and after EmailMessage.
+
+"before" is what fetch_emails used to return and EmailTab kept in
+emails_cache: a dict of subject, sender and the parsed email.message.Message.
+"after" is the compact EmailMessage built from a header-only FETCH, plus the
+same message fetched in full with its raw bytes in the raw_store spill file,
+and opened with its decoded body spilled there as well.
+
+Run from the mercury directory:
+    python -m tools.bench_message_memory [--sizes 10000 100000] [--body-size 2000]
+"""
+import argparse
+import email
+import gc
+import tracemalloc
+
+from src.models.email_account import build_email
+from src.utils.raw_store import raw_store
+from tools.fake_imap import header_fields, make_message
+
+HEADER_NAMES = ["SUBJECT", "FROM", "DATE", "MESSAGE-ID"]
+
+
+def legacy(raws):
+    emails = []
+    for raw in raws:
+        email_msg = email.message_from_bytes(raw)
+        emails.append({"subject": email_msg["Subject"], "sender": email_msg["From"], "raw": email_msg})
+    return emails
+
+
+def compact_headers(raws):
+    return [build_email(f"{i + 1} (UID {i + 1} FLAGS (\\Seen) RFC822.SIZE {len(raw)})".encode(),
+                        header_fields(raw, HEADER_NAMES), account="bench@example.com")
+            for i, raw in enumerate(raws)]
+
+
+def compact_full(raws):
+    return [build_email(f"{i + 1} (UID {i + 1} FLAGS (\\Seen) RFC822.SIZE {len(raw)})".encode(),
+                        raw, headers_only=False, account="bench@example.com")
+            for i, raw in enumerate(raws)]
+
+
+def compact_opened(raws):
+    # Header-only messages that were then opened: the decoded body goes to the spill file too
+    emails = compact_headers(raws)
+    for email_message, raw in zip(emails, raws):
+        email_message.body = raw.split(b"\r\n\r\n", 1)[1].decode()
+    return emails
+
+
+def measure(build, raws):
+    gc.collect()
+    tracemalloc.start()
+    held = build(raws)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    gc.collect()
+    return current / len(raws)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--body-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        raws = [make_message(i, args.body_size) for i in range(size)]
+        print(f"{size} messages ({args.body_size} byte bodies), bytes held per message")
+        for label, build in (("before: dict + Message", legacy),
+                             ("after: header-only", compact_headers),
+                             ("after: full, raw spilled", compact_full),
+                             ("after: opened, body spilled", compact_opened)):
+            print(f"  {label:<28} {measure(build, raws):>10.0f}")
+        # Every message is gone by now; the next put() hands their spans back
+        raw_store.put(b"")
+        print(f"  spill file after release   {raw_store.size:>10} bytes")
+        raw_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# tools/bench_startup.py
+"""Startup benchmark: import-time breakdown and time to first paint.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+lists the slowest top-level imports, flagging heavy modules that should only
+load on first use (openai, numpy, matplotlib, wordcloud, markdown, QtCharts,
+tiktoken). Then launches the app's MainWindow in a child process and reports
+the time from interpreter start to the window's first paint event.
+
+Exits non-zero when a budget is exceeded or a deferred module is imported
+eagerly, so it can guard against regressions. Run from the mercury directory:
+    python -m tools.bench_startup [--module src.views.main_window] [--runs 3]
+                                  [--max-import-ms 1500] [--max-paint-ms 3000]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+DEFERRED_MODULES = ("openai", "numpy", "matplotlib", "wordcloud", "markdown", "PySide6.QtCharts", "tiktoken")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+import sys
+from PySide6.QtCore import QObject, QEvent, QTimer
+from PySide6.QtWidgets import QApplication
+from src.views.main_window import MainWindow
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            print(f"{(time.perf_counter() - start) * 1000:.1f}", flush=True)
+            QTimer.singleShot(0, window.quit_application)
+            obj.removeEventFilter(self)
+        return False
+
+app = QApplication(sys.argv)
+window = MainWindow()
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+QTimer.singleShot(30000, app.quit)
+app.exec()
+"""
+
+
+def import_times(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def report_imports(module, top):
+    entries = import_times(module)
+    total_ms = sum(self_us for _, self_us, _, _ in entries) / 1000
+    print(f"import {module}: {total_ms:.1f} ms across {len(entries)} modules")
+    # Outermost imports only, so nested modules aren't counted twice
+    outermost = [entry for entry in entries if entry[3] == 0]
+    for name, _, cumulative_us, _ in sorted(outermost, key=lambda entry: -entry[2])[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+    loaded = {name for name, _, _, _ in entries}
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    for name in eager:
+        print(f"  WARNING: {name} is imported at startup")
+    return total_ms, eager
+
+
+def first_paint(runs):
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", FIRST_PAINT_SCRIPT], capture_output=True, text=True,
+                                env=env, timeout=60)
+        lines = [line for line in result.stdout.splitlines() if re.match(r"^\d+(\.\d+)?$", line)]
+        if result.returncode != 0 or not lines:
+            raise RuntimeError((result.stderr.strip().splitlines() or ["no paint event"])[-1])
+        times.append(float(lines[0]))
+    return statistics.median(times), times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.views.main_window")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-paint-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    failed = False
+    try:
+        import_ms, eager = report_imports(args.module, args.top)
+        failed |= bool(eager)
+        if args.max_import_ms is not None and import_ms > args.max_import_ms:
+            print(f"  FAIL: imports took {import_ms:.1f} ms, budget {args.max_import_ms:.0f} ms")
+            failed = True
+    except RuntimeError as e:
+        print(f"Error measuring imports: {e}")
+        failed = True
+
+    try:
+        median, times = first_paint(args.runs)
+        print(f"first paint: {median:.1f} ms median of {', '.join(f'{t:.0f}' for t in times)} ms")
+        if args.max_paint_ms is not None and median > args.max_paint_ms:
+            print(f"  FAIL: first paint took {median:.1f} ms, budget {args.max_paint_ms:.0f} ms")
+            failed = True
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"Error measuring first paint: {e}")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
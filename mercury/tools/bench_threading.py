@@ -0,0 +1,110 @@
+# tools/bench_threading.py
+"""Conversation threading time for large mailboxes.
+
+Generates synthetic mail with realistic conversation shapes: replies carry
+References chains, some only In-Reply-To, some have lost their headers and
+thread by subject, and some reference messages that aren't stored. It then times:
+  build        ThreadIndex over every message (JWZ linking plus thread ids)
+  incremental  adding a batch of new replies to the built index
+  store        ThreadIndexer.update on an SQLite store: reading rows,
+               threading them and writing the thread ids back, the first
+               time (every id written), after a restart (ids already stored)
+               and for the new batch
+at several sizes, to show the cost grows linearly.
+
+Run from the mercury directory:
+    python -m tools.bench_threading [--sizes 10000 100000] [--new 1000]
+"""
+import argparse
+import random
+import time
+
+from src.models.email_message import EmailMessage
+from src.utils.database import MessageStore
+from src.utils.thread_index import ThreadIndex, ThreadIndexer
+
+
+def generate(count, seed=1, start=0):
+    # (message_id, refs, subject); about a third start a conversation, the rest reply to one
+    rng = random.Random(seed)
+    messages = []
+    threads = []
+    for i in range(start, start + count):
+        message_id = f"<{i}@bench.example>"
+        if not threads or rng.random() < 0.35:
+            subject = f"Topic {i}"
+            refs = [f"<missing-{i}@elsewhere>"] if rng.random() < 0.05 else []
+            threads.append((subject, [message_id]))
+        else:
+            subject, chain = threads[int(len(threads) * rng.random() ** 0.3) - 1]
+            parent = rng.randrange(len(chain))
+            shape = rng.random()
+            if shape < 0.8:
+                refs = chain[max(0, parent - 9):parent + 1]
+            elif shape < 0.95:
+                refs = [chain[parent]]
+            else:
+                refs = []
+            subject = f"Re: {subject}"
+            chain.append(message_id)
+        messages.append((message_id, refs, subject))
+    return messages
+
+
+def time_build(messages):
+    index = ThreadIndex()
+    start = time.perf_counter()
+    for rowid, (message_id, refs, subject) in enumerate(messages, 1):
+        index.add(rowid, message_id, refs, subject)
+    changed = index.flush()
+    return index, time.perf_counter() - start, len({thread for thread, _ in changed})
+
+
+def time_store(messages, new):
+    store = MessageStore(':memory:')
+    store.add_messages([EmailMessage("bench@example.com", "INBOX", uid, subject, message_id=message_id,
+                                     refs=" ".join(refs) or None)
+                        for uid, (message_id, refs, subject) in enumerate(messages, 1)])
+    indexer = ThreadIndexer(store)
+    start = time.perf_counter()
+    indexer.update("bench@example.com")
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    indexer = ThreadIndexer(store)
+    indexer.update("bench@example.com")
+    restart = time.perf_counter() - start
+    store.add_messages([EmailMessage("bench@example.com", "INBOX", len(messages) + uid, subject,
+                                     message_id=message_id, refs=" ".join(refs) or None)
+                        for uid, (message_id, refs, subject) in enumerate(new, 1)])
+    start = time.perf_counter()
+    indexer.update("bench@example.com")
+    incremental = time.perf_counter() - start
+    store.close()
+    return full, restart, incremental
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--new", type=int, default=1000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        messages = generate(size + args.new)
+        existing, new = messages[:size], messages[size:]
+        index, build, threads = time_build(existing)
+        start = time.perf_counter()
+        for rowid, (message_id, refs, subject) in enumerate(new, size + 1):
+            index.add(rowid, message_id, refs, subject)
+        moved = len(index.flush())
+        incremental = time.perf_counter() - start
+        store_full, store_restart, store_incremental = time_store(existing, new)
+        print(f"{size} messages in {threads} threads")
+        print(f"  build        {build * 1000:>8.1f} ms  ({build / size * 1e6:.2f} us per message)")
+        print(f"  incremental  {incremental * 1000:>8.1f} ms  for {args.new} new, {moved} thread ids written")
+        print(f"  store        {store_full * 1000:>8.1f} ms  first time, {store_restart * 1000:.1f} ms after a restart, "
+              f"{store_incremental * 1000:.1f} ms for the new ones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# tools/fake_imap.py
+"""Minimal in-process IMAP4rev1 server used by the benchmarks.
+
+Speaks plain TCP (no TLS) and implements just enough of the protocol for
+imaplib: LOGIN, LIST, SELECT/EXAMINE, SEARCH, FETCH, STORE and their UID variants, plus
+CONDSTORE's HIGHESTMODSEQ and CHANGEDSINCE, IDLE and unsolicited change reports
+when enabled. Every command and every byte sent is counted so benchmarks can
+report round trips and transfer volume.
+"""
+import imaplib
+import re
+import select
+import socket
+import socketserver
+import threading
+from email.utils import formatdate
+from src.models.email_account import EmailAccount
+from src.utils.async_imap import AsyncImapClient
+
+_TAGGED_RE = re.compile(r"^(\S+) (\S+)(?: (.*))?$")
+_HEADER_FIELDS_RE = re.compile(r"BODY(?:\.PEEK)?\[HEADER\.FIELDS \(([^)]*)\)\]", re.I)
+
+
+def make_message(index, body_size=20000, sender=None, subject=None, message_id=None):
+    sender = sender or f"Sender {index % 50} <sender{index % 50}@example.com>"
+    subject = subject or f"Status report {index} for project {index % 17}"
+    message_id = message_id or f"<msg{index}@example.com>"
+    body = (f"Line {index} of a fairly ordinary email body.\r\n" * (body_size // 40 + 1))[:body_size]
+    return (
+        f"From: {sender}\r\n"
+        f"To: user@example.com\r\n"
+        f"Subject: {subject}\r\n"
+        f"Date: {formatdate(1700000000 + index * 60)}\r\n"
+        f"Message-ID: {message_id}\r\n"
+        f"Content-Type: text/plain; charset=utf-8\r\n"
+        f"\r\n"
+        f"{body}\r\n"
+    ).encode()
+
+
+class FakeMailbox:
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = []  # [uid, raw bytes, flags set, modseq]
+        self.next_uid = 1
+        self.modseq = 1
+        self.lock = threading.Lock()
+
+    def append(self, raw, flags=()):
+        with self.lock:
+            self.modseq += 1
+            self.messages.append([self.next_uid, raw, set(flags), self.modseq])
+            self.next_uid += 1
+
+    def set_flags(self, uid, flags):
+        with self.lock:
+            for message in self.messages:
+                if message[0] == uid:
+                    self.modseq += 1
+                    message[2] = set(flags)
+                    message[3] = self.modseq
+
+    def expunge(self, uid):
+        with self.lock:
+            self.messages = [m for m in self.messages if m[0] != uid]
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailboxes=None, latency=0.0, capabilities=("IMAP4rev1",), unsolicited=False):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.mailboxes = mailboxes or {"INBOX": FakeMailbox()}
+        self.latency = latency
+        self.capabilities = capabilities
+        # Report mailbox changes at the end of every FETCH, as busy servers do
+        self.unsolicited = unsolicited
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.commands = 0
+            self.logins = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def count(self, sent=0, received=0, command=False, login=False):
+        with self.stats_lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.commands += int(command)
+            self.logins += int(login)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_sequence_set(spec, maximum):
+    numbers = set()
+    for part in spec.split(","):
+        if ":" in part:
+            lo, hi = part.split(":")
+            lo = maximum if lo == "*" else int(lo)
+            hi = maximum if hi == "*" else int(hi)
+            lo, hi = min(lo, hi), max(lo, hi)
+            numbers.update(range(lo, min(hi, maximum) + 1))
+        else:
+            numbers.add(maximum if part == "*" else int(part))
+    return numbers
+
+
+def header_fields(raw, names):
+    head = raw.split(b"\r\n\r\n", 1)[0]
+    wanted = {n.upper().encode() for n in names}
+    lines = [line for line in head.split(b"\r\n") if line.split(b":", 1)[0].upper() in wanted]
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.mailbox = None
+        self.known_exists = 0
+        self.known = []  # [uid, modseq] as of the last SELECT or IDLE, for change notifications
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        # Count before writing so the client never observes a stale total
+        self.server.count(sent=len(data))
+        self.wfile.write(data)
+
+    def handle(self):
+        self.send("* OK Fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            self.server.count(received=len(line), command=True)
+            match = _TAGGED_RE.match(line.decode().rstrip("\r\n"))
+            if not match:
+                self.send("* BAD parse error\r\n")
+                continue
+            tag, command, args = match.group(1), match.group(2).upper(), match.group(3) or ""
+            if self.server.latency:
+                threading.Event().wait(self.server.latency)
+            handler = getattr(self, f"cmd_{command.lower()}", None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {command}\r\n")
+                continue
+            if handler(tag, args) is False:
+                return
+
+    def cmd_capability(self, tag, args):
+        self.send(f"* CAPABILITY {' '.join(self.server.capabilities)}\r\n{tag} OK CAPABILITY completed\r\n")
+
+    def cmd_login(self, tag, args):
+        self.server.count(login=True)
+        self.send(f"{tag} OK LOGIN completed\r\n")
+
+    def cmd_noop(self, tag, args):
+        if self.mailbox is not None and len(self.mailbox.messages) != self.known_exists:
+            self.known_exists = len(self.mailbox.messages)
+            self.send(f"* {self.known_exists} EXISTS\r\n")
+        self.send(f"{tag} OK NOOP completed\r\n")
+
+    def cmd_logout(self, tag, args):
+        self.send(f"* BYE logging out\r\n{tag} OK LOGOUT completed\r\n")
+        return False
+
+    def cmd_close(self, tag, args):
+        self.mailbox = None
+        self.send(f"{tag} OK CLOSE completed\r\n")
+
+    def cmd_list(self, tag, args):
+        lines = []
+        for name in self.server.mailboxes:
+            escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'* LIST (\\HasNoChildren) "/" "{escaped}"\r\n')
+        self.send("".join(lines) + f"{tag} OK LIST completed\r\n")
+
+    def cmd_select(self, tag, args):
+        quoted = re.match(r'"((?:[^"\\]|\\.)*)"', args)
+        name = re.sub(r"\\(.)", r"\1", quoted.group(1)) if quoted else args.split(" ")[0]
+        mailbox = self.server.mailboxes.get(name.upper() if name.upper() == "INBOX" else name)
+        if mailbox is None:
+            self.send(f"{tag} NO no such mailbox\r\n")
+            return
+        self.mailbox = mailbox
+        self.known_exists = len(mailbox.messages)
+        self.known = [[m[0], m[3]] for m in mailbox.messages]
+        self.send(
+            f"* {len(mailbox.messages)} EXISTS\r\n"
+            f"* 0 RECENT\r\n"
+            f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid\r\n"
+            f"* OK [UIDNEXT {mailbox.next_uid}] predicted next UID\r\n"
+            f"* OK [PERMANENTFLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft \\*)] flags permitted\r\n"
+            + (f"* OK [HIGHESTMODSEQ {mailbox.modseq}] modseq\r\n" if "CONDSTORE" in self.server.capabilities else "")
+            +             f"{tag} OK [READ-WRITE] SELECT completed\r\n"
+        )
+
+    cmd_examine = cmd_select
+
+    def cmd_search(self, tag, args, uid=False):
+        messages = self.mailbox.messages if self.mailbox else []
+        uid_range = re.search(r"UID (\S+)", args, re.I)
+        if uid_range:
+            wanted = parse_sequence_set(uid_range.group(1), messages[-1][0] if messages else 0)
+            messages = [m for m in messages if m[0] in wanted]
+        ids = [str(m[0]) if uid else str(i + 1) for i, m in enumerate(messages)]
+        self.send(f"* SEARCH {' '.join(ids)}\r\n{tag} OK SEARCH completed\r\n")
+
+    def cmd_fetch(self, tag, args, uid=False):
+        spec, items = args.split(" ", 1)
+        items = items.upper()
+        messages = self.mailbox.messages if self.mailbox else []
+        if uid:
+            wanted = parse_sequence_set(spec, messages[-1][0] if messages else 0)
+        else:
+            wanted = parse_sequence_set(spec, len(messages))
+        changed_since = re.search(r"CHANGEDSINCE (\d+)", items)
+        for seq, (msg_uid, raw, flags, modseq) in enumerate(messages, start=1):
+            if (msg_uid if uid else seq) not in wanted:
+                continue
+            if changed_since and modseq <= int(changed_since.group(1)):
+                continue
+            self.send(self.fetch_response(seq, msg_uid, raw, flags, modseq, items, uid))
+        if self.server.unsolicited and self.mailbox is not None:
+            self.send_changes(expunge=uid)
+        self.send(f"{tag} OK FETCH completed\r\n")
+
+    def fetch_response(self, seq, msg_uid, raw, flags, modseq, items, uid):
+        parts = []
+        if uid or "UID" in items:
+            parts.append(f"UID {msg_uid}")
+        if "FLAGS" in items:
+            parts.append(f"FLAGS ({' '.join(sorted(flags))})")
+        if "RFC822.SIZE" in items:
+            parts.append(f"RFC822.SIZE {len(raw)}")
+        if "CHANGEDSINCE" in items or "MODSEQ" in items:
+            parts.append(f"MODSEQ ({modseq})")
+        literal = None
+        fields = _HEADER_FIELDS_RE.search(items)
+        if fields:
+            literal = header_fields(raw, fields.group(1).split())
+            parts.append(f"BODY[HEADER.FIELDS ({fields.group(1)})] {{{len(literal)}}}")
+        elif "BODY[]" in items or "BODY.PEEK[]" in items or re.search(r"\bRFC822\b(?!\.)", items):
+            literal = raw
+            parts.append(f"BODY[] {{{len(literal)}}}")
+        head = f"* {seq} FETCH ({' '.join(parts)}"
+        if literal is None:
+            return f"{head})\r\n".encode()
+        return f"{head}\r\n".encode() + literal + b")\r\n"
+
+    def cmd_store(self, tag, args, uid=False):
+        match = re.match(r"(\S+) ([+-]?)FLAGS(\.SILENT)? \(([^)]*)\)", args, re.I)
+        if not match or self.mailbox is None:
+            self.send(f"{tag} BAD invalid STORE\r\n")
+            return
+        spec, mode, silent, names = match.groups()
+        names = set(names.split())
+        messages = self.mailbox.messages
+        wanted = parse_sequence_set(spec, (messages[-1][0] if uid else len(messages)) if messages else 0)
+        with self.mailbox.lock:
+            for seq, message in enumerate(messages, start=1):
+                if (message[0] if uid else seq) not in wanted:
+                    continue
+                message[2] = message[2] | names if mode == "+" else message[2] - names if mode == "-" else set(names)
+                self.mailbox.modseq += 1
+                message[3] = self.mailbox.modseq
+                if not silent:
+                    self.send(f"* {seq} FETCH (UID {message[0]} FLAGS ({' '.join(sorted(message[2]))}))\r\n")
+        self.send(f"{tag} OK STORE completed\r\n")
+
+    def cmd_idle(self, tag, args):
+        if "IDLE" not in self.server.capabilities or self.mailbox is None:
+            self.send(f"{tag} BAD IDLE not available\r\n")
+            return
+        self.send("+ idling\r\n")
+        while True:
+            # Wait for DONE while pushing mailbox changes as they happen
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                self.server.count(received=len(line))
+                break
+            self.send_changes()
+        self.send(f"{tag} OK IDLE terminated\r\n")
+
+    def send_changes(self, expunge=True):
+        with self.mailbox.lock:
+            current = {m[0]: (seq, m) for seq, m in enumerate(self.mailbox.messages, start=1)}
+        if not expunge and any(uid not in current for uid, _ in self.known):
+            # EXPUNGE would renumber the messages of a sequence-number FETCH (RFC 3501 7.4.1),
+            # and later changes can't be numbered without it; wait for a UID command or IDLE
+            return
+        lines = []
+        # Expunges from the highest sequence number down, so earlier numbers stay valid
+        for seq in range(len(self.known), 0, -1):
+            if self.known[seq - 1][0] not in current:
+                lines.append(f"* {seq} EXPUNGE\r\n")
+                del self.known[seq - 1]
+        for entry in self.known:
+            seq, message = current[entry[0]]
+            if message[3] > entry[1]:
+                entry[1] = message[3]
+                lines.append(f"* {seq} FETCH (UID {message[0]} FLAGS ({' '.join(sorted(message[2]))}))\r\n")
+        if len(current) > len(self.known):
+            known_uids = {uid for uid, _ in self.known}
+            self.known.extend([m[0], m[3]] for _, m in current.values() if m[0] not in known_uids)
+            lines.append(f"* {len(current)} EXISTS\r\n")
+        self.known_exists = len(current)
+        if lines:
+            self.send("".join(lines))
+
+    def cmd_uid(self, tag, args):
+        command, rest = (args.split(" ", 1) + [""])[:2]
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            self.send(f"{tag} BAD unknown UID command\r\n")
+            return
+        handler(tag, rest, uid=True)
+
+
+def build_server(message_count, body_size=20000, latency=0.0, **kwargs):
+    mailbox = FakeMailbox()
+    for i in range(message_count):
+        mailbox.append(make_message(i, body_size))
+    return FakeImapServer({"INBOX": mailbox}, latency=latency, **kwargs).start()
+
+
+class PlainAccount(EmailAccount):
+    # The fake server speaks plain TCP, so skip TLS for both backends
+    def open_connection(self):
+        mail = imaplib.IMAP4(self.imap_server, self.imap_port)
+        mail.login(self.email, self.password)
+        return mail
+
+    async def open_async_connection(self):
+        client = await AsyncImapClient(self.imap_server, self.imap_port, use_ssl=False).connect()
+        await client.login(self.email, self.password)
+        return client
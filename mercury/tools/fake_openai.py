@@ -0,0 +1,163 @@
+# tools/fake_openai.py
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions with a canned reply, either as one JSON
+body or, when the request has "stream": true, as server-sent events with one
+chunk per word. first_token_latency and token_latency simulate model speed.
+Counts requests and streams the client closed early (cancelled).
+
+Point the app at it without touching the code:
+    python -m tools.fake_openai --port 8089
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test python main.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Here is a short answer streamed word by word from the local stub server. "
+    "It exists so the chatbot's streaming, cancellation and error paths can be "
+    "exercised without a network connection or an API key. "
+) * 4
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, reply=DEFAULT_REPLY, first_token_latency=0.3, token_latency=0.02, status=200):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.reply = reply
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.status = status
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.requests = 0
+            self.cancelled = 0
+            self.last_request = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _completion(model, content, finish_reason="stop"):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": len(content.split())},
+    }
+
+
+def _chunk(model, content=None, finish_reason=None):
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server.stats_lock:
+            server.requests += 1
+            server.last_request = request
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        if server.status != 200:
+            self.send_json(server.status, {"error": {"message": "simulated failure", "type": "server_error"}})
+            return
+
+        model = request.get("model", "fake-model")
+        time.sleep(server.first_token_latency)
+        if not request.get("stream"):
+            time.sleep(server.token_latency * len(server.reply.split()))
+            self.send_json(200, _completion(model, server.reply.strip()))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        words = server.reply.split(" ")
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(server.token_latency)
+                token = word if i == 0 else " " + word
+                self.write_event(_chunk(model, token))
+            self.write_event(_chunk(model, finish_reason="stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with server.stats_lock:
+                server.cancelled += 1
+
+    def write_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode() + b"\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, first_token_latency=args.first_token_latency,
+                              token_latency=args.token_latency)
+    print(f"Serving fake chat completions on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# tools/fake_smtp.py
+"""Minimal in-process SMTP server used by the tests.
+
+Speaks plain TCP only (no TLS), answers EHLO with the given extensions and
+accepts AUTH, MAIL/RCPT/DATA and QUIT. Every command line received is kept
+in `commands`, so a test can check what a client sent, e.g. that it never
+offered a password on an unencrypted connection.
+"""
+import socketserver
+import threading
+
+
+class FakeSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, extensions=("PIPELINING", "AUTH PLAIN LOGIN")):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.extensions = extensions
+        self.commands = []
+        self.messages = []
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        self.send("220 fake.example.com ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.rstrip(b"\r\n").decode(errors="replace")
+            self.server.commands.append(command)
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                lines = ["fake.example.com"] + list(self.server.extensions)
+                for line in lines[:-1]:
+                    self.send(f"250-{line}")
+                self.send(f"250 {lines[-1]}")
+            elif verb == "AUTH":
+                self.send("235 Authenticated")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.send("250 OK")
+            elif verb == "DATA":
+                self.send("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                    data.append(line)
+                self.server.messages.append(b"".join(data))
+                self.send("250 Queued")
+            elif verb == "QUIT":
+                self.send("221 Bye")
+                return
+            else:
+                self.send("502 Command not implemented")